@@ -3,6 +3,7 @@ import logging
 import types
 import dispatcher
 from dispatcher import *
+from CoalescedSignal import CoalescedSignal
 from CommandContainer import CommandContainer
 
 if sys.version_info > (3, 0):
@@ -304,6 +305,8 @@ class HardwareObjectNode:
 
 class HardwareObject(HardwareObjectNode, CommandContainer):
     def __init__(self, rootName):
+        # before the parent classes, emit uses it
+        self._coalesced_signals = {}
         HardwareObjectNode.__init__(self, rootName)
         CommandContainer.__init__(self)
         self.connect_dict = {} 
@@ -351,7 +354,35 @@ class HardwareObject(HardwareObjectNode, CommandContainer):
         if len(args)==1:
           if type(args[0])==tuple:
             args=args[0]
-        dispatcher.send(signal, self, *args)  
+
+        coalesced_signal = self._coalesced_signals.get(signal)
+        if coalesced_signal is not None:
+            coalesced_signal.send(*args)
+        else:
+            dispatcher.send(signal, self, *args)  
+
+
+    def set_signal_max_rate(self, signal, max_rate):
+        """Declare a signal as 'latest value wins': it is delivered at
+        most max_rate times per second, intermediate values are dropped.
+        A max_rate of None (or 0) restores the normal delivery.
+        """
+        signal = str(signal)
+
+        coalesced_signal = self._coalesced_signals.pop(signal, None)
+        if coalesced_signal is not None:
+            coalesced_signal.cancel()
+
+        if max_rate:
+            self._coalesced_signals[signal] = \
+                 CoalescedSignal(signal, self, max_rate)
+
+
+    def get_signal_statistics(self):
+        """Return {signal: {"emitted", "delivered", "coalesced"}} for the
+        rate limited signals"""
+        return dict([(signal, coalesced_signal.get_statistics()) for \
+                     signal, coalesced_signal in self._coalesced_signals.items()])
 
     
     def connect(self, sender, signal, slot=None):
@@ -0,0 +1,65 @@
+import time
+import gevent
+from dispatcher import dispatcher
+
+
+class CoalescedSignal:
+    """Latest-value-wins delivery of a signal
+
+    The signal is sent at most max_rate times per second ; when it is
+    emitted faster, intermediate values are dropped and only the newest
+    one is delivered at the next tick.
+    """
+    def __init__(self, signal, sender, max_rate):
+        self.signal = signal
+        self.sender = sender
+        self.min_interval = 1.0 / max_rate
+        self.last_sent = 0
+        self.pending_args = None
+        self.timer = None
+        self.emitted = 0
+        self.delivered = 0
+        self.coalesced = 0
+
+
+    def send(self, *args):
+        self.emitted += 1
+
+        if self.timer is not None:
+            # a delivery is scheduled, newest value replaces the pending one
+            self.pending_args = args
+            self.coalesced += 1
+            return
+
+        delay = self.last_sent + self.min_interval - time.time()
+        if delay <= 0:
+            self._deliver(args)
+        else:
+            self.pending_args = args
+            self.timer = gevent.spawn_later(delay, self._deliver_pending)
+
+
+    def _deliver_pending(self):
+        args = self.pending_args
+        self.pending_args = None
+        self.timer = None
+        self._deliver(args)
+
+
+    def _deliver(self, args):
+        self.last_sent = time.time()
+        self.delivered += 1
+        dispatcher.send(self.signal, self.sender, *args)
+
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.kill(block=False)
+            self.timer = None
+        self.pending_args = None
+
+
+    def get_statistics(self):
+        return { "emitted": self.emitted,
+                 "delivered": self.delivered,
+                 "coalesced": self.coalesced }
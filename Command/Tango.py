@@ -6,6 +6,7 @@ import time
 import types
 import gevent
 import gevent.event
+import numpy
 
 from ..CommandContainer import CommandObject, ChannelObject, ConnectionError
 from .. import Poller
@@ -97,6 +98,121 @@ class E:
             self.event = event
 
 
+def _value_changed(old_value, new_value):
+    if isinstance(new_value, numpy.ndarray) or isinstance(old_value, numpy.ndarray):
+        try:
+            return not numpy.array_equal(old_value, new_value)
+        except:
+            return True
+    try:
+        return bool(old_value != new_value)
+    except:
+        return True
+
+
+class _TangoAttributesBatch:
+    """Read polled attributes of a device with one read_attributes call
+
+    All polled TangoChannels of the same device and polling period share
+    one batch: a single poller reads all attributes in one network
+    round-trip, and values are dispatched to the channels that changed.
+    """
+    _batches = {}
+
+    @staticmethod
+    def join(channel):
+        key = (channel.deviceName.lower(), channel.polling)
+        batch = _TangoAttributesBatch._batches.get(key)
+        if batch is None:
+            batch = _TangoAttributesBatch(key, channel.device)
+            _TangoAttributesBatch._batches[key] = batch
+        batch.add_channel(channel)
+        return batch
+
+    def __init__(self, key, device):
+        self.key = key
+        self.device = device
+        self.channels = []
+        self.poller = None
+
+    def add_channel(self, channel):
+        self.channels = [ref for ref in self.channels if ref() not in (None, channel)]
+        self.channels.append(weakref.ref(channel))
+        if self.poller is None:
+            self.poller = Poller.poll(self.poll,
+                                      polling_period = self.key[1],
+                                      value_changed_callback = self.update,
+                                      error_callback = self.pollFailed,
+                                      compare = False)
+
+    def get_channels(self):
+        channels = [ref() for ref in self.channels]
+        return [channel for channel in channels if channel is not None]
+
+    def poll(self):
+        channels = self.get_channels()
+        if not channels:
+            return []
+        attributes = self.device.read_attributes([channel.attributeName for channel in channels])
+        values = []
+        for channel, attr in zip(channels, attributes):
+            if attr.has_failed:
+                values.append((channel, None))
+            else:
+                values.append((channel, attr.value))
+        return values
+
+    def update(self, values):
+        if not values:
+            # no channel left in this batch
+            if not self.get_channels():
+                _TangoAttributesBatch._batches.pop(self.key, None)
+                if self.poller is not None:
+                    self.poller.stop()
+                    self.poller = None
+            return
+
+        for channel, value in values:
+            if type(value) == types.TupleType:
+                # as stored by TangoChannel.update
+                value = list(value)
+            if _value_changed(channel.value, value):
+                if value is None:
+                    channel.value = None
+                    channel.emit('update', None)
+                else:
+                    channel.update(value)
+
+    def pollFailed(self, e, poller_id):
+        channels = self.get_channels()
+        try:
+            raise e
+        except:
+            logging.exception("%s: Exception happened while polling %s", self.key[0], ", ".join([channel.attributeName for channel in channels]))
+
+        if channels:
+            try:
+                channels[0].init_device()
+            except:
+                pass
+            else:
+                if channels[0].device is not None:
+                    self.device = channels[0].device
+
+        poller = Poller.get_poller(poller_id)
+        if poller is not None:
+            self.poller = poller.restart(1000)
+
+        for channel in channels:
+            if channel.value is not None:
+                channel.value = None
+                # emit at the end => can raise exceptions in callbacks
+                try:
+                    channel.emit('update', None)
+                except:
+                    logging.exception("%s: error in update callback", channel.name())
+
+
 class TangoChannel(ChannelObject):
     _tangoEventsQueue = Queue.Queue()
     _eventReceivers = {}
@@ -117,6 +233,7 @@ class TangoChannel(ChannelObject):
         self.pollingEvents = False
         self.timeout = int(timeout)
         self.read_as_str = kwargs.get("read_as_str", False)
+        self.batch_read = kwargs.get("batch_read", True)
         self._device_initialized = gevent.event.Event()
          
         logging.getLogger("HWR").debug("creating Tango attribute %s/%s, polling=%s, timeout=%d", self.deviceName, self.attributeName, polling, self.timeout)
@@ -135,10 +252,14 @@ class TangoChannel(ChannelObject):
         self.init_poller.stop()
 
         if type(self.polling) == types.IntType:
-             Poller.poll(self.poll,
-                         polling_period = self.polling,
-                         value_changed_callback = self.update,
-                         error_callback = self.pollFailed)
+            if self.batch_read and not self.read_as_str and self.device is not None:
+                # attributes of the same device are read in one go
+                _TangoAttributesBatch.join(self)
+            else:
+                Poller.poll(self.poll,
+                            polling_period = self.polling,
+                            value_changed_callback = self.update,
+                            error_callback = self.pollFailed)
         else:
             if self.polling=="events":
                 # try to register event
@@ -232,7 +353,7 @@ class TangoChannel(ChannelObject):
 
  
     def update(self, value = Poller.NotInitializedValue):
-        if value == Poller.NotInitializedValue:
+        if value is Poller.NotInitializedValue:
             value = self.getValue()
         if type(value) == types.TupleType:
           value = list(value)
@@ -4,8 +4,10 @@ import xml.sax
 from xml.sax.handler import ContentHandler
 
 import BaseHardwareObjects
+import XMLCache
 
 currentXML = None
+currentEvents = None
 
 try:
     newObjectsClasses = { 'equipment': BaseHardwareObjects.Equipment,
@@ -29,18 +31,37 @@ def parse(filename, name):
     return curHandler.getHardwareObject()
 
 
-def parseString(XMLHardwareObject, name):
+def parseString(XMLHardwareObject, name, filename=None):
+    """Create a Hardware Object from its XML string
+
+    If filename is given, the parsed XML is taken from the cache when
+    the file did not change (see XMLCache)
+    """
     global currentXML
+    global currentEvents
     currentXML = XMLHardwareObject
+    currentEvents = None
     curHandler = HardwareObjectHandler(name)
-    # LNLS
-    #python2.7
-    #xml.sax.parseString(XMLHardwareObject, curHandler)
-    # python3.4
-    xml.sax.parseString(str.encode(XMLHardwareObject), curHandler)
+    if filename is None:
+        # LNLS
+        #python2.7
+        #xml.sax.parseString(XMLHardwareObject, curHandler)
+        # python3.4
+        xml.sax.parseString(str.encode(XMLHardwareObject), curHandler)
+    else:
+        currentEvents = XMLCache.getEvents(XMLHardwareObject, filename)
+        XMLCache.replay(currentEvents, curHandler)
     return curHandler.getHardwareObject()
 
 
+def getReferences(XMLHardwareObject, name):
+    """Return the list of Hardware Objects names referenced by the XML
+    string, without instanciating anything"""
+    curHandler = XMLReferencesRetriever(name)
+    xml.sax.parseString(str.encode(XMLHardwareObject), curHandler)
+    return curHandler.getReferences()
+
+
 def loadModule(hardwareObjectName):
     return __import__(hardwareObjectName, globals(), locals(), [""])
 
@@ -63,11 +84,12 @@ def instanciateClass(moduleName, className, objectName):
                     XMLTemplate = module.__doc__[i+10:]
             
                     xmlStructureRetriever = XMLStructureRetriever()
-                    xml.sax.parseString(currentXML, xmlStructureRetriever)
+                    if currentEvents is not None:
+                        XMLCache.replay(currentEvents, xmlStructureRetriever)
+                    else:
+                        xml.sax.parseString(currentXML, xmlStructureRetriever)
                     currentStructure = xmlStructureRetriever.getStructure()
-                    xmlStructureRetriever = XMLStructureRetriever()
-                    xml.sax.parseString(XMLTemplate, xmlStructureRetriever)
-                    templateStructure = xmlStructureRetriever.getStructure()
+                    templateStructure = XMLCache.getTemplateStructure(module, XMLTemplate, XMLStructureRetriever)
 
                     if not templateStructure == currentStructure:
                         logging.getLogger("HWR").error('%s: XML file does not match the %s class template' % (objectName, className))
@@ -359,14 +381,29 @@ class XMLStructureRetriever(ContentHandler):
         self.path = self.path[:self.path.rfind('/')]
 
 
+class XMLReferencesRetriever(ContentHandler):
+    def __init__(self, name):
+        ContentHandler.__init__(self)
 
+        self.name = name
+        self.references = []
 
 
+    def getReferences(self):
+        return self.references
 
 
+    def startElement(self, name, attrs):
+        ref = 'hwrid' in attrs and attrs['hwrid'] or 'href' in attrs and attrs['href']
+        if ref:
+            reference = str(ref)
 
+            if reference.startswith('../'):
+                reference = '/'.join(self.name.split('/')[:-1] + [reference[3:]])
+            elif reference.startswith('./'):
+                reference = '/'.join(self.name.split('/')[:-1] + [reference[2:]])
+            if not reference.startswith('/'):
+                reference = '/' + reference
 
-
-
-
-
+            if not reference in self.references:
+                self.references.append(reference)
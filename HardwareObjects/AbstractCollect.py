@@ -172,11 +172,6 @@ class AbstractCollect(HardwareObject, object):
         self.collection_id = None
 
         try:
-            # ----------------------------------------------------------------
-            self.open_detector_cover()
-            self.open_safety_shutter()
-            self.open_fast_shutter()
-
             # ----------------------------------------------------------------
             self.current_dc_parameters["status"] = "Running"
             self.current_dc_parameters["collection_start_time"] = \
@@ -186,56 +181,8 @@ class AbstractCollect(HardwareObject, object):
                 "Collection parameters: %s" % str(self.current_dc_parameters)
             )
 
-            log.info("Collection: Storing data collection in LIMS")
-            self.store_data_collection_in_lims()
-       
-            log.info("Collection: Creating directories for raw images and processing files")
-            self.create_file_directories()
-
-            log.info("Collection: Getting sample info from parameters")
-            self.get_sample_info()
-        
-            #log.info("Collect: Storing sample info in LIMS")
-            #self.store_sample_info_in_lims()
-
-            if all(item is None for item in self.current_dc_parameters['motors'].values()):
-                # No centring point defined
-                # create point based on the current position
-                current_diffractometer_position = self.diffractometer_hwobj.getPositions()
-                for motor in self.current_dc_parameters['motors'].keys():
-                    self.current_dc_parameters['motors'][motor] = \
-                         current_diffractometer_position.get(motor)
-
-            log.info("Collection: Moving to centred position")
-            self.move_to_centered_position()
-            self.take_crystal_snapshots()
-            self.move_to_centered_position()
-
-            if "transmission" in self.current_dc_parameters:
-                log.info("Collection: Setting transmission to %.2f",
-                         self.current_dc_parameters["transmission"])
-                self.set_transmission(self.current_dc_parameters["transmission"])
-
-            if "wavelength" in self.current_dc_parameters:
-                log.info("Collection: Setting wavelength to %.4f",
-                         self.current_dc_parameters["wavelength"]
-                         )
-                self.set_wavelength(self.current_dc_parameters["wavelength"])
-
-            elif "energy" in self.current_dc_parameters:
-                log.info("Collection: Setting energy to %.4f",
-                         self.current_dc_parameters["energy"])
-                self.set_energy(self.current_dc_parameters["energy"])
-
-            if "resolution" in self.current_dc_parameters:
-                resolution = self.current_dc_parameters["resolution"]["upper"]
-                log.info("Collection: Setting resolution to %.3f", resolution)
-                self.set_resolution(resolution)
-
-            elif 'detdistance' in self.current_dc_parameters:
-                log.info("Collection: Moving detector to %.2f",
-                         self.current_dc_parameters["detdistance"])
-                self.move_detector(self.current_dc_parameters["detdistance"])
+            # independent setup steps run concurrently
+            self.run_setup_steps(self.get_setup_steps())
 
             # In order to call the hook with original parameters
             # before update_data_collection_in_lims changes them
@@ -254,6 +201,123 @@ class AbstractCollect(HardwareObject, object):
         finally:
             self.data_collection_cleanup()
 
+    def get_setup_steps(self):
+        """
+        Steps executed before the acquisition, as a list of
+        (name, function, names of the steps it depends on).
+        A step starts when the steps it depends on are finished ;
+        steps without dependencies between them run concurrently.
+        Dependencies have to be declared before the steps using them.
+        """
+        steps = [("detector_cover", self.open_detector_cover, ()),
+                 ("safety_shutter", self.open_safety_shutter, ()),
+                 ("fast_shutter", self.open_fast_shutter, ("safety_shutter", )),
+                 ("lims", self._setup_lims, ()),
+                 ("directories", self._setup_directories, ()),
+                 ("sample_info", self._setup_sample_info, ()),
+                 ("centring", self._setup_centring, ("directories", ))]
+
+        energy_dependencies = ()
+        if "wavelength" in self.current_dc_parameters or \
+           "energy" in self.current_dc_parameters:
+            steps.append(("energy", self._setup_energy, ()))
+            # attenuators and detector distance depend on the energy
+            energy_dependencies = ("energy", )
+        if "transmission" in self.current_dc_parameters:
+            steps.append(("transmission", self._setup_transmission,
+                          energy_dependencies))
+        if "resolution" in self.current_dc_parameters:
+            steps.append(("resolution", self._setup_resolution,
+                          energy_dependencies))
+        elif "detdistance" in self.current_dc_parameters:
+            steps.append(("detector_distance", self._setup_detector_distance, ()))
+        return steps
+
+    def run_setup_steps(self, steps):
+        """
+        Executes setup steps (see get_setup_steps) and waits for them.
+        If a step fails the other ones are stopped and the exception
+        is raised. Start time and duration of each step are logged and
+        emitted with the collectSetupTimes signal.
+        """
+        t0 = time.time()
+        timings = {}
+        greenlets = {}
+
+        def run_step(name, function, dependencies):
+            gevent.joinall([greenlets[dep] for dep in dependencies],
+                           raise_error=True)
+            start = time.time()
+            function()
+            timings[name] = (start - t0, time.time() - start)
+
+        for name, function, dependencies in steps:
+            greenlets[name] = gevent.spawn(run_step, name, function, dependencies)
+
+        try:
+            gevent.joinall(greenlets.values(), raise_error=True)
+        finally:
+            gevent.killall(greenlets.values())
+
+            total = time.time() - t0
+            logging.getLogger("HWR").info("Collection: setup done in %.2f s (%s)" % \
+                  (total, ", ".join(["%s %.2f s" % (name, timings[name][1]) \
+                                     for name, function, dependencies in steps \
+                                     if name in timings])))
+            self.emit("collectSetupTimes", (timings, total))
+
+    def _setup_lims(self):
+        logging.getLogger("user_level_log").info("Collection: Storing data collection in LIMS")
+        self.store_data_collection_in_lims()
+
+    def _setup_directories(self):
+        logging.getLogger("user_level_log").info("Collection: Creating directories for raw images and processing files")
+        self.create_file_directories()
+
+    def _setup_sample_info(self):
+        logging.getLogger("user_level_log").info("Collection: Getting sample info from parameters")
+        self.get_sample_info()
+
+    def _setup_centring(self):
+        if all(item is None for item in self.current_dc_parameters['motors'].values()):
+            # No centring point defined
+            # create point based on the current position
+            current_diffractometer_position = self.diffractometer_hwobj.getPositions()
+            for motor in self.current_dc_parameters['motors'].keys():
+                self.current_dc_parameters['motors'][motor] = \
+                     current_diffractometer_position.get(motor)
+
+        logging.getLogger("user_level_log").info("Collection: Moving to centred position")
+        self.move_to_centered_position()
+        self.take_crystal_snapshots()
+        self.move_to_centered_position()
+
+    def _setup_energy(self):
+        log = logging.getLogger("user_level_log")
+        if "wavelength" in self.current_dc_parameters:
+            log.info("Collection: Setting wavelength to %.4f",
+                     self.current_dc_parameters["wavelength"])
+            self.set_wavelength(self.current_dc_parameters["wavelength"])
+        else:
+            log.info("Collection: Setting energy to %.4f",
+                     self.current_dc_parameters["energy"])
+            self.set_energy(self.current_dc_parameters["energy"])
+
+    def _setup_transmission(self):
+        logging.getLogger("user_level_log").info("Collection: Setting transmission to %.2f",
+                 self.current_dc_parameters["transmission"])
+        self.set_transmission(self.current_dc_parameters["transmission"])
+
+    def _setup_resolution(self):
+        resolution = self.current_dc_parameters["resolution"]["upper"]
+        logging.getLogger("user_level_log").info("Collection: Setting resolution to %.3f", resolution)
+        self.set_resolution(resolution)
+
+    def _setup_detector_distance(self):
+        logging.getLogger("user_level_log").info("Collection: Moving detector to %.2f",
+                 self.current_dc_parameters["detdistance"])
+        self.move_detector(self.current_dc_parameters["detdistance"])
+
     def data_collection_cleanup(self):
         """
         Method called when at end of data collection, successful or not.
@@ -8,6 +8,7 @@ import abc
 import collections
 import gevent
 import autoprocessing
+from LimsWriteQueue import LimsWriteQueue
 import gevent
 from HardwareRepository.TaskUtils import *
 
@@ -56,6 +57,11 @@ class AbstractMultiCollect(object):
         self.data_collect_task = None
         self.oscillations_history = []
         self.current_lims_sample = None
+        self.lims_write_queue = None
+        # machine readings stored with images are refreshed at most
+        # every lims_readings_max_age seconds
+        self.lims_readings_max_age = 1
+        self._lims_readings = (0, None)
         self.__safety_shutter_close_task = None
         self.run_without_loop = None
         self.run_autoprocessing = None
@@ -302,6 +308,26 @@ class AbstractMultiCollect(object):
     def store_image_in_lims(self, frame, first_frame, last_frame):
       pass
 
+
+    def get_lims_write_queue(self):
+      """Queue writing images and collection updates to LIMS in background"""
+      if self.lims_write_queue is None or self.lims_write_queue.lims is not self.bl_control.lims:
+          self.lims_write_queue = LimsWriteQueue(self.bl_control.lims)
+      return self.lims_write_queue
+
+
+    def get_lims_image_readings(self):
+      """Machine and beam values stored with each image in LIMS, read
+      at most once every lims_readings_max_age seconds"""
+      timestamp, readings = self._lims_readings
+      if readings is None or time.time() - timestamp > self.lims_readings_max_age:
+          readings = {'measuredIntensity': self.get_measured_intensity(),
+                      'synchrotronCurrent': self.get_machine_current(),
+                      'machineMessage': self.get_machine_message(),
+                      'temperature': self.get_cryo_temperature()}
+          self._lims_readings = (time.time(), readings)
+      return dict(readings)
+
     
     @abc.abstractmethod
     @task
@@ -596,7 +622,7 @@ class AbstractMultiCollect(object):
                 if 'kappa' in data_collect_parameters['actualCenteringPosition']:
                     data_collect_parameters['oscillation_sequence'][0]['kappaStart'] = current_diffractometer_position['kappa']
                     data_collect_parameters['oscillation_sequence'][0]['phiStart'] = current_diffractometer_position['kappa_phi']
-                self.bl_control.lims.update_data_collection(data_collect_parameters)
+                self.get_lims_write_queue().update_data_collection(data_collect_parameters)
             except:
                 logging.getLogger("HWR").exception("Could not update data collection in LIMS")
 
@@ -709,8 +735,7 @@ class AbstractMultiCollect(object):
                     data_collect_parameters["slitGapVertical"] = vert_gap
 
                     logging.getLogger("user_level_log").info("Updating data collection in LIMS")
-                    self.bl_control.lims.update_data_collection(data_collect_parameters, wait=True)
-                    logging.getLogger("user_level_log").info("Done updating data collection in LIMS")
+                    self.get_lims_write_queue().update_data_collection(data_collect_parameters)
                   except:
                     logging.getLogger("HWR").exception("Could not store data collection into LIMS")
 
@@ -774,20 +799,15 @@ class AbstractMultiCollect(object):
                               lims_image={'dataCollectionId': self.collection_id,
                                           'fileName': filename,
                                           'fileLocation': file_location,
-                                          'imageNumber': frame,
-                                          'measuredIntensity': self.get_measured_intensity(),
-                                          'synchrotronCurrent': self.get_machine_current(),
-                                          'machineMessage': self.get_machine_message(),
-                                          'temperature': self.get_cryo_temperature()}
+                                          'imageNumber': frame}
+                              lims_image.update(self.get_lims_image_readings())
 
                               if archive_directory:
                                 lims_image['jpegFileFullPath'] = jpeg_full_path
                                 lims_image['jpegThumbnailFileFullPath'] = jpeg_thumbnail_full_path
 
-                              try:
-                                  self.bl_control.lims.store_image(lims_image)
-                              except:
-                                  logging.getLogger("HWR").exception("Could not store store image in LIMS")
+                              # written in background, LIMS latency does not delay acquisition
+                              self.get_lims_write_queue().store_image(lims_image)
                           
                               self.generate_image_jpeg(str(file_path), str(jpeg_full_path), str(jpeg_thumbnail_full_path),wait=False)
                           if data_collect_parameters.get("processing", False)=="True":
@@ -877,7 +897,7 @@ class AbstractMultiCollect(object):
                 if self.bl_control.lims:    
                   data_collect_parameters["flux_end"]=self.get_flux()
                   try:
-                    self.bl_control.lims.update_data_collection(data_collect_parameters)
+                    self.get_lims_write_queue().update_data_collection(data_collect_parameters)
                   except:
                     logging.getLogger("HWR").exception("Could not store data collection into LIMS")
                                   
@@ -892,6 +912,9 @@ class AbstractMultiCollect(object):
             except:
               logging.exception("Could not close safety shutter")
         finally:
+           if self.lims_write_queue is not None:
+               # write the queued records now, without waiting for LIMS
+               self.lims_write_queue.flush(timeout=0)
            self.emit("collectEnded", owner, not failed, failed_msg if failed else "Data collection successful")
            self.emit("collectReady", (True, ))
 
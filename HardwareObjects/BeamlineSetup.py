@@ -4,7 +4,8 @@ import jsonpickle
 import queue_model_objects_v1 as queue_model_objects
 
 from HardwareRepository.BaseHardwareObjects import HardwareObject
-from XSDataMXCuBEv1_3 import XSDataInputMXCuBE
+import XSDataLazy
+XSDataInputMXCuBE = XSDataLazy.LazyClass("XSDataInputMXCuBE")
 import queue_model_enumerables_v1 as queue_model_enumerables
 
 from HardwareRepository.HardwareRepository import HardwareRepository
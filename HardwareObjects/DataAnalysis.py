@@ -10,21 +10,21 @@ import queue_model_enumerables_v1 as qme
 from HardwareRepository.BaseHardwareObjects import HardwareObject
 from HardwareRepository.HardwareRepository import HardwareRepository
 
-from XSDataMXCuBEv1_3 import XSDataInputMXCuBE
-from XSDataMXCuBEv1_3 import XSDataMXCuBEDataSet
-from XSDataMXCuBEv1_3 import XSDataResultMXCuBE
-
-from XSDataCommon import XSDataAngle
-from XSDataCommon import XSDataBoolean
-from XSDataCommon import XSDataDouble
-from XSDataCommon import XSDataFile
-from XSDataCommon import XSDataFlux
-from XSDataCommon import XSDataLength
-from XSDataCommon import XSDataTime
-from XSDataCommon import XSDataWavelength
-from XSDataCommon import XSDataInteger
-from XSDataCommon import XSDataSize
-from XSDataCommon import XSDataString
+import XSDataLazy
+XSDataInputMXCuBE = XSDataLazy.LazyClass("XSDataInputMXCuBE")
+XSDataMXCuBEDataSet = XSDataLazy.LazyClass("XSDataMXCuBEDataSet")
+XSDataResultMXCuBE = XSDataLazy.LazyClass("XSDataResultMXCuBE")
+XSDataAngle = XSDataLazy.LazyClass("XSDataAngle")
+XSDataBoolean = XSDataLazy.LazyClass("XSDataBoolean")
+XSDataDouble = XSDataLazy.LazyClass("XSDataDouble")
+XSDataFile = XSDataLazy.LazyClass("XSDataFile")
+XSDataFlux = XSDataLazy.LazyClass("XSDataFlux")
+XSDataLength = XSDataLazy.LazyClass("XSDataLength")
+XSDataTime = XSDataLazy.LazyClass("XSDataTime")
+XSDataWavelength = XSDataLazy.LazyClass("XSDataWavelength")
+XSDataInteger = XSDataLazy.LazyClass("XSDataInteger")
+XSDataSize = XSDataLazy.LazyClass("XSDataSize")
+XSDataString = XSDataLazy.LazyClass("XSDataString")
 
 #from edna_test_data import EDNA_DEFAULT_INPUT
 #from edna_test_data import EDNA_TEST_DATA
@@ -23,12 +23,12 @@ import logging
 import gevent
 import subprocess
 
-from XSDataAutoprocv1_0 import XSDataAutoprocInput
-
-from XSDataCommon import XSDataDouble
-from XSDataCommon import XSDataFile
-from XSDataCommon import XSDataInteger
-from XSDataCommon import XSDataString
+import XSDataLazy
+XSDataAutoprocInput = XSDataLazy.LazyClass("XSDataAutoprocInput")
+XSDataDouble = XSDataLazy.LazyClass("XSDataDouble")
+XSDataFile = XSDataLazy.LazyClass("XSDataFile")
+XSDataInteger = XSDataLazy.LazyClass("XSDataInteger")
+XSDataString = XSDataLazy.LazyClass("XSDataString")
 
 from HardwareRepository.BaseHardwareObjects import HardwareObject
 
@@ -24,13 +24,14 @@ import logging
 
 from GenericParallelProcessing import GenericParallelProcessing
 
-from XSDataCommon import XSDataBoolean
-from XSDataCommon import XSDataDouble
-from XSDataCommon import XSDataInteger
-from XSDataCommon import XSDataString
-from XSDataControlDozorv1_1 import XSDataInputControlDozor
-from XSDataControlDozorv1_1 import XSDataResultControlDozor
-from XSDataControlDozorv1_1 import XSDataControlImageDozor
+import XSDataLazy
+XSDataBoolean = XSDataLazy.LazyClass("XSDataBoolean")
+XSDataDouble = XSDataLazy.LazyClass("XSDataDouble")
+XSDataInteger = XSDataLazy.LazyClass("XSDataInteger")
+XSDataString = XSDataLazy.LazyClass("XSDataString")
+XSDataInputControlDozor = XSDataLazy.LazyClass("XSDataInputControlDozor")
+XSDataResultControlDozor = XSDataLazy.LazyClass("XSDataResultControlDozor")
+XSDataControlImageDozor = XSDataLazy.LazyClass("XSDataControlImageDozor")
 
 import numpy
 
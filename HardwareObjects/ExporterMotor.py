@@ -2,6 +2,7 @@ import math
 import logging
 import time
 from gevent import Timeout
+from gevent.event import Event
 from AbstractMotor import AbstractMotor
 from HardwareRepository.BaseHardwareObjects import Device
 
@@ -25,6 +26,7 @@ class ExporterMotor(AbstractMotor):
         self.motor_name = None
         self.motor_resolution = None
         self.motor_pos_attr_suffix = None
+        self._state_changed = Event()
 
     def init(self): 
         self.motor_name = self.getProperty("motor_name")
@@ -82,6 +84,9 @@ class ExporterMotor(AbstractMotor):
             new_motor_state = self.motor_states.fromstring(d[self.motor_name])
         if self.get_state() != new_motor_state:
             self.set_state(new_motor_state)
+            # wake up wait_end_of_move
+            state_changed, self._state_changed = self._state_changed, Event()
+            state_changed.set()
 
     def limits_changed(self):
         self.emit('limitsChanged', (self.get_limits(), ))
@@ -127,9 +132,13 @@ class ExporterMotor(AbstractMotor):
 
     def wait_end_of_move(self, timeout=None):
         with Timeout(timeout):
-           time.sleep(0.1)
-           while not self.is_ready():
-              time.sleep(0.1) 
+           # state may not be MOVING right after the move started
+           self._state_changed.wait(0.1)
+           while True:
+              state_changed = self._state_changed
+              if self.is_ready():
+                  break
+              state_changed.wait(0.5)
 
     def getMotorMnemonic(self):
         return self.motor_name
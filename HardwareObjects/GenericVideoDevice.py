@@ -54,6 +54,48 @@ else:
     from PIL import Image
 
 from HardwareRepository.BaseHardwareObjects import Device
+from HardwareRepository.HardwareRepository import dispatcher
+
+
+class FrameBuffer:
+    """Ring of preallocated numpy frame buffers
+
+    Decoders write frames in place in the next buffer of the ring, and
+    consumers (display, JPEG encoding, snapshots, centring) get views of
+    the same buffer instead of copies. A frame is not overwritten before
+    size - 1 newer frames have been written. Consumers must not modify
+    frames.
+    """
+    def __init__(self, size=3):
+        self.size = size
+        self.buffers = [None] * size
+        self.write_index = 0
+        self.last_frame = None
+        self.frame_number = 0
+
+    def get_write_buffer(self, shape, dtype=np.uint8):
+        """Returns the buffer where the next frame has to be written"""
+        buf = self.buffers[self.write_index]
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            self.buffers[self.write_index] = buf
+        return buf
+
+    def commit(self):
+        """Makes the frame written in the write buffer the last frame"""
+        frame = self.buffers[self.write_index]
+        self.write_index = (self.write_index + 1) % self.size
+        return self.set_last_frame(frame)
+
+    def set_last_frame(self, frame):
+        """Sets a frame which does not need decoding as last frame"""
+        self.last_frame = frame
+        self.frame_number += 1
+        return frame
+
+    def get_last_frame(self):
+        return self.last_frame
+
 
 class GenericVideoDevice(Device):
 
@@ -61,6 +103,9 @@ class GenericVideoDevice(Device):
     default_poll_interval = 50
     default_cam_type = "basler"
     default_scale_factor = 1.0
+    default_frame_buffers = 3
+    default_jpeg_quality = 75
+    default_max_image_rate = None
 
     def __init__(self, name):
         Device.__init__(self,name)
@@ -79,6 +124,9 @@ class GenericVideoDevice(Device):
         self.image_format = None # not used
         self.default_cam_encoding = None
         self.default_poll_interval = None
+        self.frame_buffer = None
+        self.jpeg_quality = None
+        self._jpeg_cache = {}
 
     def init(self):
         try:
@@ -123,6 +171,18 @@ class GenericVideoDevice(Device):
         except:
             pass
 
+        self.frame_buffer = FrameBuffer(self.getProperty("frame_buffers",
+                                        GenericVideoDevice.default_frame_buffers))
+        self.jpeg_quality = self.getProperty("jpeg_quality",
+                                             GenericVideoDevice.default_jpeg_quality)
+
+        max_image_rate = self.getProperty("max_image_rate",
+                                          GenericVideoDevice.default_max_image_rate)
+        if max_image_rate:
+            # receivers of imageReceived only get the newest image,
+            # at most max_image_rate times per second
+            self.set_signal_max_rate("imageReceived", float(max_image_rate))
+
         # Apply defaults if necessary
         if self.cam_encoding is None:
             self.cam_encoding = self.default_cam_encoding
@@ -165,27 +225,61 @@ class GenericVideoDevice(Device):
         logging.getLogger("HWR").info('Polling ended exception for qt4 camera')
 
     """ Generic methods """
+    def get_frame(self):
+        """
+        Descript. : acquires and decodes a new frame
+        Returns   : (frame, width, height) where frame is a RGB numpy
+                    array (height x width x 3) shared with other consumers,
+                    or None
+        """
+        raw_buffer, width, height = self.get_image()
+
+        if raw_buffer is None:
+            return None, width, height
+
+        if self.frame_buffer is None:
+            self.frame_buffer = FrameBuffer(GenericVideoDevice.default_frame_buffers)
+
+        if self.cam_type == "basler":
+            frame = self.frame_buffer.get_write_buffer(\
+                 (self.image_dimensions[1], self.image_dimensions[0], 3))
+            self.decoder(raw_buffer, frame)
+            frame = self.frame_buffer.commit()
+        else:
+            frame = np.frombuffer(raw_buffer, dtype=np.uint8,
+                                  count=width * height * 3)
+            frame = self.frame_buffer.set_last_frame(\
+                 frame.reshape(height, width, 3))
+        return frame, frame.shape[1], frame.shape[0]
+
+    def get_last_frame(self):
+        """
+        Descript. : returns the last decoded frame (see get_frame),
+                    without acquiring a new one
+        """
+        if self.frame_buffer is not None:
+            return self.frame_buffer.get_last_frame()
+
     def get_new_image(self):
         """
         Descript. :
         """
-        raw_buffer, width, height = self.get_image()
+        frame, width, height = self.get_frame()
 
-        if raw_buffer is not None:
-            if self.cam_type == "basler":
-                raw_buffer = self.decoder(raw_buffer)
-                qimage = QImage(raw_buffer, width, height,
-                                width * 3,
-                                QImage.Format_RGB888)
-            else:
-                qimage = QImage(raw_buffer, width, height,
-                                QImage.Format_RGB888)
+        if frame is not None:
+            qimage = QImage(frame, width, height,
+                            width * 3,
+                            QImage.Format_RGB888)
 
-            if self.cam_mirror is not None:
+            if self.cam_mirror is not None and any(self.cam_mirror):
                 qimage = qimage.mirrored(self.cam_mirror[0], self.cam_mirror[1])     
+            else:
+                # the frame buffer is overwritten by the next frames
+                qimage = qimage.copy()
 
             qpixmap = QPixmap(qimage)
             self.emit("imageReceived", qpixmap)
+            self.emit("frameReceived", frame, width, height)
             return qimage
 
     def get_jpg_image(self):
@@ -193,32 +287,71 @@ class GenericVideoDevice(Device):
         """
            the signal imageReceived is as expected by mxcube3 
         """
-        raw_buffer, width, height = self.get_image()
+        frame, width, height = self.get_frame()
 
-        if raw_buffer is not None and raw_buffer.any():
-            image = Image.frombytes("RGB", (width, height), raw_buffer)
-            from cStringIO import StringIO
-            strbuf = StringIO()
-            image.save(strbuf, "JPEG")
-            jpgimg_str = strbuf.getvalue()
+        if frame is not None and frame.any():
+            self.emit("frameReceived", frame, width, height)
+            jpgimg_str, width, height = self.get_jpeg_frame()
             if jpgimg_str is not None:
                 self.emit("imageReceived", jpgimg_str, width, height)
             return jpgimg_str
         else:
             return None
 
+    def get_jpeg_frame(self, quality=None, scale=1.0):
+        """
+        Descript. : JPEG encoding of the last frame. A frame is encoded
+                    at most once per quality and scale, whatever the
+                    number of consumers asking for it
+        Returns   : (jpeg string, width, height), or (None, None, None)
+                    if there is no frame yet
+        """
+        if self.frame_buffer is None:
+            return None, None, None
+        frame = self.frame_buffer.get_last_frame()
+        if frame is None:
+            return None, None, None
+
+        if quality is None:
+            quality = self.jpeg_quality or GenericVideoDevice.default_jpeg_quality
+        key = (quality, scale)
+        frame_number = self.frame_buffer.frame_number
+
+        cached = self._jpeg_cache.get(key)
+        if cached is not None and cached[0] == frame_number:
+            return cached[1:]
+
+        from PIL import Image
+        from cStringIO import StringIO
+
+        height, width = frame.shape[:2]
+        image = Image.frombuffer("RGB", (width, height), frame,
+                                 "raw", "RGB", 0, 1)
+        if scale != 1.0:
+            width = max(1, int(width * scale))
+            height = max(1, int(height * scale))
+            image = image.resize((width, height), Image.BILINEAR)
+        strbuf = StringIO()
+        image.save(strbuf, "JPEG", quality=quality)
+        jpgimg_str = strbuf.getvalue()
+
+        self._jpeg_cache[key] = (frame_number, jpgimg_str, width, height)
+        return jpgimg_str, width, height
+
     def get_cam_type(self):
         return self.cam_type
 
-    def y8_2_rgb(self, raw_buffer):
-        image = np.fromstring(raw_buffer, dtype=np.uint8)
-        image.resize(self.image_dimensions[1], self.image_dimensions[0], 1)
-        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    def y8_2_rgb(self, raw_buffer, out=None):
+        width, height = self.image_dimensions
+        image = np.frombuffer(raw_buffer, dtype=np.uint8,
+                              count=width * height).reshape(height, width, 1)
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB, out)
 
-    def yuv_2_rgb(self, raw_buffer):
-        image = np.fromstring(raw_buffer, dtype=np.uint8)
-        image.resize(self.image_dimensions[1], self.image_dimensions[0], 2)
-        return cv2.cvtColor(image, cv2.COLOR_YUV2RGB_UYVY)
+    def yuv_2_rgb(self, raw_buffer, out=None):
+        width, height = self.image_dimensions
+        image = np.frombuffer(raw_buffer, dtype=np.uint8,
+                              count=width * height * 2).reshape(height, width, 2)
+        return cv2.cvtColor(image, cv2.COLOR_YUV2RGB_UYVY, out)
 
     def save_snapshot(self, filename, image_type='PNG'):
         if USEQT:
@@ -228,28 +361,66 @@ class GenericVideoDevice(Device):
             jpgstr = self.get_jpg_image()
             open(filename,"w").write(jpgstr)
 
+    def has_frame_source(self):
+        """
+        Descript. : True if the class implements get_image (raw frames,
+                    see get_frame). Classes only implementing
+                    get_new_image (QImage) do not have frames
+        """
+        get_image = getattr(self.__class__.get_image, "__func__", None)
+        return get_image is not GenericVideoDevice.get_image.__func__
+
     def get_snapshot(self, bw=None, return_as_array=True):
+        """
+        Descript. : returns a new image, as a numpy array (B, G, R, 255
+                    layout of QImage.Format_RGB32, or gray levels if bw)
+                    or as a QImage. Snapshot arrays are built from the
+                    frame, without QImage and QPixmap : frameReceived is
+                    emitted, but not imageReceived (images are sent by the
+                    polling). Classes without frame source get the array
+                    of the QImage of get_new_image (which emits both)
+        """
+        if return_as_array and self.has_frame_source():
+            frame, width, height = self.get_frame()
+            if frame is None:
+                return None
+            self.emit("frameReceived", frame, width, height)
+            if self.cam_mirror is not None and any(self.cam_mirror):
+                # same as QImage.mirrored(horizontal, vertical)
+                if self.cam_mirror[0]:
+                    frame = frame[:, ::-1]
+                if self.cam_mirror[1]:
+                    frame = frame[::-1]
+            # copy with the layout of a QImage.Format_RGB32 array: B, G, R, 255
+            image_array = np.empty(frame.shape[:2] + (4,), dtype=np.uint8)
+            image_array[..., :3] = frame[..., ::-1]
+            image_array[..., 3] = 255
+            if bw:
+                return np.dot(image_array[...,:3],[0.299, 0.587, 0.144])
+            else:
+                return image_array
+
         if not USEQT:
             print "get snapshot not implemented yet for non-qt mode"
             return None
 
         qimage = self.get_new_image()
         if return_as_array:
+            if qimage is None:
+                return None
             qimage = qimage.convertToFormat(4)
             ptr = qimage.bits()
             ptr.setsize(qimage.byteCount())
-            image_array = np.array(ptr).reshape(qimage.height(),
-                                                qimage.width(), 4)
+
+            image_array = np.array(ptr).reshape(qimage.height(), qimage.width(), 4)
             if bw:
                 return np.dot(image_array[...,:3],[0.299, 0.587, 0.144])
             else:
-                return image_array 
-            
+                return image_array
+        if bw:
+            return qimage.convertToFormat(QImage.Format_Mono)
         else:
-            if bw:
-                return qimage.convertToFormat(QImage.Format_Mono)
-            else:
-                return qimage
+            return qimage
 
     def get_scaling_factor(self):
         """
@@ -311,19 +482,22 @@ class GenericVideoDevice(Device):
         while self.get_video_live() == True:
             if USEQT:
                 self.get_new_image()
-            else:
+            elif self.has_subscribers("imageReceived"):
                 self.get_jpg_image()
+            elif self.has_subscribers("frameReceived"):
+                # raw frames only, no JPEG encoding
+                frame, width, height = self.get_frame()
+                if frame is not None:
+                    self.emit("frameReceived", frame, width, height)
             time.sleep(sleep_time)
 
-    def connectNotify(self, signal):
+    def has_subscribers(self, signal):
         """
-        Descript. :
+        Descript. : True if a receiver is connected to signal
         """
-        return
-
-        """if signal == "imageReceived" and self.image_polling is None:
-            self.image_polling = gevent.spawn(self.do_image_polling,
-                 self.poll_interval/1000.0)"""
+        for receiver in dispatcher.get_all_receivers(self, str(signal)):
+            return True
+        return False
 
     def refresh_video(self):
         """
@@ -5,6 +5,7 @@ A client for ISPyB Webservices.
 
 import logging
 import gevent
+import gevent.lock
 import suds; logging.getLogger("suds").setLevel(logging.INFO)
 import os
 import itertools
@@ -12,6 +13,7 @@ import time
 import json
 
 from suds.client import Client
+from suds.cache import ObjectCache
 from suds import WebFault
 from suds.sudsobject import asdict
 from urllib2 import URLError
@@ -35,6 +37,12 @@ _WS_AUTOPROC_URL = _WSDL_ROOT + 'ToolsForAutoprocessingWebService?wsdl'
 _WS_USERNAME = None
 _WS_PASSWORD = None
 
+# Parsed WSDL and schemas are cached on disk, see SOAPClientPool
+_WSDL_CACHE_DIR = os.path.join(os.environ.get("HWR_CACHE_DIR",
+                               os.path.join(os.path.expanduser("~"), ".cache", "mxcube_hwr")),
+                               "suds")
+_WSDL_CACHE_DAYS = 1
+
 _CONNECTION_ERROR_MSG = "Could not connect to ISPyB, please verify that " + \
                         "the server is running and that your " + \
                         "configuration is correct"
@@ -45,6 +53,64 @@ SampleReference = namedtuple('SampleReference', ['code',
                                                  'sample_reference',
                                                  'container_code'])
 
+
+class _SampleReferenceIndex(object):
+    """
+    The sample changer sample_refs indexed by code and by location
+    (container, sample), to match the LIMS samples without scanning
+    the whole list for each of them.
+    """
+    def __init__(self, sample_references):
+        self._references = list(sample_references)
+        self._removed = set()
+        self._by_code = {}
+        self._by_location = {}
+        for i, sample_ref in enumerate(self._references):
+            self._by_code.setdefault(sample_ref.code, []).append(i)
+            self._by_location.setdefault((sample_ref.container_reference,
+                                          sample_ref.sample_reference), []).append(i)
+
+    def _first(self, indexes, code=None):
+        for i in indexes:
+            if i in self._removed:
+                continue
+            if code and self._references[i].code != code:
+                continue
+            return i
+        return None
+
+    def find(self, code=None, location=None):
+        """
+        Returns the first sample_ref with the given code and/or location
+        (a (<basket>, <vial>) tuple), or None
+        """
+        if location:
+            i = self._first(self._by_location.get(tuple(location), ()), code)
+        elif code:
+            i = self._first(self._by_code.get(code, ()))
+        else:
+            i = None
+        if i is None:
+            return None
+        return self._references[i]
+
+    def remove(self, sample_ref):
+        if sample_ref is not None:
+            location = (sample_ref.container_reference, sample_ref.sample_reference)
+            for i in self._by_location.get(location, ()):
+                if i not in self._removed and self._references[i] == sample_ref:
+                    self._removed.add(i)
+                    return
+        raise ValueError("sample reference not found")
+
+    def remaining(self):
+        """
+        Returns the sample_refs not removed, in their original order
+        """
+        return [sample_ref for i, sample_ref in enumerate(self._references) \
+                if i not in self._removed]
+
+
 def trace(fun):
     def _trace(*args):
         log_msg = "lims client " + fun.__name__ + " called with: "
@@ -102,6 +168,153 @@ def utf_encode(res_d):
     return res_d
 
 
+class _PooledService(object):
+    """Calls SOAP operations on a clone of the shared client"""
+    def __init__(self, pool, url):
+        self._pool = pool
+        self._url = url
+
+    def __getattr__(self, operation):
+        if operation.startswith("_"):
+            raise AttributeError(operation)
+        def call(*args, **kwargs):
+            return self._pool.call(self._url, operation, *args, **kwargs)
+        call.__name__ = operation
+        return call
+
+
+class PooledClient(object):
+    """Drop-in replacement of a suds Client, backed by SOAPClientPool
+
+    The WSDL is downloaded and parsed once per url ; each call of
+    client.service.<operation> runs on its own clone of the parsed client,
+    so concurrent greenlets never share a client.
+    """
+    def __init__(self, pool, url):
+        self._pool = pool
+        self.url = url
+        self.service = _PooledService(pool, url)
+
+    @property
+    def factory(self):
+        return self._pool.get_master(self.url).factory
+
+    @property
+    def wsdl(self):
+        return self._pool.get_master(self.url).wsdl
+
+    def set_options(self, **kwargs):
+        self._pool.set_options(self.url, **kwargs)
+
+
+class SOAPClientPool:
+    """Shared suds clients, one parsed WSDL per url
+
+    Parsed WSDL and schemas are kept in a suds ObjectCache on disk, so
+    only the first process start downloads them. Idle clones of each client
+    are kept for reuse. Execution time of each SOAP operation is recorded,
+    see get_statistics.
+    """
+    def __init__(self, cache_dir=_WSDL_CACHE_DIR, cache_days=_WSDL_CACHE_DAYS):
+        self.cache_dir = cache_dir
+        self.cache_days = cache_days
+        self._masters = {}
+        self._idle = {}
+        self._lock = gevent.lock.Semaphore()
+        self._stats = {}
+
+    def _cache(self):
+        try:
+            return ObjectCache(location=self.cache_dir, days=self.cache_days)
+        except Exception:
+            logging.getLogger("ispyb_client").\
+                warning("Cannot use WSDL cache directory %s", self.cache_dir)
+            return None
+
+    def register(self, url, **kwargs):
+        """Creates the client of url with the given suds options and
+        returns a PooledClient. If the client exists, the options are
+        applied to it (and to the clones used from now on)"""
+        created = False
+        with self._lock:
+            if url not in self._masters:
+                kwargs.setdefault("cache", self._cache())
+                t0 = time.time()
+                self._masters[url] = Client(url, **kwargs)
+                self._record("wsdl:" + url, time.time() - t0)
+                self._idle[url] = []
+                created = True
+        if not created:
+            self.set_options(url, **kwargs)
+        return PooledClient(self, url)
+
+    def get_master(self, url):
+        master = self._masters.get(url)
+        if master is None:
+            self.register(url)
+            master = self._masters[url]
+        return master
+
+    def set_options(self, url, **kwargs):
+        if "cache" in kwargs:
+            # the parsed WSDL cache is managed by the pool
+            kwargs.pop("cache")
+        if kwargs:
+            self.get_master(url).set_options(**kwargs)
+            # clones in use go back to the former list and are dropped
+            self._idle[url] = []
+
+    def call(self, url, operation, *args, **kwargs):
+        master = self.get_master(url)
+        idle = self._idle[url]
+        if idle:
+            client = idle.pop()
+        else:
+            client = master.clone()
+        t0 = time.time()
+        try:
+            result = getattr(client.service, operation)(*args, **kwargs)
+        except:
+            self._record(operation, time.time() - t0, error=True)
+            raise
+        else:
+            self._record(operation, time.time() - t0)
+            return result
+        finally:
+            idle.append(client)
+
+    def _record(self, operation, duration, error=False):
+        stats = self._stats.get(operation)
+        if stats is None:
+            stats = self._stats[operation] = {"calls": 0,
+                                              "errors": 0,
+                                              "total_time": 0,
+                                              "max_time": 0}
+        stats["calls"] += 1
+        if error:
+            stats["errors"] += 1
+        stats["total_time"] += duration
+        stats["max_time"] = max(duration, stats["max_time"])
+
+    def get_statistics(self):
+        """Returns {operation: {"calls", "errors", "total_time", "max_time",
+           "mean_time"}}, times in seconds. Operations named wsdl:<url>
+           give the time spent to get and parse each WSDL"""
+        result = {}
+        for operation, stats in self._stats.items():
+            stats = dict(stats)
+            stats["mean_time"] = stats["total_time"] / stats["calls"]
+            result[operation] = stats
+        return result
+
+
+_client_pool = SOAPClientPool()
+
+
+def get_client_pool():
+    return _client_pool
+
+
 class ISPyBClient2(HardwareObject):
     """
     Web-service client for ISPyB.
@@ -125,6 +338,9 @@ class ISPyBClient2(HardwareObject):
         self.ws_root = None
         self.ws_username = None
         self.ws_password = None
+
+        # findSampleInfoLightForProposal responses per proposal
+        self._samples_cache = {}
         
     def init(self):
         """
@@ -188,20 +404,14 @@ class ISPyBClient2(HardwareObject):
                                        password = self.ws_password)
                 
                 try: 
-                    self._shipping = Client(_WS_SHIPPING_URL, timeout = 3,
-                                             transport = t1, cache = None)
-                    self._collection = Client(_WS_COLLECTION_URL, timeout = 3,
-                                               transport = t2, cache = None)
-                    self._tools_ws = Client(_WS_BL_SAMPLE_URL, timeout = 3,
-                                             transport = t3, cache = None)
-                    self._autoproc_ws = Client(_WS_AUTOPROC_URL, timeout = 3,
-                                             transport = t4, cache = None)
-                
-                    # ensure that suds do not create those files in tmp 
-                    self._shipping.set_options(cache=None)
-                    self._collection.set_options(cache=None)
-                    self._tools_ws.set_options(cache=None)
-                    self._autoproc_ws.set_options(cache=None)
+                    self._shipping = _client_pool.register(_WS_SHIPPING_URL,
+                                             timeout = 3, transport = t1)
+                    self._collection = _client_pool.register(_WS_COLLECTION_URL,
+                                             timeout = 3, transport = t2)
+                    self._tools_ws = _client_pool.register(_WS_BL_SAMPLE_URL,
+                                             timeout = 3, transport = t3)
+                    self._autoproc_ws = _client_pool.register(_WS_AUTOPROC_URL,
+                                             timeout = 3, transport = t4)
                 except URLError:
                     logging.getLogger("ispyb_client")\
                         .exception(_CONNECTION_ERROR_MSG)
@@ -229,6 +439,13 @@ class ISPyBClient2(HardwareObject):
                 except AttributeError:
                     pass
 
+    def get_soap_statistics(self):
+        """
+        Execution time of the SOAP operations, see
+        SOAPClientPool.get_statistics
+        """
+        return _client_pool.get_statistics()
+
     def get_login_type(self):
         return self.loginType
 
@@ -565,6 +782,7 @@ class ISPyBClient2(HardwareObject):
         return True, "True"
 
     def login(self,loginID, psd, ldap_connection=None):
+        self.invalidate_samples_cache()
         if ldap_connection is None:
             ldap_connection = self.ldapConnection
         login_name=loginID
@@ -839,28 +1057,32 @@ class ISPyBClient2(HardwareObject):
             return
 
         if self._collection:
-            if 'collection_id' in mx_collection:
-                try:
-                    # Update the data collection group
-                    self.store_data_collection_group(mx_collection)
-                    data_collection = ISPyBValueFactory().\
-                        from_data_collect_parameters(self._collection, mx_collection)
-                    self._collection.service.\
-                        storeOrUpdateDataCollection(data_collection)
-                except WebFault:
-                    logging.getLogger("ispyb_client").\
-                        exception("ISPyBClient: exception in update_data_collection")
-                except URLError:
-                    logging.getLogger("ispyb_client").exception(_CONNECTION_ERROR_MSG)
-            else:
-                logging.getLogger("ispyb_client").error("Error in update_data_collection: " + \
-                                        "collection-id missing, the ISPyB data-collection is not updated.")
-
+            try:
+                self._update_data_collection(mx_collection)
+            except URLError:
+                logging.getLogger("ispyb_client").exception(_CONNECTION_ERROR_MSG)
         else:
             logging.getLogger("ispyb_client").\
                 exception("Error in update_data_collection: could not connect" + \
                           " to server")
 
+    def _update_data_collection(self, mx_collection):
+        """Updates mx_collection, connection errors are raised"""
+        if 'collection_id' in mx_collection:
+            try:
+                # Update the data collection group
+                self.store_data_collection_group(mx_collection)
+                data_collection = ISPyBValueFactory().\
+                    from_data_collect_parameters(self._collection, mx_collection)
+                self._collection.service.\
+                    storeOrUpdateDataCollection(data_collection)
+            except WebFault:
+                logging.getLogger("ispyb_client").\
+                    exception("ISPyBClient: exception in update_data_collection")
+        else:
+            logging.getLogger("ispyb_client").error("Error in update_data_collection: " + \
+                                    "collection-id missing, the ISPyB data-collection is not updated.")
+
 
     @trace
     def update_bl_sample(self, bl_sample):
@@ -873,6 +1095,8 @@ class ISPyBClient2(HardwareObject):
         if self._disabled:
            return {}
 
+        self.invalidate_samples_cache()
+
         if self._tools_ws:
             try:
                 status = self._tools_ws.service.\
@@ -903,68 +1127,110 @@ class ISPyBClient2(HardwareObject):
             return
     
         if self._collection:
-            logging.getLogger("HWR").debug("Storing image in lims. data to store: %s" % str(image_dict))
-            if 'dataCollectionId' in image_dict:
-                try:
-                    image_id = self._collection.service.storeOrUpdateImage(image_dict)
-                    logging.getLogger("HWR").debug("  - storing image in lims ok. id : %s" % image_id)
-                    return image_id
-                except WebFault:
-                    logging.getLogger("ispyb_client").\
-                        exception("ISPyBClient: exception in store_image")
-                except URLError:
-                    logging.getLogger("ispyb_client").exception(_CONNECTION_ERROR_MSG)
-            else:
-                logging.getLogger("ispyb_client").error("Error in store_image: " + \
-                                                        "data_collection_id missing, could not store image in ISPyB")
+            try:
+                return self._store_image(image_dict)
+            except URLError:
+                logging.getLogger("ispyb_client").exception(_CONNECTION_ERROR_MSG)
         else:
             logging.getLogger("ispyb_client").\
                 exception("Error in store_image: could not connect to server")
 
+    def _store_image(self, image_dict):
+        """Stores image_dict, returns the image id ; connection errors
+        are raised"""
+        logging.getLogger("HWR").debug("Storing image in lims. data to store: %s" % str(image_dict))
+        if 'dataCollectionId' in image_dict:
+            try:
+                image_id = self._collection.service.storeOrUpdateImage(image_dict)
+                logging.getLogger("HWR").debug("  - storing image in lims ok. id : %s" % image_id)
+                return image_id
+            except WebFault:
+                logging.getLogger("ispyb_client").\
+                    exception("ISPyBClient: exception in store_image")
+        else:
+            logging.getLogger("ispyb_client").error("Error in store_image: " + \
+                                                    "data_collection_id missing, could not store image in ISPyB")
 
-    def __find_sample(self, sample_ref_list, code = None, location = None):
+    def store_images(self, image_dicts):
         """
-        Returns the sample with the matching "search criteria" <code> and/or
-        <location> with-in the list sample_ref_list.
+        Stores a batch of images (see store_image), used by LimsWriteQueue.
+        Stored images are removed from image_dicts. Images rejected by
+        ISPyB are logged and removed too ; other errors are raised,
+        leaving in image_dicts the images not stored (the first one
+        being the image which failed).
 
-        The sample_ref object is defined in the head of the file.
+        :param image_dicts: list of image dictionaries
+        :type image_dicts: list
+
+        :returns: None
+        """
+        self._write_batch(image_dicts, self._store_image, "store_images")
 
-        :param sample_ref_list: The list of sample_refs to search.
-        :type sample_ref: list
+    def update_data_collections(self, mx_collections):
+        """
+        Updates a batch of data collections (see update_data_collection),
+        used by LimsWriteQueue. Same error handling as store_images.
 
-        :param code: The vial datamatrix code (or bar code)
-        :param type: str
+        :param mx_collections: list of collection parameters dictionaries
+        :type mx_collections: list
 
-        :param location: A tuple (<basket>, <vial>) to search for.
-        :type location: tuple
+        :returns: None
         """
-        for sample_ref in sample_ref_list:
+        self._write_batch(mx_collections, self._update_data_collection, "update_data_collections")
 
-            if code and location:
-                if sample_ref.code == code and \
-                        sample_ref.container_reference == location[0] and \
-                        sample_ref.sample_reference == location[1]:
-                    return sample_ref
-            elif code:
-                if sample_ref.code == code:
-                    return sample_ref
-            elif location:
-                if sample_ref.container_reference == location[0] and \
-                       sample_ref.sample_reference == location[1]:
-                    return sample_ref
+    def _write_batch(self, records, write_method, method_name):
+        if self._disabled or not self._collection:
+            if not self._disabled:
+                logging.getLogger("ispyb_client").\
+                    error("Error in %s: could not connect to server", method_name)
+            del records[:]
+            return
 
-        return None
+        while records:
+            write_method(records[0])
+            records.pop(0)
+
+    def invalidate_samples_cache(self, proposal_id=None):
+        """
+        Forgets the samples read from ISPyB (for proposal_id, or for all
+        the proposals), the next get_samples / get_session_samples reads
+        them again.
+        """
+        if proposal_id is None:
+            self._samples_cache.clear()
+        else:
+            self._samples_cache.pop(proposal_id, None)
+
+    def _find_sample_info_light(self, proposal_id):
+        """
+        Returns the findSampleInfoLightForProposal response, cached until
+        invalidate_samples_cache is called. The response does not depend
+        on the session. Callers must not modify it.
+        """
+        if proposal_id not in self._samples_cache:
+            self._samples_cache[proposal_id] = self._tools_ws.service.\
+                findSampleInfoLightForProposal(proposal_id,
+                                               self.beamline_name)
+        return self._samples_cache[proposal_id]
 
 
     @trace
     def get_samples(self, proposal_id, session_id):
+        """
+        Reads the samples of the proposal from ISPyB (synchronisation with
+        ISPyB): the cached samples of the proposal are read again.
+
+        :returns: A new list of the samples, or None
+        """
         response_samples = None
 
         if self._tools_ws:
+            self.invalidate_samples_cache(proposal_id)
             try:
-                response_samples = self._tools_ws.service.\
-                    findSampleInfoLightForProposal(proposal_id,
-                                                   self.beamline_name)
+                response_samples = self._find_sample_info_light(proposal_id)
+                if response_samples is not None:
+                    # the response is cached, the caller gets its own list
+                    response_samples = list(response_samples)
             except WebFault, e:
                 logging.getLogger("ispyb_client").error(str(e))
             except URLError:
@@ -1008,11 +1274,10 @@ class ISPyBClient2(HardwareObject):
             for sample_ref in sample_refs:
                 sample_reference = SampleReference(*sample_ref)
                 sample_references.append(sample_reference)
+            sample_references = _SampleReferenceIndex(sample_references)
 
             try:
-                response_samples = self._tools_ws.service.\
-                    findSampleInfoLightForProposal(proposal_id,
-                                                   self.beamline_name)
+                response_samples = self._find_sample_info_light(proposal_id)
 
             except WebFault, e:
                 logging.getLogger("ispyb_client").error(str(e))
@@ -1022,6 +1287,8 @@ class ISPyBClient2(HardwareObject):
             samples = []
             for sample in response_samples:
                 try:
+                    # the response is cached, update a copy of the sample
+                    sample_dict = asdict(sample)
                     loc = [None, None]
                     try:
                       loc[0]=int(sample.containerSampleChangerLocation)
@@ -1040,18 +1307,15 @@ class ISPyBClient2(HardwareObject):
                     # Sample location and code was found in ISPyB and they match
                     # with the sample changer.
                     elif sample.code and sample.sampleLocation:
-                        sc_sample = \
-                            self.__find_sample(sample_references,
-                                               code = sample.code,
-                                               location = loc)
+                        sc_sample = sample_references.find(code = sample.code,
+                                                           location = loc)
 
                         # The sample codes dose not match
                         if not sc_sample:
-                            sc_sample = self.__find_sample(sample_references,
-                                                           location = loc)
+                            sc_sample = sample_references.find(location = loc)
 
                             if sc_sample.code != '':
-                                sample.code = sc_sample.code
+                                sample_dict['code'] = sc_sample.code
 
                         sample_references.remove(sc_sample)
 
@@ -1059,11 +1323,9 @@ class ISPyBClient2(HardwareObject):
                     # Only location was found, update with the code
                     # from sample changer if it exists.
                     elif sample.sampleLocation:
-                        sc_sample = \
-                            self.__find_sample(sample_references,
-                                               location = loc)
+                        sc_sample = sample_references.find(location = loc)
                         if sc_sample:
-                            sample.sampleCode = sc_sample.code
+                            sample_dict['sampleCode'] = sc_sample.code
                             sample_references.remove(sc_sample)
 
                     # Sample code was found in ISPyB but dosent match with
@@ -1072,23 +1334,21 @@ class ISPyBClient2(HardwareObject):
                     # Use the information from the sample changer.
                     else:
                         #Use sample changer code for sample  ?
-                        sample.containerSampleChangerLocation = \
+                        sample_dict['containerSampleChangerLocation'] = \
                             sample_references.containter_referance
-                        sample.sampleLocation = \
+                        sample_dict['sampleLocation'] = \
                             sample_references.sample_reference
 
-                        loc = (int(sample.containerSampleChangerLocation),
-                               int(sample.sampleLocation))
+                        loc = (int(sample_dict['containerSampleChangerLocation']),
+                               int(sample_dict['sampleLocation']))
 
-                        sc_sample = \
-                            self.__find_sample(sample_references,
-                                               location = loc)
+                        sc_sample = sample_references.find(location = loc)
                         if sc_sample:
-                            sample.code = sc_sample.code
+                            sample_dict['code'] = sc_sample.code
                             sample_references.remove(sc_sample)
 
 
-                    samples.append(utf_encode(asdict(sample)))
+                    samples.append(utf_encode(sample_dict))
 
 #                         {'BLSample': utf_encode(asdict(sample.blSample)),
 #                          'Container': utf_encode(asdict(sample.container)),
@@ -1101,7 +1361,7 @@ class ISPyBClient2(HardwareObject):
 
 
             # Add the unmatched samples to the result from ISPyB
-            for sample_ref in sample_references:
+            for sample_ref in sample_references.remaining():
                 samples.append(
                     {'code': sample_ref.code,
                      'location': sample_ref.sample_reference,
@@ -2227,8 +2487,7 @@ class ISPyBValueFactory():
         workflow_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL,
-                               cache = None)
+            ws_client = _client_pool.register(_WS_COLLECTION_URL)
             workflow_vo = \
                 ws_client.factory.create('workflow3VO')
         except:
@@ -2259,8 +2518,7 @@ class ISPyBValueFactory():
         workflow_mesh_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL,
-                               cache = None)
+            ws_client = _client_pool.register(_WS_COLLECTION_URL)
             workflow_mesh_vo = \
                 ws_client.factory.create('workflowMeshWS3VO')
         except:
@@ -2292,8 +2550,7 @@ class ISPyBValueFactory():
         grid_info_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL,
-                               cache = None)
+            ws_client = _client_pool.register(_WS_COLLECTION_URL)
             grid_info_vo = \
                 ws_client.factory.create('gridInfoWS3VO')
         except:
@@ -2325,8 +2582,7 @@ class ISPyBValueFactory():
         workflow_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL,
-                               cache = None)
+            ws_client = _client_pool.register(_WS_COLLECTION_URL)
             workflow_step_vo = \
                 ws_client.factory.create('workflowStep3VO')
         except:
@@ -2362,8 +2618,7 @@ class ISPyBValueFactory():
         grid_info_vo = None
 
         try:
-            ws_client = Client(_WS_COLLECTION_URL,
-                               cache = None)
+            ws_client = _client_pool.register(_WS_COLLECTION_URL)
             grid_info_vo = \
                 ws_client.factory.create('gridInfoWS3VO')
         except:
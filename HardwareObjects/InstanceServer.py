@@ -5,7 +5,10 @@ import pickle
 import os
 import tempfile
 import operator
+import struct
+import collections
 import gevent
+import gevent.event
 import gevent.server
 import socket
 import pwd
@@ -24,7 +27,12 @@ import BlissFramework
 </procedure>
 """
 
-TERMINATOR = "\0" 
+# messages are pickled dictionaries, prefixed by their length
+FRAME_HEADER = struct.Struct("!I")
+RECV_BUFFER_SIZE = 65536
+# outbound queue length (in messages) of each client, see ClientConnection
+MAX_QUEUED_MESSAGES = 1000
+MAX_FRAMES_PER_WRITE = 100
 INSTANCE_HO = None
 SERVER_CLIENTS = {}
 CLIENTS = {}
@@ -55,7 +63,15 @@ class InstanceServer(Procedure):
         self.serverId2 = [None,None] # client AND server
         self.controlId2 = [None,None] # client AND server
 
+        # latest brick and tab update per (brick, widget), with its version
         self.bricksEventCache = {}
+        # server: start time and last version of the cached events
+        # client: the same for the events received from the server
+        self.eventsEpoch = None
+        self.eventsVersion = 0
+        # client: False if an event was received after a newer one, then
+        # events in between may have been missed
+        self.eventsInOrder = True
 
         global INSTANCE_HO 
         INSTANCE_HO = self
@@ -173,6 +189,7 @@ class InstanceServer(Procedure):
 
                 self.serverId2[0]=server_hostname
                 self.controlId2=list(self.serverId2)
+                self.eventsEpoch=time.time()
 
                 self.idCount[server_hostname]=1
             
@@ -205,6 +222,9 @@ class InstanceServer(Procedure):
 
             msg.setClientId(my_login)
             msg.setProposal(self.clientId2[1])
+            if self.eventsEpoch is not None and self.eventsInOrder:
+                # only the events missed since then are sent back
+                msg.setEventsVersion((self.eventsEpoch,self.eventsVersion))
             data=msg.encode()
             
             send_data_to_server(self.instanceClient, data)
@@ -322,21 +342,50 @@ class InstanceServer(Procedure):
             logging.getLogger("HWR").warning('InstanceServer: sendChatMessage while not server nor client!')
         self.emit('chatMessageReceived', (priority,my_id,message))
 
-    def addEventToCache(self,brick_name,widget_name,message_data):
-        self.bricksEventCache[(brick_name,widget_name)]=message_data
-
-    def synchronizeClientWithEvents(self,client_addr):
-        for event_data in list(self.bricksEventCache.values()):
-            send_data_to_client(client_addr, event_data) 
+    def addEventToCache(self,brick_name,widget_name,msg):
+        """Sets the version of the update message and keeps it as the
+        latest event of the widget, returns the encoded message"""
+        self.eventsVersion+=1
+        msg.setVersion(self.eventsVersion)
+        data=msg.encode()
+        self.bricksEventCache[(brick_name,widget_name)]=(self.eventsVersion,data)
+        return data
+
+    def synchronizeClientWithEvents(self,client_addr,events_version=None):
+        """Sends the cached events to a client in one message, only the
+        ones newer than events_version if it is from this server run"""
+        events=sorted(self.bricksEventCache.values())
+        if events_version is not None and events_version[0]==self.eventsEpoch:
+            events=[event for event in events if event[0]>events_version[1]]
+
+        msg=SnapshotInstanceMessage()
+        msg.setSnapshot(self.eventsEpoch,self.eventsVersion,[data for version,data in events])
+        data=msg.encode()
+        send_data_to_client(client_addr,data)
+
+    def eventReceived(self,m):
+        """Keeps the version of the last event received from the server
+
+        The server writes the events in version order, skipping the ones
+        superseded by a newer event of the same widget : all the events
+        up to eventsVersion were received or are replaced by newer ones,
+        which the server sends again on reconnection. If the events ever
+        come out of order, the next synchronization is a full one.
+        """
+        version=m.getVersion()
+        if version is not None:
+            if version<self.eventsVersion:
+                self.eventsInOrder=False
+            self.eventsVersion=max(version,self.eventsVersion)
 
     def sendBrickUpdateMessage(self,brick_name,widget_name,widget_method,widget_method_args,masterSync):
         msg=BrickUpdateInstanceMessage()
         msg.setBrickUpdate(brick_name,widget_name,widget_method,widget_method_args,masterSync)
-        data=msg.encode()
         if self.isServer():
-            self.addEventToCache(brick_name,widget_name,data)
-            broadcast_to_clients(data)
+            data=self.addEventToCache(brick_name,widget_name,msg)
+            broadcast_to_clients(data,key=msg.getUpdateKey())
         elif self.isClient():
+            data=msg.encode()
             send_data_to_server(self.instanceClient, data)
         else:
             logging.getLogger("HWR").warning('InstanceServer: sendBrickUpdateMessage while not server nor client!')
@@ -344,11 +393,11 @@ class InstanceServer(Procedure):
     def sendTabUpdateMessage(self,tab_name,tab_index):
         msg=TabUpdateInstanceMessage()
         msg.setTabUpdate(tab_name,tab_index)
-        data=msg.encode()
-        self.addEventToCache(None,tab_name,data)
         if self.isServer():
-            broadcast_to_clients(data)
+            data=self.addEventToCache(None,tab_name,msg)
+            broadcast_to_clients(data,key=msg.getUpdateKey())
         elif self.isClient():
+            data=msg.encode()
             send_data_to_server(self.instanceClient, data)
         else:
             logging.getLogger("HWR").warning('InstanceServer: sendTabUpdateMessage while not server nor client!')
@@ -488,6 +537,8 @@ class InstanceServer(Procedure):
                     msg_obj=TakeControlInstanceMessage(message)
                 elif t==InstanceMessage.TYPE_BRICKCALL:
                     msg_obj=BrickCallInstanceMessage(message)
+                elif t==InstanceMessage.TYPE_SNAPSHOT:
+                    msg_obj=SnapshotInstanceMessage(message)
                 else:
                     logging.getLogger("HWR").warning('InstanceServer: unknown message type %s ' % str(t))
         return msg_obj
@@ -569,7 +620,17 @@ class InstanceServer(Procedure):
             except:
                 logging.getLogger("HWR").exception('InstanceServer: problem while calling a brick!')
 
+        elif isinstance(m,SnapshotInstanceMessage):
+            # events of a full snapshot can be older than the last one received
+            self.eventsVersion=0
+            for event_data in m.getEvents():
+                self.clientMessageReceived(event_data)
+            self.eventsEpoch=m.getEpoch()
+            self.eventsVersion=m.getVersion()
+            self.eventsInOrder=True
+
         elif isinstance(m,BrickUpdateInstanceMessage):
+            self.eventReceived(m)
             try:
                 timestamp=m.getTimestamp()
                 brick_name=m.getBrickName()
@@ -590,6 +651,7 @@ class InstanceServer(Procedure):
                 logging.getLogger("HWR").exception('InstanceServer: problem while updating a brick!')
 
         elif isinstance(m,TabUpdateInstanceMessage):
+            self.eventReceived(m)
             try:
                 timestamp=m.getTimestamp()
                 tab_name=m.getTabName()
@@ -704,7 +766,11 @@ class InstanceServer(Procedure):
                     data=msg.encode()
                     send_data_to_client(client_addr,data)
 
-            self.synchronizeClientWithEvents(client_addr)
+            try:
+                events_version=m.getEventsVersion()
+            except KeyError:
+                events_version=None
+            self.synchronizeClientWithEvents(client_addr,events_version)
 
             msg=GivePermissionInstanceMessage()
             msg.setClientId(client_id)
@@ -803,7 +869,8 @@ class InstanceServer(Procedure):
                 logging.getLogger("HWR").exception('InstanceServer: problem while calling a brick!')
 
         elif isinstance(m,BrickUpdateInstanceMessage):
-            broadcast_to_clients(data,avoid=(client_addr,))
+            data=self.addEventToCache(m.getBrickName(),m.getWidgetName(),m)
+            broadcast_to_clients(data,avoid=(client_addr,),key=m.getUpdateKey())
 
             try:
                 timestamp=m.getTimestamp()
@@ -822,7 +889,8 @@ class InstanceServer(Procedure):
                 logging.getLogger("HWR").exception('InstanceServer: problem while updating a brick!')                
 
         elif isinstance(m,TabUpdateInstanceMessage):
-            broadcast_to_clients(data,avoid=(client_addr,))
+            data=self.addEventToCache(None,m.getTabName(),m)
+            broadcast_to_clients(data,avoid=(client_addr,),key=m.getUpdateKey())
 
             try:
                 timestamp=m.getTimestamp()
@@ -870,43 +938,146 @@ class InstanceServer(Procedure):
                 send_data_to_client(cli_addr,data)
 
 
+def encode_frame(data):
+  """Prefix a message with its length"""
+  return FRAME_HEADER.pack(len(data)) + data
+
+def read_frames(client_socket):
+  """Iterate over the messages received on the socket, until it is closed"""
+  stream = client_socket.makefile("rb", RECV_BUFFER_SIZE)
+  try:
+    while True:
+      header = stream.read(FRAME_HEADER.size)
+      if len(header) < FRAME_HEADER.size:
+        break
+      size, = FRAME_HEADER.unpack(header)
+      data = stream.read(size)
+      if len(data) < size:
+        break
+      yield data
+  except socket.error:
+    pass
+  finally:
+    stream.close()
+
+
+class ClientConnection:
+  """Outbound queue of a remote client
+
+  Messages are written by a greenlet per client, so a slow client does
+  not delay the others nor the application. A message sent with a key
+  (brick and tab updates) supersedes the queued message with the same
+  key, which is not written ; the messages are always written in the
+  order they were sent. A client which has more than max_queued
+  messages waiting is disconnected (it gets the missed events when it
+  connects again).
+  """
+  def __init__(self, client_socket, addr, max_queued=MAX_QUEUED_MESSAGES):
+    self.socket = client_socket
+    self.addr = addr
+    self.max_queued = max_queued
+    self.coalesced = 0
+
+    # entries are [frame, key], frame is None for superseded messages
+    self._queue = collections.deque()
+    self._superseded = 0
+    self._latest = {}
+    self._ready = gevent.event.Event()
+    self._closed = False
+    self._writer = gevent.spawn(self._write)
+
+  def pending(self):
+    """Returns the number of messages waiting to be written"""
+    return len(self._queue) - self._superseded
+
+  def send(self, frame, key=None):
+    if self._closed:
+      return
+    if key is not None:
+      previous = self._latest.pop(key, None)
+      if previous is not None:
+        previous[0] = None
+        self._superseded += 1
+        self.coalesced += 1
+    if self.pending() >= self.max_queued:
+      logging.getLogger("HWR").warning('InstanceServer: client %s is too slow, disconnecting it' % str(self.addr))
+      self.close()
+      return
+    if self._superseded > len(self._queue) // 2:
+      self._compact()
+    entry = [frame, key]
+    self._queue.append(entry)
+    if key is not None:
+      self._latest[key] = entry
+    self._ready.set()
+
+  def close(self):
+    if self._closed:
+      return
+    self._closed = True
+    if self._writer is not gevent.getcurrent():
+      self._writer.kill(block=False)
+    try:
+      # ends handleRemoteClient
+      self.socket.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+      pass
+
+  def _compact(self):
+    """Removes the superseded messages from the queue"""
+    self._queue = collections.deque([entry for entry in self._queue if entry[0] is not None])
+    self._superseded = 0
+
+  def _write(self):
+    while True:
+      self._ready.wait()
+      self._ready.clear()
+      while self._queue:
+        frames = []
+        while self._queue and len(frames) < MAX_FRAMES_PER_WRITE:
+          entry = self._queue.popleft()
+          frame, key = entry
+          if frame is None:
+            self._superseded -= 1
+            continue
+          if key is not None and self._latest.get(key) is entry:
+            del self._latest[key]
+          frames.append(frame)
+        if frames:
+          try:
+            self.socket.sendall("".join(frames))
+          except socket.error:
+            # broken pipe? client disconnected
+            self.close()
+            return
+
+
 def handleRemoteClient(client_socket, addr):
-  SERVER_CLIENTS[addr]=client_socket  
+  connection = ClientConnection(client_socket, addr)
+  SERVER_CLIENTS[addr]=connection
   INSTANCE_HO.clientConnected(addr, client_socket)
 
-  buffer = ""  
-  while True:
-    data = client_socket.recv(1024)
-    if data == "":
-      try:
-        SERVER_CLIENTS.pop(addr) 
-      except:
-        #Huh? socket closed but client is not in SERVER_CLIENTS dict!
-        # just ignore silently
-        pass
-      else:
-        INSTANCE_HO.clientClosed(addr)
-      break
-    buffer += data
-    msgs = buffer.split(TERMINATOR)
-    buffer = msgs.pop()
-    for msg in msgs:
+  try:
+    for msg in read_frames(client_socket):
       INSTANCE_HO.serverMessageReceived(addr, msg)
-
-def broadcast_to_clients(data, avoid=None):
-  for client_addr in list(SERVER_CLIENTS.keys()): 
+  finally:
+    connection.close()
+    if SERVER_CLIENTS.get(addr) is connection:
+      SERVER_CLIENTS.pop(addr)
+    client_socket.close()
+    INSTANCE_HO.clientClosed(addr)
+
+def broadcast_to_clients(data, avoid=None, key=None):
+  frame = encode_frame(data)
+  for client_addr, connection in list(SERVER_CLIENTS.items()):
     if avoid and client_addr in avoid:
       continue
-    send_data_to_client(client_addr, data)
+    connection.send(frame, key)
 
-def send_data_to_client(client_addr, data):
-  client_socket = SERVER_CLIENTS.get(client_addr)
-  if client_socket:
-    try:
-      client_socket.sendall("%s%s" % (data, TERMINATOR))
-    except:
-      # broken pipe? client disconnected
-      SERVER_CLIENTS.pop(client_addr)
+def send_data_to_client(client_addr, data, key=None):
+  connection = SERVER_CLIENTS.get(client_addr)
+  if connection:
+    connection.send(encode_frame(data), key)
 
 def InstanceClient(host, port):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -918,17 +1089,9 @@ def InstanceClient(host, port):
         socketName = s.getsockname()
 
     def handle_incoming_data(client_socket):  
-        buffer = ""  
-        while True:
-           data = client_socket.recv(1024)
-           if data == "":
-             INSTANCE_HO.serverClosed()
-             break
-           buffer += data
-           msgs = buffer.split(TERMINATOR)
-           buffer = msgs.pop()
-           for msg in msgs:
-             INSTANCE_HO.clientMessageReceived(msg)
+        for msg in read_frames(client_socket):
+            INSTANCE_HO.clientMessageReceived(msg)
+        INSTANCE_HO.serverClosed()
    
     CLIENTS[socketName] = s 
     gevent.spawn(handle_incoming_data, s) 
@@ -938,7 +1101,7 @@ def InstanceClient(host, port):
 
 def send_data_to_server(socket_name, data):
     client_socket = CLIENTS[socket_name]
-    client_socket.sendall("%s%s" % (data, TERMINATOR))
+    client_socket.sendall(encode_frame(data))
 
 
 class InstanceMessage:
@@ -952,7 +1115,8 @@ class InstanceMessage:
     TYPE_BRICKUPDATE,\
     TYPE_TABUPDATE,\
     TYPE_TAKECONTROL,\
-    TYPE_BRICKCALL) = (0,1,2,3,4,5,6,7,8,9,10)
+    TYPE_BRICKCALL,\
+    TYPE_SNAPSHOT) = (0,1,2,3,4,5,6,7,8,9,10,11)
     def __init__(self,data=None):
         self.messageDict={}
         if data is not None:
@@ -962,7 +1126,7 @@ class InstanceMessage:
             self.messageDict["type"]
         except KeyError:
             raise ValueError
-        return pickle.dumps(self.messageDict)
+        return pickle.dumps(self.messageDict, pickle.HIGHEST_PROTOCOL)
     def getType(self):
         try:
             t=self.messageDict["type"]
@@ -1048,6 +1212,10 @@ class AskPermissionInstanceMessage(InstanceMessage):
         self.messageDict["proposal"]=proposal
     def getProposal(self):
         return self.messageDict["proposal"]
+    def setEventsVersion(self,events_version):
+        self.messageDict["events_version"]=events_version
+    def getEventsVersion(self):
+        return self.messageDict["events_version"]
 
 class GivePermissionInstanceMessage(InstanceMessage):
     def __init__(self,instance_message=None):
@@ -1120,6 +1288,12 @@ class BrickUpdateInstanceMessage(InstanceMessage):
         return self.messageDict["widget_method_args"]
     def getMasterSync(self):
         return self.messageDict["masterSync"]
+    def getUpdateKey(self):
+        return (self.messageDict["brick_name"],self.messageDict["widget_name"],self.messageDict["widget_method"])
+    def setVersion(self,version):
+        self.messageDict["version"]=version
+    def getVersion(self):
+        return self.messageDict.get("version")
 
 class TabUpdateInstanceMessage(InstanceMessage):
     def __init__(self,instance_message=None):
@@ -1137,6 +1311,12 @@ class TabUpdateInstanceMessage(InstanceMessage):
         return self.messageDict["tab_name"]
     def getTabIndex(self):
         return self.messageDict["tab_index"]
+    def getUpdateKey(self):
+        return (None,self.messageDict["tab_name"],None)
+    def setVersion(self,version):
+        self.messageDict["version"]=version
+    def getVersion(self):
+        return self.messageDict.get("version")
 
 class TakeControlInstanceMessage(InstanceMessage):
     def __init__(self,instance_message=None):
@@ -1151,3 +1331,20 @@ class BrickCallInstanceMessage(BrickUpdateInstanceMessage):
         if instance_message is not None:
             self.messageDict=instance_message.messageDict
         self.messageDict["type"]=InstanceMessage.TYPE_BRICKCALL
+
+class SnapshotInstanceMessage(InstanceMessage):
+    def __init__(self,instance_message=None):
+        InstanceMessage.__init__(self)
+        if instance_message is not None:
+            self.messageDict=instance_message.messageDict
+        self.messageDict["type"]=InstanceMessage.TYPE_SNAPSHOT
+    def setSnapshot(self,epoch,version,events):
+        self.messageDict["epoch"]=epoch
+        self.messageDict["version"]=version
+        self.messageDict["events"]=events
+    def getEpoch(self):
+        return self.messageDict["epoch"]
+    def getVersion(self):
+        return self.messageDict["version"]
+    def getEvents(self):
+        return self.messageDict["events"]
@@ -0,0 +1,288 @@
+"""
+Write-behind queue for LIMS image records and data collection updates
+
+Data collection code queues records without waiting for the LIMS; a
+background greenlet writes them in batches. On connection errors the
+batch is retried with an increasing delay ; if the LIMS stays unreachable,
+queued records are spilled to disk and written when it is back (also
+after a restart of the application). There is one spill file per LIMS
+Hardware Object and web services URL, locked while it is read or
+written: processes using the same LIMS share it.
+
+Batches are written with the lims store_images / update_data_collections
+methods if the lims object provides them (ISPyBClient2), else record by
+record with store_image / update_data_collection.
+
+Only connection errors are retried : a record which fails with any
+other error is logged and dropped, so it does not block the records
+queued after it.
+"""
+
+import os
+import re
+import copy
+import fcntl
+import pickle
+import hashlib
+import socket
+import logging
+import collections
+import urllib2
+import gevent
+import gevent.event
+try:
+    from suds.transport import TransportError
+except ImportError:
+    TransportError = None
+
+SPILL_DIRECTORY = os.environ.get("HWR_CACHE_DIR",
+                                 os.path.join(os.path.expanduser("~"), ".cache", "mxcube_hwr"))
+
+# errors after which writing is retried later
+CONNECTION_ERRORS = (socket.error, urllib2.URLError)
+if TransportError is not None:
+    CONNECTION_ERRORS += (TransportError, )
+
+
+def get_spill_filename(lims):
+    """Spill file of the records of lims, named after the LIMS Hardware
+    Object and its web services URL"""
+    try:
+        name = lims.name()
+    except:
+        name = lims.__class__.__name__
+    url = getattr(lims, "ws_root", None) or ""
+    key = hashlib.md5("%s %s" % (name, url)).hexdigest()[:8]
+    name = re.sub(r"[^\w.-]", "_", name).strip("_")
+    return os.path.join(SPILL_DIRECTORY, "lims_write_queue_%s_%s.pickle" % (name, key))
+
+
+class LimsWriteQueue:
+    def __init__(self, lims, spill_filename=None, max_batch=50,
+                 flush_interval=1, retry_delay=1, max_retry_delay=60, spill_after=3):
+        self.lims = lims
+        if spill_filename is None:
+            spill_filename = get_spill_filename(lims)
+        self.spill_filename = spill_filename
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.spill_after = spill_after
+
+        self._records = collections.deque()
+        self._wakeup = gevent.event.Event()
+        self._empty = gevent.event.Event()
+        self._empty.set()
+        self._failures = 0
+        self._in_flight = 0
+        self._worker = None
+        self._stats = {"images": 0,
+                       "collection_updates": 0,
+                       "coalesced_updates": 0,
+                       "batches": 0,
+                       "retries": 0,
+                       "spilled": 0,
+                       "dropped": 0}
+
+        if os.path.exists(self.spill_filename):
+            # records left by a previous run
+            self._empty.clear()
+            self._worker = gevent.spawn(self._run)
+
+    def store_image(self, image_dict):
+        """Queues an image record, see lims.store_image"""
+        self._put("image", dict(image_dict))
+
+    def update_data_collection(self, mx_collection):
+        """Queues a data collection update, see lims.update_data_collection
+
+        A queued update of the same collection which is not written yet is
+        replaced by this one.
+        """
+        mx_collection = copy.deepcopy(mx_collection)
+        collection_id = mx_collection.get("collection_id")
+        for i, (kind, record) in enumerate(self._records):
+            if i < self._in_flight:
+                # being written
+                continue
+            if kind == "collection" and record.get("collection_id") == collection_id:
+                self._records[i] = (kind, mx_collection)
+                self._stats["coalesced_updates"] += 1
+                return
+        self._put("collection", mx_collection)
+
+    def flush(self, timeout=None):
+        """Waits until all queued records are written (or spilled to disk),
+        returns False on timeout"""
+        self._wakeup.set()
+        return self._empty.wait(timeout)
+
+    def pending(self):
+        return len(self._records)
+
+    def get_statistics(self):
+        stats = dict(self._stats)
+        stats["pending"] = len(self._records)
+        stats["spill_file"] = os.path.exists(self.spill_filename)
+        return stats
+
+    def _put(self, kind, record):
+        self._records.append((kind, record))
+        self._empty.clear()
+        if self._worker is None:
+            self._worker = gevent.spawn(self._run)
+        if len(self._records) >= self.max_batch:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._flush()
+            except:
+                logging.getLogger("HWR").exception("LIMS write queue: unexpected error")
+            if not self._records:
+                self._empty.set()
+            elif self._failures:
+                delay = min(self.retry_delay * 2 ** (self._failures - 1),
+                            self.max_retry_delay)
+                gevent.sleep(delay)
+
+    def _next_batch(self):
+        kind = self._records[0][0]
+        batch = []
+        for record_kind, record in self._records:
+            if record_kind != kind or len(batch) == self.max_batch:
+                break
+            batch.append(record)
+        return kind, batch
+
+    def _flush(self):
+        self._load_spilled()
+
+        while self._records:
+            kind, batch = self._next_batch()
+            size = len(batch)
+            self._in_flight = size
+            try:
+                self._write(kind, batch)
+            except CONNECTION_ERRORS:
+                # batch contains the records not written yet
+                self._drop(size - len(batch))
+                self._failures += 1
+                self._stats["retries"] += 1
+                logging.getLogger("HWR").warning("LIMS write queue: cannot write to LIMS " +\
+                                                 "(attempt %d), %d records pending",
+                                                 self._failures, len(self._records))
+                if self._failures >= self.spill_after:
+                    self._spill()
+                return
+            except Exception:
+                # batch[0] is the record which failed, it would fail again
+                failed = batch[:1]
+                logging.getLogger("HWR").exception("LIMS write queue: cannot write %s record, " +\
+                                                   "record dropped: %r", kind, failed)
+                self._drop(size - len(batch) + len(failed))
+                self._stats["dropped"] += len(failed)
+            else:
+                self._drop(size)
+                self._failures = 0
+                self._stats["batches"] += 1
+                if kind == "image":
+                    self._stats["images"] += size
+                else:
+                    self._stats["collection_updates"] += size
+
+    def _drop(self, count):
+        self._in_flight = 0
+        for i in range(count):
+            self._records.popleft()
+
+    def _write(self, kind, batch):
+        """Writes batch, removing the written records from it (on error,
+        batch[0] is the record which failed)"""
+        if kind == "image":
+            if hasattr(self.lims, "store_images"):
+                self.lims.store_images(batch)
+            else:
+                while batch:
+                    self.lims.store_image(batch[0])
+                    batch.pop(0)
+        else:
+            if hasattr(self.lims, "update_data_collections"):
+                self.lims.update_data_collections(batch)
+            else:
+                while batch:
+                    self.lims.update_data_collection(batch[0], wait=True)
+                    batch.pop(0)
+
+    def _lock_spill_file(self):
+        """Locks the spill file against the other processes, the lock is
+        released when the returned file is closed. A separate lock file is
+        used, the spill file is deleted when it has been read"""
+        lock_file = open(self.spill_filename + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except:
+            lock_file.close()
+            raise
+        return lock_file
+
+    def _spill(self):
+        """Appends queued records to the spill file"""
+        try:
+            directory = os.path.dirname(self.spill_filename)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            lock_file = self._lock_spill_file()
+            try:
+                spill_file = open(self.spill_filename, "ab")
+                try:
+                    for record in self._records:
+                        pickle.dump(record, spill_file, pickle.HIGHEST_PROTOCOL)
+                finally:
+                    spill_file.close()
+            finally:
+                lock_file.close()
+        except:
+            logging.getLogger("HWR").exception("LIMS write queue: cannot spill records to %s",
+                                               self.spill_filename)
+        else:
+            logging.getLogger("HWR").warning("LIMS write queue: %d records saved in %s, " +\
+                                             "they will be written when LIMS is available",
+                                             len(self._records), self.spill_filename)
+            self._stats["spilled"] += len(self._records)
+            self._records.clear()
+
+    def _load_spilled(self):
+        """Puts the records of the spill file in front of the queue"""
+        if not os.path.exists(self.spill_filename):
+            return
+        records = []
+        try:
+            lock_file = self._lock_spill_file()
+            try:
+                if not os.path.exists(self.spill_filename):
+                    # read by another process
+                    return
+                spill_file = open(self.spill_filename, "rb")
+                try:
+                    while True:
+                        try:
+                            records.append(pickle.load(spill_file))
+                        except EOFError:
+                            break
+                finally:
+                    spill_file.close()
+                os.unlink(self.spill_filename)
+            finally:
+                lock_file.close()
+        except:
+            logging.getLogger("HWR").exception("LIMS write queue: cannot read spilled records from %s",
+                                               self.spill_filename)
+            return
+        self._records.extendleft(reversed(records))
+        logging.getLogger("HWR").info("LIMS write queue: %d spilled records queued again",
+                                      len(records))
@@ -9,6 +9,7 @@ import MiniDiff
 from HardwareRepository import EnhancedPopen
 import copy
 import gevent
+import gevent.event
 import sample_centring
 
 MICRODIFF = None
@@ -36,6 +37,11 @@ class Microdiff(MiniDiff.MiniDiff):
             self.hwstate_attr = None
         self.swstate_attr = self.addChannel({"type":"exporter", "exporter_address": self.exporter_addr, "name":"swstate" }, "State")
         self.nb_frames =  self.addChannel({"type":"exporter", "exporter_address": self.exporter_addr, "name":"nbframes" }, "ScanNumberOfFrames")
+        self.motor_positions_attr = self.addChannel({"type":"exporter", "exporter_address": self.exporter_addr, "name":"motor_positions" }, "MotorPositions")
+        self._md_state_changed_event = gevent.event.Event()
+        self.swstate_attr.connectSignal("update", self._md_state_changed)
+        if self.hwstate_attr:
+            self.hwstate_attr.connectSignal("update", self._md_state_changed)
         
          # raster scan attributes
         self.scan_range = self.addChannel({"type":"exporter", "exporter_address": self.exporter_addr, "name":"scan_range" }, "ScanRange")
@@ -88,6 +94,21 @@ class Microdiff(MiniDiff.MiniDiff):
                 return True
         return False
 
+    def _md_state_changed(self, *args):
+        md_state_changed, self._md_state_changed_event = self._md_state_changed_event, gevent.event.Event()
+        md_state_changed.set()
+
+    def _wait_md_ready(self, timeout=None):
+        """Waits until the MD2 software (and hardware) state is Ready,
+        woken up by the state channels updates"""
+        with gevent.Timeout(timeout, RuntimeError("Timeout waiting for the diffractometer to be ready")):
+            while True:
+                md_state_changed = self._md_state_changed_event
+                if self._ready():
+                    return
+                # in case an update is missed
+                md_state_changed.wait(0.5)
+
     def _wait_ready(self, timeout=None):
         if timeout <= 0:
             timeout = self.timeout
@@ -123,7 +144,9 @@ class Microdiff(MiniDiff.MiniDiff):
             argin += "%s=%0.3f;" % (name, position)
         if not argin:
             return
-        move_sync_motors = self.addCommand({"type":"exporter", "exporter_address":self.exporter_addr, "name":"move_sync_motors" }, "startSimultaneousMoveMotors")
+        move_sync_motors = self.getCommandObject("move_sync_motors")
+        if move_sync_motors is None:
+            move_sync_motors = self.addCommand({"type":"exporter", "exporter_address":self.exporter_addr, "name":"move_sync_motors" }, "startSimultaneousMoveMotors")
         move_sync_motors(argin)
 
         if wait:
@@ -214,32 +237,50 @@ class Microdiff(MiniDiff.MiniDiff):
     def in_kappa_mode(self):
         return self.head_type.getValue() == "MiniKappa" and self.kappa.getValue()
 
-    def getPositions(self):
-        pos = { "phi": float(self.phiMotor.getPosition()),
-                "focus": float(self.focusMotor.getPosition()),
-                "phiy": float(self.phiyMotor.getPosition()),
-                "phiz": float(self.phizMotor.getPosition()),
-                "sampx": float(self.sampleXMotor.getPosition()),
-                "sampy": float(self.sampleYMotor.getPosition()),
-                "zoom": float(self.zoomMotor.getPosition()),
-                "kappa":  float(self.sampleYMotor.getPosition()) if self.in_kappa_mode() else None,
-                "kappa_phi": float(self.zoomMotor.getPosition()) if self.in_kappa_mode() else None,
-        }
+    def readMotorPositions(self):
+        # all the positions in one exporter call, "<motor name>=<position>"
+        try:
+            exporter_positions = {}
+            for motor_position in self.motor_positions_attr.getValue():
+                name, position = motor_position.split("=")
+                exporter_positions[name] = position
+            pos = {}
+            for role, motor in self.getMotorsByRole().iteritems():
+                if role in ("kappa", "kappa_phi"):
+                    continue
+                pos[role] = float(exporter_positions[self.MOTOR_TO_EXPORTER_NAME[role]])
+        except:
+            logging.getLogger("HWR").debug("Microdiff: cannot read MotorPositions, reading motors one by one")
+            pos = dict([(role, float(motor.getPosition())) for role, motor in self.getMotorsByRole().iteritems() \
+                        if motor is not None and role not in ("kappa", "kappa_phi")])
+            exporter_positions = {}
+
+        pos.update({"kappa": None, "kappa_phi": None})
         if self.in_kappa_mode() == True:
-            try:
-                kappa = float(self.kappaMotor.getPosition())
-            except:
-                kappa = 0.
-            try:
-                kappa_phi = float(self.kappaPhiMotor.getPosition())
-            except:
-                kappa_phi = 0.
-            pos.update({"kappa": kappa, "kappa_phi": kappa_phi})
+            for role in ("kappa", "kappa_phi"):
+                try:
+                    pos[role] = float(exporter_positions[self.MOTOR_TO_EXPORTER_NAME[role]])
+                except:
+                    try:
+                        pos[role] = float(self.getMotorsByRole()[role].getPosition())
+                    except:
+                        pos[role] = 0.
 
         return pos
 
-    def moveMotors(self, roles_positions_dict):
-        self.moveSyncMotors(roles_positions_dict, wait=True)
+    def moveMotors(self, roles_positions_dict, timeout=None):
+        t0 = time.time()
+        settle_times = MiniDiff.MiniDiff.moveMotors(self, roles_positions_dict, timeout)
+        # motors can be ready before the MD2 state, then a phase change
+        # right after the move would be refused
+        if timeout is not None:
+            timeout = max(0, timeout - (time.time() - t0))
+        self._wait_md_ready(timeout)
+        return settle_times
+
+    def startMotorsMove(self, roles_positions_dict):
+        # one command moves all the motors simultaneously
+        self.moveSyncMotors(roles_positions_dict, wait=False)
 
 
     def moveToBeam(self, x, y):
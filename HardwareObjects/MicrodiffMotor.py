@@ -1,4 +1,5 @@
 from gevent import Timeout, sleep, spawn
+from gevent.event import Event
 from AbstractMotor import AbstractMotor
 
 class MD2TimeoutError(Exception):
@@ -39,6 +40,7 @@ class MicrodiffMotor(AbstractMotor):
 
         self.old_state = None
         self.state_emits = 0
+        self._state_changed = Event()
         
     def init(self):
         self.position = None
@@ -182,6 +184,9 @@ class MicrodiffMotor(AbstractMotor):
             return
         self.emit('stateChanged', (state_int, ))
         self.old_state = state_int
+        # wake up waitEndOfMove
+        state_changed, self._state_changed = self._state_changed, Event()
+        state_changed.set()
         
     def translate_state(self, state_value):
         if state_value in self.EXPORTER_TO_MOTOR_STATE:
@@ -259,9 +264,13 @@ class MicrodiffMotor(AbstractMotor):
 
     def waitEndOfMove(self, timeout=None):
         with Timeout(timeout):
-           sleep(0.1)
-           while self.get_state() == self.motor_states.MOVING:
-              sleep(0.1) 
+           # state may not be MOVING right after the move started
+           self._state_changed.wait(0.1)
+           while True:
+              state_changed = self._state_changed
+              if self.get_state() != self.motor_states.MOVING:
+                  break
+              state_changed.wait(0.5)
 
     def syncMove(self, position, timeout=None):
         self.move(position)
@@ -1,4 +1,5 @@
 import gevent
+import gevent.event
 from gevent.event import AsyncResult
 try:
     from Qub.Tools import QubImageSave
@@ -12,7 +13,9 @@ import math
 import os
 import time
 from HardwareRepository import HardwareRepository
+from HardwareRepository.HardwareRepository import dispatcher
 import copy
+import collections
 import sample_centring
 import numpy
 import queue_model_objects_v1 as qmo
@@ -90,6 +93,120 @@ def take_snapshots(number_of_snapshots, light, light_motor, phi, zoom, drawing):
   return centredImages
 
 
+class GroupedMove:
+    """
+    Waits for the end of the move of a group of motors. The motors
+    states are read again each time a motor state changes (and every
+    0.5 s in case a change is not notified).
+
+    A motor which was asked to move is done when it is ready again
+    after having been seen moving, or when it is ready at its target
+    position ; as a last resort, when it is ready 1 s after the start
+    (the state of some motors is not MOVING right after the move started).
+    """
+    MOVE_START_DELAY = 1
+    POLLING_PERIOD = 0.5
+
+    def __init__(self, motors, motors_positions):
+        self.motors = dict([(role, m) for role, m in motors.iteritems() if m is not None])
+        self.motors_positions = motors_positions
+        self.state_changed = gevent.event.Event()
+        self.start_time = time.time()
+        self.seen_moving = set()
+        for m in self.motors.itervalues():
+            dispatcher.connect(self.motor_state_changed, "stateChanged", m)
+
+    def close(self):
+        for m in self.motors.itervalues():
+            dispatcher.disconnect(self.motor_state_changed, "stateChanged", m)
+
+    def motor_state_changed(self, *args):
+        state_changed, self.state_changed = self.state_changed, gevent.event.Event()
+        state_changed.set()
+
+    def is_ready(self, m):
+        if hasattr(m, "motor_states"):
+            return m.getState() == m.motor_states.READY
+        return m.getState() == m.READY
+
+    def at_position(self, m, position):
+        tolerance = getattr(m, "motor_resolution", None) or getattr(m, "delta", None) or 1E-4
+        try:
+            return abs(m.getPosition() - position) <= tolerance
+        except:
+            return False
+
+    def is_done(self, role, m, now):
+        if not self.is_ready(m):
+            self.seen_moving.add(role)
+            return False
+        if role not in self.motors_positions:
+            return True
+        return role in self.seen_moving or \
+               self.at_position(m, self.motors_positions[role]) or \
+               now - self.start_time >= GroupedMove.MOVE_START_DELAY
+
+    def wait(self, timeout=None):
+        """
+        Returns {role: time to reach the position} for the moved motors
+        """
+        settle_times = {}
+        pending = dict(self.motors)
+        with gevent.Timeout(timeout, RuntimeError("Timeout waiting for motors to be ready")):
+            while True:
+                state_changed = self.state_changed
+                now = time.time()
+                for role, m in pending.items():
+                    if self.is_done(role, m, now):
+                        del pending[role]
+                        if role in self.motors_positions:
+                            settle_times[role] = now - self.start_time
+                if not pending:
+                    return settle_times
+                state_changed.wait(GroupedMove.POLLING_PERIOD)
+
+
+class PositionsSnapshot(collections.Mapping):
+    """
+    Read-only {role: position} of the diffractometer motors, with the
+    time of the read (seconds since the epoch)
+    """
+    def __init__(self, positions, timestamp=None):
+        self._positions = dict(positions)
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __getitem__(self, role):
+        return self._positions[role]
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __repr__(self):
+        return "PositionsSnapshot(%r, %r)" % (self._positions, self.timestamp)
+
+    def age(self):
+        return time.time() - self.timestamp
+
+    def updated(self, role, position):
+        """Returns a copy of the snapshot with the new position of role"""
+        positions = dict(self._positions)
+        positions[role] = position
+        return PositionsSnapshot(positions, self.timestamp)
+
+
+class _PositionListener:
+    """Keeps the last position of a motor in the diffractometer snapshot"""
+    def __init__(self, diffractometer, role):
+        self.diffractometer = diffractometer
+        self.role = role
+
+    def position_changed(self, position, *args):
+        self.diffractometer._motorPositionChanged(self.role, position)
+
+
 class MiniDiff(Equipment):
     MANUAL3CLICK_MODE = "Manual 3-click"
     C3D_MODE = "Computer automatic"
@@ -130,6 +247,8 @@ class MiniDiff(Equipment):
         self.user_confirms_centring = True
         self.do_centring = True
         self.chiAngle = 0.0
+        self._positions_snapshot = None
+        self._position_listeners = []
 
         self.connect(self, 'equipmentReady', self.equipmentReady)
         self.connect(self, 'equipmentNotReady', self.equipmentNotReady)     
@@ -250,6 +369,8 @@ class MiniDiff(Equipment):
             self.connect(self.aperture, 'predefinedPositionChanged', self.apertureChanged)
             self.connect(self.aperture, 'positionReached', self.apertureChanged)
 
+        self._connectPositionListeners()
+
         #Agree on a correct method name, inconsistent arguments for moveToBeam, disabled temporarily
         #self.move_to_coord = self.moveToBeam()
 
@@ -675,41 +796,105 @@ class MiniDiff(Equipment):
         return copy.deepcopy(self.centringStatus)
 
 
-    def getPositions(self):
-      return { "phi": float(self.phiMotor.getPosition()),
-               "focus": float(self.focusMotor.getPosition()),
-               "phiy": float(self.phiyMotor.getPosition()),
-               "phiz": float(self.phizMotor.getPosition()),
-               "sampx": float(self.sampleXMotor.getPosition()),
-               "sampy": float(self.sampleYMotor.getPosition()),
-               "kappa": float(self.kappaMotor.getPosition()) if self.kappaMotor else None,
-               "kappa_phi": float(self.kappaPhiMotor.getPosition()) if self.kappaPhiMotor else None,    
-               "zoom": float(self.zoomMotor.getPosition())}
+    def getPositions(self, max_age=0):
+        """
+        Returns the {role: position} of the motors.
+        With max_age (in seconds), the last read positions are returned if
+        they were read less than max_age ago (positions notified by the
+        motors since then included), instead of reading all the motors.
+        """
+        return dict(self.getPositionsSnapshot(max_age))
+
+
+    def getPositionsSnapshot(self, max_age=0):
+        """
+        Same as getPositions, returns a PositionsSnapshot
+        """
+        snapshot = self._positions_snapshot
+        if max_age and snapshot is not None and snapshot.age() <= max_age:
+            return snapshot
+
+        timestamp = time.time()
+        snapshot = PositionsSnapshot(self.readMotorPositions(), timestamp)
+        self._positions_snapshot = snapshot
+        return snapshot
+
+
+    def readMotorPositions(self):
+        """
+        Reads the {role: position} of all the motors (None for the motors
+        which are not configured)
+        """
+        positions = {}
+        for role, motor in self.getMotorsByRole().iteritems():
+            positions[role] = float(motor.getPosition()) if motor else None
+        return positions
+
+
+    def _connectPositionListeners(self):
+        for role, motor in self.getMotorsByRole().iteritems():
+            if motor is not None:
+                listener = _PositionListener(self, role)
+                # dispatcher only keeps a weak reference to the listener
+                self._position_listeners.append(listener)
+                dispatcher.connect(listener.position_changed, "positionChanged", motor)
+
+
+    def _motorPositionChanged(self, role, position):
+        snapshot = self._positions_snapshot
+        if snapshot is not None and snapshot.get(role) is not None:
+            try:
+                self._positions_snapshot = snapshot.updated(role, float(position))
+            except (TypeError, ValueError):
+                # position cannot be trusted anymore
+                self._positions_snapshot = None
     
 
-    def moveMotors(self, roles_positions_dict):
-        motor = { "phi": self.phiMotor,
-                  "focus": self.focusMotor,
-                  "phiy": self.phiyMotor,
-                  "phiz": self.phizMotor,
-                  "sampx": self.sampleXMotor,
-                  "sampy": self.sampleYMotor,
-                  "kappa": self.kappaMotor,
-                  "kappa_phi": self.kappaPhiMotor,
-                  "zoom": self.zoomMotor }
-   
+    def getMotorsByRole(self):
+        return { "phi": self.phiMotor,
+                 "focus": self.focusMotor,
+                 "phiy": self.phiyMotor,
+                 "phiz": self.phizMotor,
+                 "sampx": self.sampleXMotor,
+                 "sampy": self.sampleYMotor,
+                 "kappa": self.kappaMotor,
+                 "kappa_phi": self.kappaPhiMotor,
+                 "zoom": self.zoomMotor }
+
+
+    def moveMotors(self, roles_positions_dict, timeout=None):
+        """
+        Moves the motors to the {role: position} positions together and
+        waits until all motors are ready.
+        Returns the time each motor took to reach its position, in seconds.
+        """
+        motor = self.getMotorsByRole()
+
+        motors_positions = {}
         for role, pos in roles_positions_dict.iteritems():
-           m = motor.get(role)
-           if not None in (m, pos):
-             m.move(pos)
- 
-        # TODO: remove this sleep, the motors states should
-        # be MOVING since the beginning (or READY if move is
-        # already finished) 
-        time.sleep(1)
- 
-        while not all([m.getState() == m.READY for m in motor.itervalues() if m is not None]):
-           time.sleep(0.1)
+           if not None in (motor.get(role), pos):
+             motors_positions[role] = pos
+
+        moving_motors = GroupedMove(motor, motors_positions)
+        try:
+            self.startMotorsMove(motors_positions)
+            settle_times = moving_motors.wait(timeout)
+        finally:
+            moving_motors.close()
+
+        logging.getLogger("HWR").debug("MiniDiff: motors moved in %s", \
+            ", ".join(["%s %.2f s" % (role, t) for role, t in settle_times.iteritems()]))
+        return settle_times
+
+
+    def startMotorsMove(self, roles_positions_dict):
+        """
+        Starts the move of the motors, derived classes can send one
+        command to move all the motors simultaneously
+        """
+        motor = self.getMotorsByRole()
+        for role, pos in roles_positions_dict.iteritems():
+            motor[role].move(pos)
 
 
     def takeSnapshots(self, image_count, wait=False):
@@ -32,11 +32,12 @@ import SimpleHTML
 
 from HardwareRepository.BaseHardwareObjects import HardwareObject
 
-from XSDataCommon import XSDataBoolean
-from XSDataCommon import XSDataDouble
-from XSDataCommon import XSDataInteger
-from XSDataCommon import XSDataString
-from XSDataControlDozorv1_1 import XSDataInputControlDozor
+import XSDataLazy
+XSDataBoolean = XSDataLazy.LazyClass("XSDataBoolean")
+XSDataDouble = XSDataLazy.LazyClass("XSDataDouble")
+XSDataInteger = XSDataLazy.LazyClass("XSDataInteger")
+XSDataString = XSDataLazy.LazyClass("XSDataString")
+XSDataInputControlDozor = XSDataLazy.LazyClass("XSDataInputControlDozor")
 
 
 __license__ = "GPLv3+"
@@ -61,6 +62,9 @@ class ParallelProcessing(HardwareObject):
         self.params_dict = None
         self.results_raw = None
         self.results_aligned = None
+        self.cell_index_map = None
+        self.best_indexes = None
+        self.best_positions_cache = None
         self.done_event = None
         self.started = None
 
@@ -293,6 +297,10 @@ class ParallelProcessing(HardwareObject):
                  "spots_resolution" : numpy.zeros(self.params_dict["images_num"]),
                  "score" : numpy.zeros(self.params_dict["images_num"])}
 
+        self.cell_index_map = None
+        self.best_indexes = None
+        self.best_positions_cache = {}
+
         self.emit("paralleProcessingResults",
                   (self.results_aligned,
                    self.params_dict,
@@ -567,68 +575,114 @@ class ParallelProcessing(HardwareObject):
         #    best_cpos = self.results_aligned["best_positions"][0]["cpos"]
         #    self.diffractometer_hwobj.move_motors(best_cpos) 
 
+    def create_cell_index_map(self):
+        """Creates a map between result index and grid cell. Map is a tuple
+           of three numpy arrays: result indexes, cols and rows, limited
+           to cells within the aligned result arrays
+
+        :returns: tuple of numpy arrays (indexes, cols, rows)
+        """
+        images_num = self.params_dict["images_num"]
+        cols, rows = self.grid.get_col_rows_from_image_serials(\
+             numpy.arange(images_num) + self.params_dict["first_image_num"])
+
+        shape = self.results_aligned["score"].shape
+        valid = (cols >= 0) & (cols < shape[0]) & \
+                (rows >= 0) & (rows < shape[1])
+        return numpy.arange(images_num)[valid], cols[valid], rows[valid]
+
     def align_processing_results(self, start_index, end_index):
-        """Realigns all results. Each results (one dimensional numpy array)
-           is converted to 2d numpy array according to diffractometer geometry.
+        """Realigns results from start_index to end_index. Each results
+           (one dimensional numpy array) is converted to 2d numpy array
+           according to diffractometer geometry.
            Function also extracts 10 (if they exist) best positions
         """
 
         num_lines = self.params_dict["lines_num"]
-        #Each result array is realigned
-        for score_key in self.results_raw.keys():
-            if num_lines > 1: 
-                for cell_index in range(start_index, end_index + 1):
-                    col, row = self.grid.get_col_row_from_image_serial(\
-                         cell_index + self.params_dict["first_image_num"])
-                    if (col < self.results_aligned[score_key].shape[0] and
-                        row < self.results_aligned[score_key].shape[1]):
-                        self.results_aligned[score_key][col][row] = self.results_raw[score_key][cell_index]
-            else:
-                self.results_aligned[score_key] = self.results_raw[score_key]  
+        start_index = max(start_index, 0)
 
+        #Each result array is realigned
         if num_lines > 1:
+            if self.cell_index_map is None:
+                self.cell_index_map = self.create_cell_index_map()
+            indexes, cols, rows = self.cell_index_map
+            selection = numpy.logical_and(indexes >= start_index,
+                                          indexes <= end_index)
+            indexes = indexes[selection]
+            cols = cols[selection]
+            rows = rows[selection]
+            for score_key in self.results_raw.keys():
+                self.results_aligned[score_key][cols, rows] = \
+                     self.results_raw[score_key][indexes]
             self.grid.set_score(self.results_raw['score'])
+        else:
+            for score_key in self.results_raw.keys():
+                self.results_aligned[score_key] = self.results_raw[score_key]
+
+        #Best positions are extracted. Only the previous best indexes and
+        #the new batch are candidates
+        batch_indexes = numpy.arange(start_index, min(end_index + 1,
+             len(self.results_raw["score"])))
+        if self.best_indexes is not None:
+            batch_indexes = numpy.union1d(self.best_indexes, batch_indexes)
+        batch_scores = self.results_raw["score"][batch_indexes]
+        batch_indexes = batch_indexes[batch_scores > 0]
+        batch_scores = batch_scores[batch_scores > 0]
+        self.best_indexes = batch_indexes[\
+             (-batch_scores).argsort(kind="mergesort")[:10]]
+
+        for index in list(self.best_positions_cache.keys()):
+            if start_index <= index <= end_index:
+                del self.best_positions_cache[index]
 
-        #Best positions are extracted
         best_positions_list = []
-
-        index_arr = (-self.results_raw["score"]).argsort()[:10]
-        if len(index_arr) > 0:
-            for index in index_arr:
-                if self.results_raw["score"][index] > 0:
-                    best_position = {}
-                    best_position["index"] = index
-                    best_position["index_serial"] = self.params_dict["first_image_num"] + index
-                    best_position["score"] = float(self.results_raw["score"][index])
-                    best_position["spots_num"] = int(self.results_raw["spots_num"][index])
-                    best_position["spots_int_aver"] = float(self.results_raw["spots_int_aver"][index])
-                    best_position["spots_resolution"] = float(self.results_raw["spots_resolution"][index])
-                    best_position["filename"] = os.path.basename(\
-                        self.params_dict["template"] % \
-                        (self.params_dict["run_number"],
-                         self.params_dict["first_image_num"] + index))
-
-                    cpos = None
-                    if num_lines > 1:
-                        col, row = self.grid.get_col_row_from_image_serial(\
-                             index + self.params_dict["first_image_num"])
-                        col += 0.5
-                        row = self.params_dict["steps_y"] - row - 0.5
-                        cpos = self.grid.get_motor_pos_from_col_row(col, row)
-                    else:
-                        col = index
-                        row = 0
-                        #TODO make this nicer
-                        num_images = self.data_collection.acquisitions[0].acquisition_parameters.num_images - 1
-                        (point_one, point_two) = self.data_collection.get_centred_positions()
-                        cpos = self.diffractometer_hwobj.get_point_from_line(point_one, point_two, index, num_images)
-                    best_position["col"] = col
-                    best_position["row"] = row
-                    best_position['cpos'] = cpos
-                    best_positions_list.append(best_position)
+        for index in self.best_indexes:
+            best_position = self.best_positions_cache.get(index)
+            if best_position is None:
+                best_position = self.get_best_position(index)
+                self.best_positions_cache[index] = best_position
+            best_positions_list.append(best_position)
 
         self.results_aligned["best_positions"] = best_positions_list
 
+    def get_best_position(self, index):
+        """Returns dictionary describing result with index
+
+        :param index: result index
+        :type index: int
+        :returns: dict
+        """
+        best_position = {}
+        best_position["index"] = index
+        best_position["index_serial"] = self.params_dict["first_image_num"] + index
+        best_position["score"] = float(self.results_raw["score"][index])
+        best_position["spots_num"] = int(self.results_raw["spots_num"][index])
+        best_position["spots_int_aver"] = float(self.results_raw["spots_int_aver"][index])
+        best_position["spots_resolution"] = float(self.results_raw["spots_resolution"][index])
+        best_position["filename"] = os.path.basename(\
+            self.params_dict["template"] % \
+            (self.params_dict["run_number"],
+             self.params_dict["first_image_num"] + index))
+
+        cpos = None
+        if self.params_dict["lines_num"] > 1:
+            col, row = self.grid.get_col_row_from_image_serial(\
+                 index + self.params_dict["first_image_num"])
+            col += 0.5
+            row = self.params_dict["steps_y"] - row - 0.5
+            cpos = self.grid.get_motor_pos_from_col_row(col, row)
+        else:
+            col = index
+            row = 0
+            #TODO make this nicer
+            num_images = self.data_collection.acquisitions[0].acquisition_parameters.num_images - 1
+            (point_one, point_two) = self.data_collection.get_centred_positions()
+            cpos = self.diffractometer_hwobj.get_point_from_line(point_one, point_two, index, num_images)
+        best_position["col"] = col
+        best_position["row"] = row
+        best_position['cpos'] = cpos
+        return best_position
+
     def extract_sweeps(self):
         """Extracts sweeps from processing results"""
 
@@ -42,11 +42,12 @@ Graphics item library:
  - GraphicsView : widget that contains GraphicsScene
 """
 
-import copy
 import math
 import logging
 from datetime import datetime
 
+import numpy as np
+
 from QtImport import *
 
 import queue_model_objects_v1 as queue_model_objects
@@ -634,6 +635,8 @@ class GraphicsItemGrid(GraphicsItem):
         self.__draw_mode = False
         self.__draw_projection = False
         self.__coordinate_map = []
+        self.__serial_col_row = np.zeros((0, 2), dtype=int)
+        self.__coordinate_map_key = None
 
         self.__osc_start = None
         self.__osc_range = 0.1
@@ -652,6 +655,16 @@ class GraphicsItemGrid(GraphicsItem):
         self.__original_pixmap = None
         self.base_color =  QColor(70, 70, 165, self.__fill_alpha)
 
+        # Cells are rendered in a cached pixmap, repainted incrementally
+        # when scores change, so that a repaint is one blit
+        self.__score_rgb = None
+        self.__dirty_cells = set()
+        self.__cells_pixmap = None
+        self.__cells_pixmap_origin = (0, 0)
+        self.__cells_pixmap_key = None
+        self.__score_image = None
+        self.__score_image_data = None
+
     @staticmethod
     def set_grid_direction(grid_direction):
         """Sets grids direction.
@@ -785,13 +798,40 @@ class GraphicsItemGrid(GraphicsItem):
         self.scene().update()
 
     def update_coordinate_map(self):
-        self.__coordinate_map = []
-        for image_index in range(self.__num_cols * self.__num_rows):
-            line, image = self.get_line_image_num(\
-                   image_index + self.__first_image_num)
-            pos_x, pos_y = self.get_coord_from_line_image(line, image)
-            col, row = self.get_col_row_from_line_image(line, image)
-            self.__coordinate_map.append((line, image, pos_x, pos_y, col, row))
+        """Precomputes line, image, screen coordinates, col and row of
+           each cell (indexed by image serial - first image serial)
+        """
+        serials = np.arange(self.__num_cols * self.__num_rows) + \
+                  self.__first_image_num
+        lines, images = self.get_line_image_nums(serials)
+        pos_x, pos_y = self.get_coords_from_line_images(lines, images)
+        cols, rows = self.get_col_rows_from_line_images(lines, images)
+
+        self.__serial_col_row = np.column_stack((cols, rows))
+        self.__coordinate_map = zip(lines.tolist(), images.tolist(),
+                                    pos_x.tolist(), pos_y.tolist(),
+                                    cols.tolist(), rows.tolist())
+        self.__coordinate_map_key = self.get_coordinate_map_key()
+        self.__cells_pixmap = None
+        self.__score_image = None
+
+    def get_coordinate_map_key(self):
+        """Grid size and direction parameters of the coordinate map
+        """
+        return (self.__num_cols, self.__num_rows, self.__num_lines,
+                self.__num_images_per_line, self.__first_image_num,
+                self.__reversing_rotation,
+                self.__center_coord.x(), self.__center_coord.y(),
+                self.__grid_range_pix["fast"], self.__grid_range_pix["slow"],
+                tuple(self.grid_direction['fast']),
+                tuple(self.grid_direction['slow']))
+
+    def check_coordinate_map(self):
+        """Computes the coordinate map again if the grid size or the
+           grid direction (shared by all grids) changed since
+        """
+        if self.__coordinate_map_key != self.get_coordinate_map_key():
+            self.update_coordinate_map()
 
     def set_corner_coord(self, corner_coord):
         for index, coord in enumerate(corner_coord):
@@ -923,7 +963,38 @@ class GraphicsItemGrid(GraphicsItem):
         return self.__centred_position
 
     def set_score(self, score):
+        """Sets cell scores (array with one value per image), the colors
+           of the cells which changed are computed in one go and only
+           these cells are repainted
+        """
+        if score is None:
+            self.__score = None
+            self.__score_rgb = None
+            self.__cells_pixmap = None
+            self.__score_image = None
+            return
+
+        score = np.asarray(score, dtype=float)
+        score_max = score.max() if score.size else 0
+        if score_max > 0:
+            # hsv(60 * s, 255, 255 * s) with s = score / max score
+            normalized = np.clip(score / score_max, 0, 1)
+            score_rgb = np.zeros((score.size, 3), dtype=np.uint8)
+            score_rgb[:, 0] = 255 * normalized
+            score_rgb[:, 1] = 255 * normalized * normalized
+        else:
+            score_rgb = None
+
+        if self.__score_rgb is None or score_rgb is None or \
+           self.__score_rgb.shape != score_rgb.shape:
+            self.__cells_pixmap = None
+        else:
+            changed = np.flatnonzero((self.__score_rgb != score_rgb).any(axis=1))
+            self.__dirty_cells.update(changed.tolist())
+
         self.__score = score
+        self.__score_rgb = score_rgb
+        self.__score_image = None
 
     def get_snapshot(self):
         return self.__snapshot
@@ -940,6 +1011,7 @@ class GraphicsItemGrid(GraphicsItem):
 
     def set_display_overlay(self, state):
         self.__display_overlay = state
+        self.__cells_pixmap = None
 
     def set_base_color(self, color):
         self.base_color = color
@@ -968,46 +1040,18 @@ class GraphicsItemGrid(GraphicsItem):
             #less than 1000 cells and size is greater than 20px
             if min(self.__spacing_pix) < 20:
                 painter.drawPolygon(self.__frame_polygon, Qt.OddEvenFill)
+                if self.__display_overlay and self.__score_rgb is not None and \
+                   self.__overlay_pixmap is None:
+                    #Small cells: scores are displayed as an image of
+                    #one pixel per cell, scaled to the grid
+                    painter.setOpacity(self.__fill_alpha / 255.0)
+                    painter.drawImage(QRectF(self.__frame_polygon.boundingRect()),
+                                      self.get_score_image())
+                    painter.setOpacity(1.0)
             else:
-                for image_index in range(self.__num_cols * self.__num_rows):
-                    #Estimate area where frame number or score will be displayed
-                    (line, image, pos_x, pos_y, col, row) = self.__coordinate_map[image_index]
-                    paint_rect = QRect(pos_x - self.__spacing_pix[0] / 2,
-                                       pos_y - self.__spacing_pix[1] / 2,
-                                       self.__spacing_pix[0],
-                                       self.__spacing_pix[1])
-
-                    #If score exists overlay color may change
-                    cell_score = None
-                    if self.__display_overlay:
-                        cell_score = 1.0
-                        if self.__score is not None:
-                            cell_score = self.__score[image_index]
-
-                            if self.__score.max() > 0:
-                                cell_score = float(cell_score) / \
-                                             self.__score.max()
-                                brush_color.setHsv(0 + 60 * cell_score,
-                                 255, 255 * cell_score, self.__fill_alpha)
-                                self.custom_brush.setColor(brush_color)
-                                painter.setBrush(self.custom_brush)
-                            else:
-                                painter.setBrush(Qt.transparent)
-                    else:
-                        painter.setBrush(Qt.transparent)
-
-                    painter.drawText(paint_rect, Qt.AlignCenter, \
-                          str(image_index + self.__first_image_num))
-                    if self.beam_is_rectangle:
-                        painter.drawRect(pos_x - self.beam_size_pix[0] / 2,
-                                         pos_y - self.beam_size_pix[1] / 2,
-                                         self.beam_size_pix[0],
-                                         self.beam_size_pix[1])
-                    else:
-                        painter.drawEllipse(pos_x - self.beam_size_pix[0] / 2,
-                                            pos_y - self.beam_size_pix[1] / 2,
-                                            self.beam_size_pix[0],
-                                            self.beam_size_pix[1])
+                x0, y0 = self.__cells_pixmap_origin
+                painter.drawPixmap(x0, y0, self.get_cells_pixmap())
+                painter.setBrush(self.custom_brush)
 
         #Draws x in the middle of the grid
         painter.drawLine(self.__center_coord.x() - 5,
@@ -1034,6 +1078,114 @@ class GraphicsItemGrid(GraphicsItem):
                          self.__frame_polygon.point(GraphicsItemGrid.TOP_RIGHT).y() + 24,
                          "%d frames per line" % self.__num_images_per_line)
 
+    def get_cell_brush(self, image_index):
+        """Returns the brush used to fill a cell"""
+        if not self.__display_overlay:
+            return QBrush(Qt.transparent)
+        if self.__score is None:
+            return QBrush(self.base_color)
+        if self.__score_rgb is None or image_index >= len(self.__score_rgb):
+            return QBrush(Qt.transparent)
+        red, green, blue = self.__score_rgb[image_index]
+        return QBrush(QColor(int(red), int(green), int(blue), self.__fill_alpha))
+
+    def paint_cell(self, painter, image_index):
+        (line, image, pos_x, pos_y, col, row) = self.__coordinate_map[image_index]
+        paint_rect = QRect(pos_x - self.__spacing_pix[0] / 2,
+                           pos_y - self.__spacing_pix[1] / 2,
+                           self.__spacing_pix[0],
+                           self.__spacing_pix[1])
+        painter.setBrush(self.get_cell_brush(image_index))
+        painter.drawText(paint_rect, Qt.AlignCenter, \
+              str(image_index + self.__first_image_num))
+        if self.beam_is_rectangle:
+            painter.drawRect(pos_x - self.beam_size_pix[0] / 2,
+                             pos_y - self.beam_size_pix[1] / 2,
+                             self.beam_size_pix[0],
+                             self.beam_size_pix[1])
+        else:
+            painter.drawEllipse(pos_x - self.beam_size_pix[0] / 2,
+                                pos_y - self.beam_size_pix[1] / 2,
+                                self.beam_size_pix[0],
+                                self.beam_size_pix[1])
+
+    def get_cells_pixmap(self):
+        """Returns the pixmap with all the cells painted. It is repainted
+           when the drawing parameters change ; when only scores changed,
+           just the modified cells are painted again
+        """
+        self.check_coordinate_map()
+        key = (self.custom_pen.color().rgba(), self.custom_pen.style(),
+               self.base_color.rgba(), self.__fill_alpha,
+               tuple(self.__spacing_pix), tuple(self.beam_size_pix),
+               self.beam_is_rectangle, self.__first_image_num)
+        num_cells = min(len(self.__coordinate_map),
+                        self.__num_cols * self.__num_rows)
+
+        if self.__cells_pixmap is None or key != self.__cells_pixmap_key:
+            margin_x = max(self.__spacing_pix[0], self.beam_size_pix[0]) / 2 + 2
+            margin_y = max(self.__spacing_pix[1], self.beam_size_pix[1]) / 2 + 2
+            if num_cells:
+                pos = np.array([item[2:4] for item in self.__coordinate_map[:num_cells]])
+                x0, y0 = pos.min(axis=0) - (margin_x, margin_y)
+                x1, y1 = pos.max(axis=0) + (margin_x, margin_y)
+            else:
+                x0 = y0 = 0
+                x1 = y1 = 1
+            self.__cells_pixmap_origin = (int(x0), int(y0))
+            self.__cells_pixmap = QPixmap(int(x1 - x0) + 1, int(y1 - y0) + 1)
+            self.__cells_pixmap.fill(Qt.transparent)
+            self.__cells_pixmap_key = key
+            cells = range(num_cells)
+            clear = False
+        elif self.__dirty_cells:
+            cells = [index for index in self.__dirty_cells if index < num_cells]
+            # overlapping cells can not be repainted separately
+            clear = self.beam_size_pix[0] <= self.__spacing_pix[0] and \
+                    self.beam_size_pix[1] <= self.__spacing_pix[1]
+            if not clear:
+                self.__cells_pixmap = None
+                return self.get_cells_pixmap()
+        else:
+            return self.__cells_pixmap
+        self.__dirty_cells = set()
+
+        painter = QPainter(self.__cells_pixmap)
+        painter.translate(-self.__cells_pixmap_origin[0],
+                          -self.__cells_pixmap_origin[1])
+        painter.setPen(self.custom_pen)
+        for image_index in cells:
+            if clear:
+                pos_x, pos_y = self.__coordinate_map[image_index][2:4]
+                painter.setCompositionMode(QPainter.CompositionMode_Clear)
+                painter.fillRect(QRectF(pos_x - self.__spacing_pix[0] / 2.0,
+                                        pos_y - self.__spacing_pix[1] / 2.0,
+                                        self.__spacing_pix[0],
+                                        self.__spacing_pix[1]), Qt.transparent)
+                painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            self.paint_cell(painter, image_index)
+        painter.end()
+        return self.__cells_pixmap
+
+    def get_score_image(self):
+        """Returns scores as an image with one pixel per cell"""
+        if self.__score_image is None:
+            # QImage.Format_ARGB32 is stored as B, G, R, A bytes
+            bgra = np.zeros((self.__num_rows, self.__num_cols, 4), dtype=np.uint8)
+            num_cells = min(len(self.__coordinate_map), len(self.__score_rgb))
+            if num_cells:
+                col_row = np.array([item[4:6] for item in self.__coordinate_map[:num_cells]])
+                cols = np.clip(col_row[:, 0], 0, self.__num_cols - 1)
+                rows = np.clip(col_row[:, 1], 0, self.__num_rows - 1)
+                bgra[rows, cols, :3] = self.__score_rgb[:num_cells, ::-1]
+                bgra[rows, cols, 3] = 255
+            self.__score_image_data = bgra.tostring()
+            self.__score_image = QImage(self.__score_image_data,
+                                        self.__num_cols, self.__num_rows,
+                                        self.__num_cols * 4,
+                                        QImage.Format_ARGB32)
+        return self.__score_image
+
     def move_by_pix(self, move_direction):
         """Moves grid by one pixel
         """
@@ -1148,6 +1300,7 @@ class GraphicsItemGrid(GraphicsItem):
         return self.get_col_row_from_line_image(line, image)
 
     def get_col_row_from_image(self, image_num):
+        self.check_coordinate_map()
         (line, image, pos_x, pos_y, col, row) = self.__coordinate_map[image_num]
         return col, row
 
@@ -1174,7 +1327,7 @@ class GraphicsItemGrid(GraphicsItem):
         """
         Descript. : x = x(click - x_middle_of_the_plot), y== the same
         """
-        new_point = copy.deepcopy(self.__centred_position.as_dict())
+        new_point = dict(self.__centred_position.as_dict())
         (hor_range, ver_range) = self.get_grid_size_mm()
         hor_range = - hor_range * (self.__num_cols / 2.0 - col) / \
                     self.__num_cols
@@ -1212,6 +1365,152 @@ class GraphicsItemGrid(GraphicsItem):
             return new_point
 
 
+    def get_line_image_nums(self, image_serials):
+        """
+        Descript. : array version of get_line_image_num
+        Args.     : image_serials, array of image serial numbers
+        Returns   : arrays of lines and images
+        """
+        offsets = np.asarray(image_serials) - self.__first_image_num
+        # floor, as the integer division of get_line_image_num
+        lines = np.floor(offsets / float(self.__num_images_per_line)).astype(int)
+        images = offsets - lines * self.__num_images_per_line
+        return lines, images
+
+    def get_coord_refs_from_line_images(self, lines, images):
+        """
+        Descript. : array version of get_coord_ref_from_line_image
+        """
+        lines = np.asarray(lines)
+        images = np.asarray(images)
+        if self.__num_images_per_line > 1:
+            fast_refs = 0.5 - images / float(self.__num_images_per_line - 1)
+        else:
+            fast_refs = np.full(images.shape, 0.5)
+        if self.__reversing_rotation:
+            fast_refs = np.where(lines % 2, -fast_refs, fast_refs)
+
+        if self.__num_lines > 1:
+            slow_refs = 0.5 - lines / float(self.__num_lines - 1)
+        else:
+            slow_refs = np.full(lines.shape, 0.5)
+        return fast_refs, slow_refs
+
+    def get_coords_from_line_images(self, lines, images):
+        """
+        Descript. : array version of get_coord_from_line_image
+        Returns   : arrays of screen coordinates x, y in pixels
+        """
+        ref_fast, ref_slow = self.get_coord_refs_from_line_images(lines, images)
+
+        coord_x = self.__center_coord.x() + self.__grid_range_pix['fast'] * \
+                  self.grid_direction['fast'][0] * ref_fast  + \
+                  self.__grid_range_pix['slow'] * \
+                  self.grid_direction['slow'][0] * ref_slow
+        coord_y = self.__center_coord.y() + self.__grid_range_pix['fast'] * \
+                  self.grid_direction['fast'][1] * ref_fast  + \
+                  self.__grid_range_pix['slow'] * \
+                  self.grid_direction['slow'][1] * ref_slow
+        return coord_x, coord_y
+
+    def get_col_rows_from_line_images(self, lines, images):
+        """
+        Descript. : array version of get_col_row_from_line_image
+        Returns   : arrays of cols and rows
+        """
+        ref_fast, ref_slow = self.get_coord_refs_from_line_images(lines, images)
+
+        cols = self.__num_cols / 2.0 + (self.__num_images_per_line - 1) * \
+               self.grid_direction['fast'][0] * ref_fast + \
+               (self.__num_lines - 1) * \
+               self.grid_direction['slow'][0] * ref_slow
+        rows = self.__num_rows / 2.0 + (self.__num_images_per_line - 1) * \
+               self.grid_direction['fast'][1] * ref_fast + \
+               (self.__num_lines - 1) * \
+               self.grid_direction['slow'][1] * ref_slow
+        return cols.astype(int), rows.astype(int)
+
+    def get_col_rows_from_image_serials(self, image_serials):
+        """
+        Descript. : array version of get_col_row_from_image_serial. Uses
+                    the precomputed map for serials within the grid
+        Returns   : arrays of cols and rows
+        """
+        self.check_coordinate_map()
+        image_serials = np.asarray(image_serials)
+        indexes = image_serials - self.__first_image_num
+        if indexes.size and indexes.min() >= 0 and \
+           indexes.max() < len(self.__serial_col_row):
+            col_row = self.__serial_col_row[indexes]
+            return col_row[..., 0], col_row[..., 1]
+        lines, images = self.get_line_image_nums(image_serials)
+        return self.get_col_rows_from_line_images(lines, images)
+
+    def get_images_from_col_rows(self, cols, rows):
+        """
+        Descript. : array version of get_image_from_col_row
+                    cols and rows can be floats
+        Returns   : arrays of images, lines and image serials
+        """
+        cols = np.asarray(cols)
+        rows = np.asarray(rows)
+        images = (self.__num_images_per_line / 2.0 + \
+                  self.grid_direction['fast'][0] * \
+                  (self.__num_cols / 2.0 - cols) - \
+                  self.grid_direction['fast'][1] * \
+                  (self.__num_rows / 2.0 - rows)).astype(int)
+        lines = (self.__num_lines / 2.0 + \
+                 self.grid_direction['slow'][0] * \
+                 (self.__num_cols / 2.0 - cols) - \
+                 self.grid_direction['slow'][1] * \
+                 (self.__num_rows / 2.0 - rows)).astype(int)
+
+        image_serials = self.__first_image_num + \
+                        self.__num_images_per_line * lines + images
+        if self.__reversing_rotation:
+            reversed_serials = self.__first_image_num + \
+                self.__num_images_per_line * (lines + 1) - 1 - images
+            image_serials = np.where(lines % 2, reversed_serials, image_serials)
+        return images, lines, image_serials
+
+    def get_motor_pos_from_col_rows(self, cols, rows):
+        """
+        Descript. : array version of get_motor_pos_from_col_row
+        Returns   : dict {motor name: array of positions}, motors not
+                    depending on the cell have a single value
+        """
+        cols = np.asarray(cols, dtype=float)
+        rows = np.asarray(rows, dtype=float)
+        new_points = dict(self.__centred_position.as_dict())
+        (hor_range, ver_range) = self.get_grid_size_mm()
+        hor_range = - hor_range * (self.__num_cols / 2.0 - cols) / \
+                    self.__num_cols
+        ver_range = - ver_range * (self.__num_rows / 2.0 - rows) / \
+                    self.__num_rows
+        sin_omega = math.sin(math.pi * (self.__osc_start - \
+                             self.grid_direction['omega_ref']) / 180.0)
+        cos_omega = math.cos(math.pi * (self.__osc_start - \
+                             self.grid_direction['omega_ref']) / 180.0)
+
+        if self.grid_direction['fast'][0] == 1:
+            #MD2 when fast direction is horizontal direction
+            new_points['sampx'] = new_points['sampx'] + ver_range * sin_omega
+            new_points['sampy'] = new_points['sampy'] - ver_range * cos_omega
+            new_points['phiy'] = new_points['phiy'] - hor_range
+            new_points['phi'] = new_points['phi'] - self.__osc_range * \
+                                self.__num_cols / 2 + (self.__num_cols - cols) * \
+                                self.__osc_range
+        else:
+            #MD3
+            new_points['sampx'] = new_points['sampx'] - hor_range * sin_omega
+            new_points['sampy'] = new_points['sampy'] + hor_range * cos_omega
+            new_points['phiy'] = new_points['phiy'] + ver_range
+            new_points['phi'] = new_points['phi'] - self.__osc_range * \
+                                self.__num_rows / 2 + (self.__num_rows - rows) * \
+                                self.__osc_range
+        return new_points
+
+
 class GraphicsItemScale(GraphicsItem):
     """
     Descrip. : Displays vertical and horizontal scale on the bottom, left
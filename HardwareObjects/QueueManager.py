@@ -121,15 +121,10 @@ class QueueManager(HardwareObject, QueueEntryContainer):
         status = self._running
 
         if node_id:
-            if self._current_queue_entries:
-                for qe in self._current_queue_entries:
-                    if qe.get_data_model()._node_id == node_id:
-                        status = True
-                        break
-                    else:
-                        status = False
-            else:
-                status = False
+            # only the entries being executed (one per tree level)
+            # are checked
+            status = any(qe.get_data_model()._node_id == node_id
+                         for qe in self._current_queue_entries)
 
         return status
 
@@ -349,11 +344,23 @@ class QueueManager(HardwareObject, QueueEntryContainer):
         if not root_queue_entry:
             root_queue_entry = self
 
+        result = root_queue_entry.get_indexed_entry(model)
+        if result is None:
+            result = self._find_entry_with_model(model, root_queue_entry)
+            if result is not None:
+                self._model_entry_index[id(model)] = result
+        return result
+
+    def _find_entry_with_model(self, model, root_queue_entry):
+        """
+        Recursive search of the entry with the data model model, used
+        when the entry is not in the index.
+        """
         for queue_entry in root_queue_entry._queue_entry_list:
             if queue_entry.get_data_model() is model:
                 return queue_entry
             else:
-                result = self.get_entry_with_model(model, queue_entry)
+                result = self._find_entry_with_model(model, queue_entry)
 
                 if result:
                     return result
@@ -378,6 +385,7 @@ class QueueManager(HardwareObject, QueueEntryContainer):
         :rtype: NoneType
         """
         self._queue_entry_list = []
+        self._model_entry_index = {}
 
     def show_workflow_tab(self):
         self.emit('show_workflow_tab')
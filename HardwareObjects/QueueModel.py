@@ -53,6 +53,9 @@ class QueueModel(HardwareObject):
 
         self._selected_model = self._ispyb_model
 
+        # node_id -> node index, one per model root
+        self._node_index = {}
+
     def __getstate__(self):
         d = dict(self.__dict__)
         return d
@@ -111,6 +114,7 @@ class QueueModel(HardwareObject):
         :returns: None
         :rtype: NoneType
         """
+        self._node_index.pop(self._models[name], None)
         self._models[name] = queue_model_objects.RootNode()
         self.queue_hwobj.clear()
 
@@ -158,6 +162,7 @@ class QueueModel(HardwareObject):
             child._parent = parent
             child._node_id = self._selected_model._total_node_count
             parent._children.append(child)
+            self._index_node(child)
             child._set_name(child._name)
             self.emit('child_added', (parent, child))
         else:
@@ -197,15 +202,86 @@ class QueueModel(HardwareObject):
         if parent is None:
             parent = self._selected_model 
 
+        index = self._get_node_index(self._get_root(parent))
+        node = index.get(_id)
+        if node is not None and node._node_id == _id and \
+           self._is_descendant(node, parent):
+            return node
+
+        node = self._find_node(_id, parent)
+        if node is not None:
+            index[_id] = node
+        return node
+
+    def _find_node(self, _id, parent):
+        """
+        Recursive search of the node with node id <_id>, used when the
+        node is not in the index.
+        """
         for node in parent._children:
             if node._node_id == _id:
                 return node
             else:
-                result = self.get_node(_id, node)
+                result = self._find_node(_id, node)
 
                 if result:
                     return result
 
+    def _get_node_index(self, root=None):
+        """
+        :returns: The node_id -> node dictionary of the model <root>,
+                  selected model if None.
+        :rtype: dict
+        """
+        if root is None:
+            root = self._selected_model
+        return self._node_index.setdefault(root, {})
+
+    def _get_root(self, node):
+        while node._parent is not None:
+            node = node._parent
+        return node
+
+    def _is_descendant(self, node, parent):
+        """
+        :returns: True if <node> is in the sub tree of <parent>
+        :rtype: bool
+        """
+        node = node._parent
+        while node is not None:
+            if node is parent:
+                return True
+            node = node._parent
+        return False
+
+    def _index_node(self, node):
+        """
+        Adds <node> and its children to the index of its model.
+        Children keep their node id, an already indexed id is not
+        overwritten.
+        """
+        index = self._get_node_index(self._get_root(node))
+        index[node._node_id] = node
+        for child in node._children:
+            self._index_child_nodes(index, child)
+
+    def _index_child_nodes(self, index, node):
+        if node._node_id is not None:
+            index.setdefault(node._node_id, node)
+        for child in node._children:
+            self._index_child_nodes(index, child)
+
+    def _unindex_node(self, node, index=None):
+        """
+        Removes <node> and its children from the index
+        """
+        if index is None:
+            index = self._get_node_index(self._get_root(node))
+        if index.get(node._node_id) is node:
+            del index[node._node_id]
+        for child in node._children:
+            self._unindex_node(child, index)
+
     def del_child(self, parent, child):
         """
         Removes <child>
@@ -217,6 +293,7 @@ class QueueModel(HardwareObject):
         :rtype: None
         """
         if child in parent._children:
+            self._unindex_node(child, self._get_node_index(self._get_root(parent)))
             parent._children.remove(child)
             self.emit('child_removed', (parent, child))
 
@@ -0,0 +1,223 @@
+#
+#  Project: MXCuBE
+#  https://github.com/mxcube.
+#
+#  This file is part of MXCuBE software.
+#
+#  MXCuBE is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  MXCuBE is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with MXCuBE.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+[Name]
+VideoStreamer
+
+[Description]
+Serves the frames of a video Hardware Object (GenericVideoDevice) as a
+MJPEG stream over HTTP, to any number of clients.
+
+Each frame is JPEG encoded once (for the configured quality and scale)
+and the same JPEG data is sent to all clients. Frames are only acquired
+and encoded while at least one client is connected. When encoding is
+slower than the configured frame rate, the frame rate is lowered ; slow
+clients always get the newest frame, intermediate frames are dropped.
+
+URLs :
+  /             MJPEG stream (multipart/x-mixed-replace)
+  /snapshot.jpg last frame
+
+[Example xml file]
+<object class="VideoStreamer">
+  <object href="/camera" role="camera"/>
+  <port>8081</port>
+  <quality>75</quality>
+  <scale>0.5</scale>
+  <max_fps>10</max_fps>
+</object>
+"""
+
+import time
+import socket
+import logging
+import gevent
+import gevent.event
+import gevent.server
+
+from HardwareRepository.BaseHardwareObjects import HardwareObject
+
+
+BOUNDARY = "mxcubeframe"
+
+
+class VideoStreamer(HardwareObject):
+
+    default_port = 8081
+    default_quality = 75
+    default_scale = 1.0
+    default_max_fps = 10
+
+    def __init__(self, name):
+        HardwareObject.__init__(self, name)
+
+        self.camera = None
+        self.port = None
+        self.quality = None
+        self.scale = None
+        self.min_interval = None
+        self.server = None
+
+        self._clients = 0
+        self._publisher = None
+        self._frame_ready = gevent.event.Event()
+        self._new_jpeg = gevent.event.Event()
+        self._jpeg = None
+        self._jpeg_number = 0
+        self._stats = {"frames": 0,
+                       "encode_time": 0,
+                       "interval": 0}
+
+    def init(self):
+        self.camera = self.getObjectByRole("camera")
+        self.port = int(self.getProperty("port", VideoStreamer.default_port))
+        self.quality = int(self.getProperty("quality",
+                                            VideoStreamer.default_quality))
+        self.scale = float(self.getProperty("scale",
+                                            VideoStreamer.default_scale))
+        self.min_interval = 1.0 / float(self.getProperty("max_fps",
+                                            VideoStreamer.default_max_fps))
+
+        if self.camera is None:
+            logging.getLogger("HWR").error("%s: no camera configured", self.name())
+            return
+
+        try:
+            self.server = gevent.server.StreamServer(("", self.port),
+                                                     self._handle_client)
+            self.server.start()
+        except:
+            self.server = None
+            logging.getLogger("HWR").exception("%s: cannot start video stream " +\
+                                               "server on port %d", self.name(), self.port)
+        else:
+            logging.getLogger("HWR").info("%s: serving video stream on port %d",
+                                          self.name(), self.port)
+
+    def get_statistics(self):
+        """
+        Descript. : number of clients, frames published, last encoding
+                    time and current publishing interval, in seconds
+        """
+        stats = dict(self._stats)
+        stats["clients"] = self._clients
+        return stats
+
+    def frame_received(self, frame, width, height):
+        self._frame_ready.set()
+
+    def _client_connected(self):
+        self._clients += 1
+        if self._publisher is None:
+            self.connect(self.camera, "frameReceived", self.frame_received)
+            self._publisher = gevent.spawn(self._publish)
+
+    def _client_disconnected(self):
+        self._clients -= 1
+        if self._clients == 0 and self._publisher is not None:
+            self.disconnect(self.camera, "frameReceived", self.frame_received)
+            self._publisher.kill()
+            self._publisher = None
+            # the next client waits for a frame of its own session
+            self._jpeg = None
+
+    def _publish(self):
+        interval = self.min_interval
+        while True:
+            self._frame_ready.wait()
+            self._frame_ready.clear()
+
+            t0 = time.time()
+            jpeg = self.camera.get_jpeg_frame(self.quality, self.scale)[0]
+            encode_time = time.time() - t0
+
+            if jpeg is not None:
+                self._jpeg = jpeg
+                self._jpeg_number += 1
+                # wake up all the clients waiting for this frame
+                new_jpeg, self._new_jpeg = self._new_jpeg, gevent.event.Event()
+                new_jpeg.set()
+
+            # drop frames when encoding cannot keep up with max_fps
+            interval = max(self.min_interval, encode_time * 1.5)
+            self._stats["frames"] += 1
+            self._stats["encode_time"] = encode_time
+            self._stats["interval"] = interval
+            gevent.sleep(max(0, interval - encode_time))
+
+    def _read_request(self, sock):
+        """Returns the path of the HTTP request"""
+        request = ""
+        while "\r\n\r\n" not in request and "\n\n" not in request:
+            data = sock.recv(4096)
+            if not data:
+                break
+            request += data
+            if len(request) > 65536:
+                break
+        try:
+            return request.split("\n", 1)[0].split()[1]
+        except IndexError:
+            return None
+
+    def _handle_client(self, sock, address):
+        try:
+            path = self._read_request(sock)
+        except socket.error:
+            sock.close()
+            return
+
+        if path not in ("/", "/snapshot.jpg"):
+            sock.sendall("HTTP/1.0 404 Not Found\r\n\r\n")
+            sock.close()
+            return
+
+        self._client_connected()
+        try:
+            if path == "/snapshot.jpg":
+                while self._jpeg is None:
+                    self._new_jpeg.wait()
+                jpeg = self._jpeg
+                sock.sendall("HTTP/1.0 200 OK\r\n" +\
+                             "Content-Type: image/jpeg\r\n" +\
+                             "Content-Length: %d\r\n\r\n" % len(jpeg))
+                sock.sendall(jpeg)
+            else:
+                sock.sendall("HTTP/1.0 200 OK\r\n" +\
+                             "Cache-Control: no-cache\r\n" +\
+                             "Content-Type: multipart/x-mixed-replace; " +\
+                             "boundary=%s\r\n\r\n" % BOUNDARY)
+                sent_number = None
+                while True:
+                    if sent_number == self._jpeg_number:
+                        self._new_jpeg.wait()
+                    jpeg, sent_number = self._jpeg, self._jpeg_number
+                    if jpeg is None:
+                        continue
+                    sock.sendall("--%s\r\n" % BOUNDARY +\
+                                 "Content-Type: image/jpeg\r\n" +\
+                                 "Content-Length: %d\r\n\r\n" % len(jpeg))
+                    sock.sendall(jpeg)
+                    sock.sendall("\r\n")
+        except socket.error:
+            pass
+        finally:
+            self._client_disconnected()
+            sock.close()
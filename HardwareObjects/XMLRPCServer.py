@@ -466,7 +466,10 @@ class XMLRPCServer(HardwareObject):
         else:
             self.wokflow_in_progress = False
 
-    def get_diffractometer_positions(self):
+    def get_diffractometer_positions(self, max_age=0):
+        if max_age:
+            # positions read less than max_age seconds ago are good enough
+            return self.diffractometer_hwobj.getPositions(max_age=max_age)
         return self.diffractometer_hwobj.getPositions()
 
     def move_diffractometer(self, roles_positions_dict):
@@ -0,0 +1,285 @@
+"""Fast XML input/output for the generated XSData classes
+
+The generated classes (XSDataCommon, XSDataMXv1, XSDataMXCuBEv1_3,
+XSDataAutoprocv1_0, XSDataControlDozorv1_1) parse with xml.dom.minidom,
+export the parsed object again to validate it, write through StringIO
+and copy objects by marshalling and parsing them again.
+
+This module provides replacements with the same behaviour :
+  - parse_string / parse_file build a light tree with expat, with the
+    part of the DOM API used by the generated build methods
+  - marshal / export_to_file collect the exported XML in a list
+  - copy duplicates the objects structure, without XML
+
+install() puts them in place of the parseString, parseFile, marshal,
+exportToFile and copy methods of the generated classes.
+
+Command line usage (benchmark against the generated methods) :
+  python XSDataIO.py [-n repeat] [xml file] [...]
+"""
+
+import sys
+import time
+import optparse
+from xml.dom import Node
+from xml.parsers import expat
+
+XSDATA_MODULES = ("XSDataCommon",
+                  "XSDataMXv1",
+                  "XSDataMXCuBEv1_3",
+                  "XSDataAutoprocv1_0",
+                  "XSDataControlDozorv1_1")
+
+XML_HEADER = u'<?xml version="1.0" ?>\n'
+
+
+class _Element(object):
+    __slots__ = ("nodeName", "childNodes")
+    nodeType = Node.ELEMENT_NODE
+    nodeValue = None
+
+    def __init__(self, name):
+        self.nodeName = name
+        self.childNodes = []
+
+    @property
+    def firstChild(self):
+        if self.childNodes:
+            return self.childNodes[0]
+        return None
+
+    def toxml(self):
+        return u"<%s>%s</%s>" % (self.nodeName,
+                                 u"".join([child.toxml() for child in self.childNodes]),
+                                 self.nodeName)
+
+
+class _Text(object):
+    __slots__ = ("nodeValue",)
+    nodeType = Node.TEXT_NODE
+    nodeName = "#text"
+    childNodes = ()
+    firstChild = None
+
+    def __init__(self, data):
+        self.nodeValue = data
+
+    def toxml(self):
+        # xml.sax.saxutils.escape, without importing urllib
+        return self.nodeValue.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+class _TreeBuilder:
+    def __init__(self):
+        self.document = _Element("#document")
+        self.stack = [self.document]
+        self.parser = expat.ParserCreate()
+        # consecutive character data in one call, like minidom text nodes
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.parser.CharacterDataHandler = self.characters
+
+    def start_element(self, name, attrs):
+        element = _Element(name)
+        self.stack[-1].childNodes.append(element)
+        self.stack.append(element)
+
+    def end_element(self, name):
+        self.stack.pop()
+
+    def characters(self, data):
+        children = self.stack[-1].childNodes
+        if children and children[-1].__class__ is _Text:
+            children[-1].nodeValue += data
+        else:
+            children.append(_Text(data))
+
+    def document_element(self):
+        for node in self.document.childNodes:
+            if node.nodeType == Node.ELEMENT_NODE:
+                return node
+        raise ValueError("no XML element found")
+
+
+def parse_string(xsdata_class, xml_string):
+    """Returns the xsdata_class object of the XML string"""
+    builder = _TreeBuilder()
+    builder.parser.Parse(xml_string, True)
+    obj = xsdata_class()
+    obj.build(builder.document_element())
+    return obj
+
+
+def parse_file(xsdata_class, filename):
+    """Returns the xsdata_class object of the XML file"""
+    builder = _TreeBuilder()
+    xml_file = open(filename, "rb")
+    try:
+        builder.parser.ParseFile(xml_file)
+    finally:
+        xml_file.close()
+    obj = xsdata_class()
+    obj.build(builder.document_element())
+    return obj
+
+
+class _ListWriter(list):
+    write = list.append
+
+
+def marshal(obj, name=None):
+    """Returns the XML string of obj, the root element is name (default:
+    the class name)"""
+    output = _ListWriter()
+    output.write(XML_HEADER)
+    obj.export(output, 0, name_=name or obj.__class__.__name__)
+    return u"".join(output)
+
+
+def export_to_file(obj, filename, name=None):
+    xml_string = marshal(obj, name)
+    xml_file = open(filename, "w")
+    try:
+        xml_file.write(xml_string)
+    finally:
+        xml_file.close()
+
+
+def _copy_value(value):
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    if hasattr(value, "__dict__") and hasattr(value, "export"):
+        return copy(value)
+    # numbers and strings
+    return value
+
+
+def copy(obj):
+    """Returns a copy of obj and of the XSData objects it contains"""
+    new_obj = obj.__class__.__new__(obj.__class__)
+    new_dict = new_obj.__dict__
+    for key, value in obj.__dict__.items():
+        new_dict[key] = _copy_value(value)
+    return new_obj
+
+
+def _show_indent(outfile, level):
+    outfile.write(u"    " * level)
+
+
+def _methods(xsdata_class):
+    name = xsdata_class.__name__
+
+    def parseString(_inString):
+        return parse_string(xsdata_class, _inString)
+
+    def parseFile(_inFilePath):
+        return parse_file(xsdata_class, _inFilePath)
+
+    def marshal_(self):
+        return marshal(self, name)
+
+    def exportToFile(self, _outfileName):
+        export_to_file(self, _outfileName, name)
+
+    return {"parseString": staticmethod(parseString),
+            "parseFile": staticmethod(parseFile),
+            "marshal": marshal_,
+            "exportToFile": exportToFile,
+            "copy": copy}
+
+
+def install(*modules):
+    """
+    Replaces the XML methods of the classes of the generated XSData
+    modules (default: the ones already imported)
+    """
+    if not modules:
+        modules = [sys.modules[name] for name in XSDATA_MODULES if name in sys.modules]
+
+    for module in modules:
+        if getattr(module, "_xsdata_io_installed", False):
+            continue
+        module.showIndent = _show_indent
+        for obj in list(vars(module).values()):
+            if not isinstance(obj, type) or obj.__module__ != module.__name__ \
+               or not "build" in obj.__dict__:
+                continue
+            for method_name, method in _methods(obj).items():
+                if method_name in obj.__dict__:
+                    setattr(obj, method_name, method)
+        module._xsdata_io_installed = True
+
+
+def _find_class(xml_string):
+    """Returns the generated XSData class of the XML root element"""
+    builder = _TreeBuilder()
+    builder.parser.Parse(xml_string, True)
+    class_name = builder.document_element().nodeName.split(":")[-1]
+    for module_name in XSDATA_MODULES:
+        module = __import__(module_name)
+        if hasattr(module, class_name):
+            return getattr(module, class_name)
+    raise ValueError("unknown XSData class %s" % class_name)
+
+
+def _dozor_result(images_num):
+    """Returns a Dozor result XML string with images_num images"""
+    from XSDataCommon import XSDataDouble, XSDataInteger
+    from XSDataControlDozorv1_1 import XSDataResultControlDozor, XSDataControlImageDozor
+
+    dozor_result = XSDataResultControlDozor()
+    for index in range(images_num):
+        dozor_image = XSDataControlImageDozor()
+        dozor_image.setNumber(XSDataInteger(index))
+        dozor_image.setScore(XSDataDouble(index * 0.1))
+        dozor_image.setSpots_num_of(XSDataInteger(index % 50))
+        dozor_image.setSpots_resolution(XSDataDouble(2.5))
+        dozor_result.addImageDozor(dozor_image)
+    return dozor_result.marshal()
+
+
+def _timeit(func, repeat):
+    t0 = time.time()
+    for i in range(repeat):
+        result = func()
+    return (time.time() - t0) / repeat, result
+
+
+def benchmark(name, xml_string, repeat=5):
+    """Prints the time spent by the generated methods and by this module
+    to parse, marshal and copy xml_string"""
+    xsdata_class = _find_class(xml_string)
+
+    t_old, old_obj = _timeit(lambda: xsdata_class.parseString(xml_string), repeat)
+    t_new, new_obj = _timeit(lambda: parse_string(xsdata_class, xml_string), repeat)
+    print "%s (%s, %d bytes)" % (name, xsdata_class.__name__, len(xml_string))
+    print "  parse    %8.1f ms %8.1f ms  x%.1f" % (t_old * 1000, t_new * 1000, t_old / t_new)
+
+    t_old, old_xml = _timeit(old_obj.marshal, repeat)
+    t_new, new_xml = _timeit(lambda: marshal(new_obj), repeat)
+    print "  marshal  %8.1f ms %8.1f ms  x%.1f" % (t_old * 1000, t_new * 1000, t_old / t_new)
+
+    t_old, old_copy = _timeit(old_obj.copy, repeat)
+    t_new, new_copy = _timeit(lambda: copy(new_obj), repeat)
+    print "  copy     %8.1f ms %8.1f ms  x%.1f" % (t_old * 1000, t_new * 1000, t_old / t_new)
+
+    if old_xml != new_xml or old_copy.marshal() != marshal(new_copy):
+        print "  WARNING: results differ"
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser("usage: %prog [-n repeat] [xml file] [...]")
+    parser.add_option("-n", "--repeat", type="int", default=5,
+                      help="number of runs of each method (default: %default)")
+    options, args = parser.parse_args()
+
+    if args:
+        for filename in args:
+            benchmark(filename, open(filename, "rb").read(), options.repeat)
+    else:
+        import edna_test_data
+        benchmark("characterisation result", edna_test_data.EDNA_RESULT_DATA, options.repeat)
+        benchmark("Dozor result, 10000 images", _dozor_result(10000), options.repeat)
+    print "(generated methods, XSDataIO, speed-up)"
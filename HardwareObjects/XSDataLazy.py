@@ -0,0 +1,101 @@
+"""Lazy loading of the generated XSData classes
+
+Importing the generated XSData modules executes thousands of class
+bodies (XSDataMXv1 alone is 11000 lines), even if no characterisation
+or processing is ever run. A LazyClass stands for a generated class and
+imports its module the first time it is called or one of its attributes
+is used :
+
+  XSDataInputMXCuBE = XSDataLazy.LazyClass("XSDataInputMXCuBE")
+  ...
+  edna_input = XSDataInputMXCuBE.parseString(xml_string)
+
+The module defining each class is found in a table read from the
+modules sources, without importing them. The loaded modules get the
+XSDataIO parsing and writing methods.
+"""
+
+import re
+import sys
+import imp
+import logging
+
+import XSDataIO
+
+CLASS_RE = re.compile(r"^class\s+(\w+)\s*[(:]", re.MULTILINE)
+
+_class_modules = None
+
+
+def _module_classes(module_name):
+    """Returns the names of the classes defined in a generated module"""
+    try:
+        module_file, filename, description = imp.find_module(module_name)
+        if module_file is not None:
+            module_file.close()
+        if filename[-4:] in (".pyc", ".pyo"):
+            filename = filename[:-1]
+        source_file = open(filename)
+        try:
+            return CLASS_RE.findall(source_file.read())
+        finally:
+            source_file.close()
+    except (ImportError, IOError):
+        pass
+
+    # no source: the module has to be imported
+    try:
+        module = __import__(module_name)
+    except ImportError:
+        logging.getLogger("HWR").warning("XSDataLazy: cannot find module %s", module_name)
+        return []
+    return [name for name, obj in vars(module).items() \
+            if isinstance(obj, type) and obj.__module__ == module_name]
+
+
+def class_table():
+    """Returns {class name: module name} for the generated XSData classes"""
+    global _class_modules
+    if _class_modules is None:
+        class_modules = {}
+        for module_name in XSDataIO.XSDATA_MODULES:
+            for class_name in _module_classes(module_name):
+                class_modules.setdefault(class_name, module_name)
+        _class_modules = class_modules
+    return _class_modules
+
+
+def get_class(class_name):
+    """Returns the generated XSData class, importing its module if needed"""
+    module_name = class_table().get(class_name)
+    if module_name is None:
+        raise AttributeError("no XSData class %s" % class_name)
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = __import__(module_name)
+        XSDataIO.install()
+    return getattr(module, class_name)
+
+
+class LazyClass(object):
+    def __init__(self, class_name):
+        self._class_name = class_name
+        self._class = None
+
+    def resolve(self):
+        """Returns the generated class"""
+        if self._class is None:
+            self._class = get_class(self._class_name)
+        return self._class
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __instancecheck__(self, obj):
+        return isinstance(obj, self.resolve())
+
+    def __repr__(self):
+        return "<LazyClass %s>" % self._class_name
@@ -4,9 +4,13 @@ import subprocess
 import os
 import math
 from HardwareRepository.TaskUtils import task, cleanup, error_cleanup
+from PyTango.gevent import DeviceProxy
 import logging
 
 class Eiger:
+  """
+  Lima attributes are written in one batch (see write_lima_attributes).
+  """
 
   def init(self, config, collect_obj):
       self.config = config
@@ -15,6 +19,7 @@ class Eiger:
 
       lima_device = config.getProperty("lima_device")
       eiger_device = config.getProperty("eiger_device")
+      self.lima_device = DeviceProxy(lima_device)
 
       for channel_name in ("acq_status", "acq_trigger_mode", "saving_mode", "acq_nb_frames",
                            "acq_expo_time", "saving_directory", "saving_prefix",
@@ -48,11 +53,24 @@ class Eiger:
       self.getCommandObject("prepare_acq").device.set_timeout_millis(5*60*1000)
       self.getChannelObject("photon_energy").init_device()
 
-  def wait_ready(self):
+  def wait_acq_status(self, condition, timeout, timeout_exception=None):
+      """Polls acq_status until condition(acq_status) is True, the
+      polling period starts at 10 ms and doubles up to 0.5 s"""
       acq_status_chan = self.getChannelObject("acq_status")
-      with gevent.Timeout(30, RuntimeError("Detector not ready")):
-          while acq_status_chan.getValue() != "Ready":
-              time.sleep(1)
+      polling_period = 0.01
+      with gevent.Timeout(timeout, timeout_exception):
+          while not condition(acq_status_chan.getValue()):
+              time.sleep(polling_period)
+              polling_period = min(2*polling_period, 0.5)
+
+  def wait_ready(self):
+      self.wait_acq_status(lambda status: status == "Ready", 30, RuntimeError("Detector not ready"))
+
+  def write_lima_attributes(self, attributes):
+      """Writes the (name, value) attributes in one request, in the
+      given order. All of them are written each time: the Lima device
+      can be restarted or written by other clients meanwhile."""
+      self.lima_device.write_attributes(attributes)
 
   def last_image_saved(self):
       #return 0
@@ -103,29 +121,35 @@ class Eiger:
                      "detector_distance=%s" % (self.collect_obj.get_detector_distance()/1000.0),
                      "omega_start=%0.4f" % start,
                      "omega_increment=%0.4f" % osc_range]
-      self.getChannelObject("set_image_header").setValue(header_info) 
-
-      self.stop()
-      self.wait_ready()
- 
-      self.set_energy_threshold(energy)
+      # the Eiger threshold and the image header are set while the
+      # previous acquisition is stopped
+      energy_task = gevent.spawn(self.set_energy_threshold, energy)
+      header_task = gevent.spawn(self.getChannelObject("set_image_header").setValue, header_info)
+      try:
+          if self.getChannelObject("acq_status").getValue() != "Ready":
+              # no need to stop and reset an idle detector, files of the
+              # previous acquisition may still be written meanwhile
+              self.stop()
+          self.wait_ready()
+      finally:
+          gevent.joinall([energy_task, header_task], raise_error=True)
 
       if gate:
-          self.getChannelObject("acq_trigger_mode").setValue("EXTERNAL_GATE")
+          trigger_mode = "EXTERNAL_GATE"
       else :
           if still:
-              self.getChannelObject("acq_trigger_mode").setValue("INTERNAL_TRIGGER")
+              trigger_mode = "INTERNAL_TRIGGER"
           else:
-              self.getChannelObject("acq_trigger_mode").setValue("EXTERNAL_TRIGGER")
-
+              trigger_mode = "EXTERNAL_TRIGGER"
 
-      self.getChannelObject("saving_frame_per_file").setValue(min(100,number_of_images))
-      self.getChannelObject("saving_mode").setValue("AUTO_FRAME")
       logging.info("Acq. nb frames = %d", number_of_images)
-      self.getChannelObject("acq_nb_frames").setValue(number_of_images)
-      self.getChannelObject("acq_expo_time").setValue(exptime)
-      self.getChannelObject("saving_overwrite_policy").setValue("OVERWRITE")
-      self.getChannelObject("saving_managed_mode").setValue("HARDWARE")
+      self.write_lima_attributes([("acq_trigger_mode", trigger_mode),
+                                  ("saving_frame_per_file", min(100,number_of_images)),
+                                  ("saving_mode", "AUTO_FRAME"),
+                                  ("acq_nb_frames", number_of_images),
+                                  ("acq_expo_time", exptime),
+                                  ("saving_overwrite_policy", "OVERWRITE"),
+                                  ("saving_managed_mode", "HARDWARE")])
 
   def set_energy_threshold(self, energy):  
       minE = self.config.getProperty("minE")
@@ -150,12 +174,12 @@ class Eiger:
 
       self.wait_ready()  
    
-      self.getChannelObject("saving_directory").setValue(saving_directory) 
-      self.getChannelObject("saving_prefix").setValue(prefix+"%01d"%frame_number)
-      self.getChannelObject("saving_suffix").setValue(suffix)
-      #self.getChannelObject("saving_next_number").setValue(frame_number)
-      #self.getChannelObject("saving_index_format").setValue("%04d")
-      self.getChannelObject("saving_format").setValue("HDF5")
+      self.write_lima_attributes([("saving_directory", saving_directory),
+                                  ("saving_prefix", prefix+"%01d"%frame_number),
+                                  ("saving_suffix", suffix),
+                                  #("saving_next_number", frame_number),
+                                  #("saving_index_format", "%04d"),
+                                  ("saving_format", "HDF5")])
 
 
   @task 
@@ -170,7 +194,11 @@ class Eiger:
           self.getCommandObject("stop_acq")()
       except:
           pass
-      time.sleep(1)
+      else:
+          try:
+              self.wait_acq_status(lambda status: status != "Running", 1)
+          except gevent.Timeout:
+              pass
       self.getCommandObject("reset")()
 
 
@@ -29,7 +29,9 @@ import os
 import autoprocessing
 
 import edna_test_data
-from XSDataMXCuBEv1_3 import XSDataInputMXCuBE, XSDataResultMXCuBE
+import XSDataLazy
+XSDataInputMXCuBE = XSDataLazy.LazyClass("XSDataInputMXCuBE")
+XSDataResultMXCuBE = XSDataLazy.LazyClass("XSDataResultMXCuBE")
 
 from copy import copy
 from queue_model_enumerables_v1 import *
@@ -73,10 +75,73 @@ class QueueEntryContainer(object):
         self._queue_entry_list = []
         self._queue_controller = None
         self._parent_container = None
+        # id(data model) -> queue entry, maintained by the top container
+        self._model_entry_index = {}
 
     def get_queue_entry_list(self):
         return self._queue_entry_list
 
+    def get_root_container(self):
+        """
+        :returns: The top QueueEntryContainer (the queue).
+        :rtype: QueueEntryContainer
+        """
+        container = self
+        while container._parent_container is not None:
+            container = container._parent_container
+        return container
+
+    def _index_entry(self, queue_entry):
+        """
+        Adds <queue_entry> and its children to the model index of
+        the top container.
+        """
+        index = self.get_root_container()._model_entry_index
+        entries = [queue_entry]
+        while entries:
+            entry = entries.pop()
+            model = entry.get_data_model()
+            if model is not None:
+                index[id(model)] = entry
+            entries.extend(entry._queue_entry_list)
+
+    def _unindex_entry(self, queue_entry):
+        """
+        Removes <queue_entry> and its children from the model index of
+        the top container.
+        """
+        index = self.get_root_container()._model_entry_index
+        entries = [queue_entry]
+        while entries:
+            entry = entries.pop()
+            model = entry.get_data_model()
+            if model is not None and index.get(id(model)) is entry:
+                del index[id(model)]
+            entries.extend(entry._queue_entry_list)
+
+    def get_indexed_entry(self, model):
+        """
+        Index lookup (no traversal) of the queue entry with the data
+        model <model>, within this container.
+
+        :param model: The model to look for.
+        :type model: TaskNode
+
+        :returns: The QueueEntry with the model <model>, None if not
+                  indexed.
+        :rtype: QueueEntry
+        """
+        entry = self.get_root_container()._model_entry_index.get(id(model))
+        if entry is None or entry.get_data_model() is not model:
+            return None
+
+        container = entry._parent_container
+        while container is not None:
+            if container is self:
+                return entry
+            container = container._parent_container
+        return None
+
     def enqueue(self, queue_entry, queue_controller=None):
         # A queue entry container has a QueueController object
         # which controls the execution of the tasks in the
@@ -89,6 +154,7 @@ class QueueEntryContainer(object):
 
         queue_entry.set_container(self)
         self._queue_entry_list.append(queue_entry)
+        self._index_entry(queue_entry)
 
     def dequeue(self, queue_entry):
         """
@@ -105,6 +171,7 @@ class QueueEntryContainer(object):
         """
         result = None
         index = None
+        self._unindex_entry(queue_entry)
         queue_entry.set_queue_controller(None)
         queue_entry.set_container(None)
 
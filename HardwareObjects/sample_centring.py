@@ -425,11 +425,28 @@ def start_auto(camera,  centring_motors_dict,
                                     msg_cb, new_point_cb)
     return CURRENT_CENTRING
 
-def find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
+def take_frame(camera):
+  """Returns the current camera frame for loop detection: a grayscale
+  numpy array if the camera provides in-memory snapshots, otherwise
+  the name of a snapshot file"""
+  get_snapshot = getattr(camera, "get_snapshot", None)
+  if callable(get_snapshot):
+    try:
+      image = get_snapshot(bw=True, return_as_array=True)
+    except Exception:
+      image = None
+    if isinstance(image, numpy.ndarray):
+      return image
+
   snapshot_filename = os.path.join(tempfile.gettempdir(), "mxcube_sample_snapshot.png")
   camera.takeSnapshot(snapshot_filename, bw=True)
-  
-  info, x, y = lucid.find_loop(snapshot_filename,IterationClosing=6)
+  return snapshot_filename
+
+def find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb, image=None):
+  if image is None:
+    image = take_frame(camera)
+
+  info, x, y = lucid.find_loop(image,IterationClosing=6)
   
   try:
     x = float(x)
@@ -444,6 +461,22 @@ def find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
         
   return x, y
 
+def find_loop_while_moving(camera, phi, angle, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb):
+  """Takes a frame, then rotates phi by angle while the frame is analysed.
+  If the loop is found phi is moved back to the angle of the frame"""
+  image = take_frame(camera)
+  move_task = gevent.spawn(phi.syncMoveRelative, angle)
+  # let the move start before analysis blocks the loop
+  gevent.sleep(0)
+  try:
+    x, y = find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb, image=image)
+  finally:
+    move_task.get()
+
+  if -1 not in (x, y):
+    phi.syncMoveRelative(-angle)
+  return x, y
+
 def auto_center(camera, 
                 phi, phiy, phiz,
                 sampx, sampy, 
@@ -482,10 +515,14 @@ def auto_center(camera,
             x, y = find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb) 
             #logging.info("in autocentre, x=%f, y=%f",x,y)
             if x < 0 or y < 0:
+              phi.syncMoveRelative(5)
               for i in range(1,18):
                 #logging.info("loop not found - moving back %d" % i)
-                phi.syncMoveRelative(5)
-                x, y = find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb)
+                if i < 17:
+                  # next 5 degrees move overlaps with analysis
+                  x, y = find_loop_while_moving(camera, phi, 5, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb)
+                else:
+                  x, y = find_loop(camera, pixelsPerMm_Hor, chi_angle, msg_cb, new_point_cb)
                 if -1 in (x, y):
                     continue
                 if x >=0:
@@ -17,6 +17,7 @@ from .Component import *
 from HardwareRepository.TaskUtils import *
 
 import gevent
+import gevent.event
 import PyTango
 import logging
 import traceback
@@ -102,6 +103,7 @@ class Cats90(SampleChanger):
         super(Cats90, self).__init__(self.__TYPE__,False, *args, **kwargs)
         self.cats_api = cats()
         self.logger = logging.getLogger('HWR')
+        self._cats_changed_event = gevent.event.Event()
         
     def init(self):      
         self._selected_sample = None
@@ -248,6 +250,23 @@ class Cats90(SampleChanger):
                 channel.connectSignal("update", lambda value, \
                      this=self,idx=basket_index:Cats90.cats_basket_presence_changed(this,idx,value))
 
+            # the handlers above record the new values, the state, loaded
+            # sample and contents are updated once for a burst of events,
+            # in a greenlet emitting infoChanged and loadedSampleChanged
+            # (see _runUpdate). Tasks run the pending updates first
+            # (see _runPendingUpdatesNow), so that load and unload do not
+            # see the state or loaded sample of before the last events
+            for channel in (self._chnState,
+                            self._chnPathRunning,
+                            self._chnPowered,
+                            self._chnTotalLidState):
+                self._connectUpdateChannel(channel, self._updateState)
+            for channel in (self._chnLidLoadedSample,
+                            self._chnNumLoadedSample):
+                self._connectUpdateChannel(channel, self._updateLoadedSample)
+            for channel in self.basket_channels:
+                self._connectUpdateChannel(channel, self._updateCatsContents)
+
         self.updateInfo()
 
     def getSampleProperties(self):
@@ -740,7 +759,7 @@ class Cats90(SampleChanger):
 
     def cats_state_changed(self, value):
         self.cats_state = value
-        self._updateState()
+        self._catsChanged()
 
     def cats_status_changed(self, value):
         self.cats_status = value
@@ -748,43 +767,62 @@ class Cats90(SampleChanger):
 
     def cats_pathrunning_changed(self, value):
         self.cats_running = value
-        self._updateState()
+        self._catsChanged()
         self.emit('runningStateChanged', (value, ))
 
     def cats_powered_changed(self, value):
         self.cats_powered = value
-        self._updateState()
+        self._catsChanged()
         self.emit('powerStateChanged', (value, ))
 
+    def _catsChanged(self):
+        """
+        Wakes up the greenlets waiting for a change of the CATS state
+        """
+        cats_changed_event = self._cats_changed_event
+        self._cats_changed_event = gevent.event.Event()
+        cats_changed_event.set()
+
+    def _waitCatsCondition(self, condition, timeout=None, poll_period=0.5):
+        """
+        Waits until condition() is True. The condition is evaluated when
+        the state, power or path running channels change, and every
+        poll_period seconds in case an event is missed.
+
+        :returns: True, or False on timeout
+        :rtype: Bool
+        """
+        with gevent.Timeout(timeout, False):
+            while not condition():
+                self._cats_changed_event.wait(poll_period)
+            return True
+        return False
+
     def cats_lids_closed_changed(self, value):
         self.logger.warning("Operation mode changed. All LIDs closed" + str(value))
         self.cats_lids_closed = value
-        self._updateState()
     
     def cats_baskets_changed(self,value):
-        self._updateCatsContents()
+        self._requestUpdate(self._updateCatsContents)
         
     def cats_basket_presence_changed(self,basket_index,value):
         self.basket_presence[basket_index] = value
-        self._updateCatsContents()
 
     def cats_loaded_lid_changed(self,value):
         self.logger.info("loaded lid changed %s" % value)
         self.cats_loaded_lid = value
         self.cats_loaded_num = self._chnNumLoadedSample.getValue()
         self.cats_datamatrix = str(self._chnSampleBarcode.getValue())
-        self._updateLoadedSample() 
 
     def cats_loaded_num_changed(self, value):
         self.logger.info("loaded num changed %s" % value)
         self.cats_loaded_lid = self._chnLidLoadedSample.getValue()
         self.cats_loaded_num = value
         self.cats_datamatrix = str(self._chnSampleBarcode.getValue())
-        self._updateLoadedSample() 
 
     def cats_barcode_changed(self, value):
         self.cats_datamatrix = value
-        self._updateLoadedSample() 
+        self._requestUpdate(self._updateLoadedSample)
 
     def cats_sample_on_diffr(self):
         return self._chnSampleIsDetected.getValue()
@@ -803,14 +841,12 @@ class Cats90(SampleChanger):
         print "Cats90._executeServerTask", task_id
         ret=None
         if task_id is None: #Reset
-            while self._isDeviceBusy():
-                gevent.sleep(0.1)
+            self._waitCatsCondition(lambda: not self._isDeviceBusy())
         else:
-            # introduced wait because it takes some time before the attribute PathRunning is set
-            # after launching a transfer
-            gevent.sleep(2.0)
-            while str(self._chnPathRunning.getValue()).lower() == 'true': 
-                gevent.sleep(0.1)            
+            # it takes some time before the attribute PathRunning is set
+            # after launching a transfer, wait for it (2 s at most)
+            self._waitCatsCondition(self._isPathRunning, 2.0, 0.1)
+            self._waitCatsCondition(lambda: not self._isPathRunning())
             ret = True
         return ret
 
@@ -887,6 +923,9 @@ class Cats90(SampleChanger):
 
         return state_converter.get(stateStr, SampleChangerState.Unknown)
                         
+    def _isPathRunning(self):
+        return str(self._chnPathRunning.getValue()).lower() == 'true'
+
     def _isDeviceBusy(self, state=None):
         """
         Checks whether Sample changer HO is busy.
@@ -916,9 +955,8 @@ class Cats90(SampleChanger):
         :returns: None
         :rtype: None
         """
-        with gevent.Timeout(timeout, Exception("Timeout waiting for device ready")):
-            while not self._isDeviceReady():
-                gevent.sleep(0.01)
+        if not self._waitCatsCondition(self._isDeviceReady, timeout, 0.1):
+            raise Exception("Timeout waiting for device ready")
             
     def _doUpdateLoadedSample(self):
         """
@@ -947,7 +985,6 @@ class Cats90(SampleChanger):
         else:
             basket = None
             samplePos = None
-            self._resetLoadedSample()
             
         if basket is not None and samplePos is not None:
             new_sample = self.getComponentByAddress(Pin.getSampleAddress(basket, samplePos))
@@ -969,8 +1006,9 @@ class Cats90(SampleChanger):
                 has_been_loaded = True
                 new_sample._setLoaded(loaded, has_been_loaded)
         
-        self._setLoadedSample(new_sample)
-        self._triggerLoadedSampleChangedEvent(new_sample)
+        # same as _setLoadedSample, loadedSampleChanged is emitted by _runUpdate
+        for sample in self.getSampleList():
+            sample._setLoaded(sample == new_sample)
         #if new_sample is not None:
         self.logger.info("update loaded sample: %s (%s/%s)" % (new_sample, self.cats_loaded_lid, self.cats_loaded_num))
         self._updateSampleBarcode(new_sample)
@@ -1056,7 +1094,6 @@ class Cats90(SampleChanger):
            
     def _updateCatsContents(self):
         
-        info_changed = False
         for basket_index in range(self.no_of_baskets):            
             # get saved presence information from object's internal bookkeeping
             basket=self.getComponents()[basket_index]
@@ -1071,14 +1108,12 @@ class Cats90(SampleChanger):
                     scanned = False
                     datamatrix = None
                     basket._setInfo(present, datamatrix, scanned)
-                    info_changed = True
                 else:
                     # basket was removed
                     present = False
                     scanned = False
                     datamatrix = None
                     basket._setInfo(present, datamatrix, scanned)
-                    info_changed = True
                     
                 # set the information for all dependent samples
                 for sample_index in range(basket.getNumberOfSamples()):
@@ -1095,8 +1130,7 @@ class Cats90(SampleChanger):
                     loaded = has_been_loaded = False
                     sample._setLoaded(loaded, has_been_loaded)
 
-        if info_changed:
-            self._triggerInfoChangedEvent()
+        # infoChanged is emitted by _runUpdate (the changes set the dirty flag)
             
     def _updateStatus(self, value):
         self.emit('statusChanged', (value, ))
@@ -127,7 +127,9 @@ class Component(object):
         """        
         changed=False
         if self.id!=None:
+            former_id=self.id
             self.id=None
+            self._idChanged(former_id)
             changed=True  
         if self.present:
             self.present=False
@@ -141,7 +143,9 @@ class Component(object):
     def _setInfo(self, present=False, id=None, scanned = False):
         changed=False
         if self.id!=id:
+            former_id=self.id
             self.id=id
+            self._idChanged(former_id)
             changed=True      
         if self.id:
             present=True
@@ -164,6 +168,15 @@ class Component(object):
         self.selected=selected
         
         
+    def _idChanged(self, former_id):
+        """
+        Updates the ID indexes of the containers
+        """
+        container=self.getContainer()
+        while container is not None:
+            container._reindexComponentId(self, former_id)
+            container=container.getContainer()
+        
     def _isDirty(self):
         return self.dirty
         
@@ -3,12 +3,21 @@ from Sample import  *
 class Container(Component):
     """
     Entity class holding state of any any hierarchical sample container
+
+    Components of the whole tree under a container are indexed by address
+    and by ID (the scanned barcode), the indexes are updated when
+    components are added or removed and when their ID changes.
+    Sample lists are cached until a component of the tree is changed
+    (set dirty), added or removed.
     """
     
     def __init__(self,type,container, address, scannable):
         super(Container, self).__init__(container, address, scannable)
         self.type = type
         self.components = []     
+        self._address_index = {}
+        self._id_index = {}
+        self._invalidateSamples()
     
     
     #########################           PUBLIC           #########################
@@ -43,13 +52,15 @@ class Container(Component):
         Returns the list of all Sample objects under of this container (recursivelly)
         :rtype: list 
         """        
-        samples=[]
-        for c in self.getComponents():
-            if isinstance(c,Sample):
-                samples.append(c)
-            else:
-                samples.extend(c.getSampleList())
-        return samples
+        if self._sample_list is None:
+            samples=[]
+            for c in self.getComponents():
+                if isinstance(c,Sample):
+                    samples.append(c)
+                else:
+                    samples.extend(c.getSampleList())
+            self._sample_list = samples
+        return list(self._sample_list)
 
     def getBasketList(self):
         basket_list = []
@@ -63,34 +74,44 @@ class Container(Component):
         Returns the list of all Sample objects under of this container (recursivelly) tagged as present
         :rtype: list 
         """        
-        ret = []
-        for sample in self.getSampleList():
-            if sample.isPresent():
-                ret.append(sample)
+        if self._present_samples is None:
+            self._present_samples = [sample for sample in self.getSampleList() if sample.isPresent()]
+        return list(self._present_samples)
+
+    def getSamplesByBasket(self, present_only=False):
+        """
+        Returns a dictionary {basket address: list of samples} for the
+        baskets of this container
+        :rtype: dict
+        """
+        if self._samples_by_basket.get(present_only) is None:
+            samples_by_basket = {}
+            for basket in self.getBasketList():
+                if present_only:
+                    samples_by_basket[basket.getAddress()] = basket.getPresentSamples()
+                else:
+                    samples_by_basket[basket.getAddress()] = basket.getSampleList()
+            self._samples_by_basket[present_only] = samples_by_basket
+        return dict([(address, list(samples)) for address, samples in \
+                     self._samples_by_basket[present_only].items()])
 
     def isEmpty(self):
         """
         Returns true if there is no sample present sample under this container
         :rtype: bool 
         """        
-        for s in self.getSampleList():
-            if s.isPresent():
-                return False
-        return True
+        return len(self.getPresentSamples()) == 0
 
     def getComponentByAddress(self, address):
         """
         Returns a component through its slot address or None if address is invalid
         :rtype: Component 
         """        
-        for c in self.getComponents():
-            if c.getAddress() == address:
-                return c            
-            if isinstance(c,Container):
-                aux=c.getComponentByAddress(address)
-                if aux is not None:
-                    return aux
-        return None
+        try:
+            return self._address_index.get(address)
+        except TypeError:
+            # unhashable address
+            return None
 
     def hasComponentAddress(self, address):
         """
@@ -104,6 +125,11 @@ class Container(Component):
         Returns a component through its id or None if id is invalid
         :rtype: Component 
         """        
+        if id is not None:
+            components = self._id_index.get(id)
+            if components:
+                return components[0]
+            return None
         for c in self.getComponents():
             if c.getID() == id:
                 return c            
@@ -142,12 +168,72 @@ class Container(Component):
     
     def _addComponent(self, c):
         self.components.append(c)
+        container = self
+        while container is not None:
+            container._indexComponents(c)
+            container = container.getContainer()
 
     def _removeComponent(self, c):
         self.components.remove(c)
+        container = self
+        while container is not None:
+            container._unindexComponents(c)
+            container = container.getContainer()
 
     def _clearComponents(self):
-        self.components = []     
+        for c in list(self.components):
+            self._removeComponent(c)
+
+    def _iterTree(self, c):
+        yield c
+        if isinstance(c, Container):
+            for component in c.getComponents():
+                for aux in self._iterTree(component):
+                    yield aux
+
+    def _indexComponents(self, c):
+        """
+        Adds c and its components to the indexes
+        """
+        for component in self._iterTree(c):
+            self._address_index.setdefault(component.getAddress(), component)
+            if component.getID() is not None:
+                self._id_index.setdefault(component.getID(), []).append(component)
+        self._invalidateSamples()
+
+    def _unindexComponents(self, c):
+        """
+        Removes c and its components from the indexes
+        """
+        for component in self._iterTree(c):
+            if self._address_index.get(component.getAddress()) is component:
+                del self._address_index[component.getAddress()]
+            self._removeFromIdIndex(component, component.getID())
+        self._invalidateSamples()
+
+    def _removeFromIdIndex(self, component, id):
+        components = self._id_index.get(id)
+        if components is not None and component in components:
+            components.remove(component)
+            if not components:
+                del self._id_index[id]
+
+    def _reindexComponentId(self, component, former_id):
+        if self._address_index.get(component.getAddress()) is not component:
+            # not in the tree (yet)
+            return
+        self._removeFromIdIndex(component, former_id)
+        if component.getID() is not None:
+            self._id_index.setdefault(component.getID(), []).append(component)
+
+    def _invalidateSamples(self):
+        self._sample_list = None
+        self._present_samples = None
+        self._samples_by_basket = {}
+
+    def _setDirty(self):
+        self._invalidateSamples()
+        Component._setDirty(self)
 
     def _resetDirty(self):
         Component._resetDirty(self)
@@ -116,6 +116,19 @@ Tools for SC Classes
    Include a line like `<useUpdateTimer>True</useUpdateTimer`
    in the xml file
 
+- updateInterval, maxUpdateInterval (xml properties):
+   Polling period in seconds (default 0.5 and 5). The period is the
+   shortest one while a task is executed or something changes, and
+   doubles up to maxUpdateInterval while the sample changer is idle.
+
+- _connectUpdateChannel(channel, update_method):
+   Derived classes can connect channels (Tango, Exporter...) so that a
+   change of the channel value runs update_method (for instance the
+   update of the affected component only) instead of waiting for the
+   next polling ; events arriving together are coalesced in one update.
+   Polling then only is a fallback, running at maxUpdateInterval when
+   idle.
+
 
 
 --------------------------------------------
@@ -134,6 +147,7 @@ import abc
 import logging
 import time
 import gevent
+import gevent.event
 import types
 
 class SampleChangerState:
@@ -190,6 +204,16 @@ class SampleChangerMode:
     Disabled    = 11
 
 
+class _UpdateRequest:
+    """Channel update callback requesting a sample changer update"""
+    def __init__(self, sample_changer, update_method):
+        self.sample_changer = sample_changer
+        self.update_method = update_method
+
+    def __call__(self, *args):
+        self.sample_changer._requestUpdate(self.update_method)
+
+
 class SampleChanger(Container,Equipment):
     """
     Abstract base class for sample changers
@@ -210,6 +234,14 @@ class SampleChanger(Container,Equipment):
         if len(args)==0:
             args=(type,)
         Equipment.__init__(self,*args, **kwargs)
+        self._update_interval_min = 0.5
+        self._update_interval_max = 5.0
+        self._update_interval = self._update_interval_min
+        self._update_requests = []
+        self._pending_updates = []
+        self._update_greenlet = None
+        self._update_interval_reset = gevent.event.Event()
+        self._state_changed_event = gevent.event.Event()
         self.state=-1
         self.status=""
         self._setState(SampleChangerState.Unknown)
@@ -218,8 +250,6 @@ class SampleChanger(Container,Equipment):
         self.task_error=None
         self._transient=False
         self._token=None
-        self._timer_update_inverval = 5 # defines the interval in periods of 100 ms
-        self._timer_update_counter = 0            
 
     def init(self):
         use_update_timer = self.getProperty("useUpdateTimer")
@@ -227,11 +257,19 @@ class SampleChanger(Container,Equipment):
         if use_update_timer is None:
             use_update_timer = True
 
+        self._update_interval_min = float(self.getProperty("updateInterval",
+                                                           self._update_interval_min))
+        self._update_interval_max = max(self._update_interval_min,
+                                        float(self.getProperty("maxUpdateInterval",
+                                                               self._update_interval_max)))
+        self._update_interval = self._update_interval_min
+
         logging.getLogger("HWR").info("SampleChanger: Using update timer is %s " % use_update_timer)
 
         if use_update_timer:
-            task1s=self.__timer_1s_task(wait=False)
-            task1s.link(self._onTimer1sExit)
+            if self._onTimer1s.im_func is not SampleChanger._onTimer1s.im_func:
+                task1s=self.__timer_1s_task(wait=False)
+                task1s.link(self._onTimer1sExit)
             updateTask=self.__update_timer_task(wait=False)
             updateTask.link(self._onTimerUpdateExit)
 
@@ -259,19 +297,43 @@ class SampleChanger(Container,Equipment):
     @task
     def __update_timer_task(self, *args):
         while(True):
-            gevent.sleep(0.1)
+            # woken up early when the interval is reset to its minimum
+            self._update_interval_reset.wait(self._update_interval)
+            self._update_interval_reset.clear()
             try:
                 if self.isEnabled():
-                    self._timer_update_counter += 1
-                    if (self._timer_update_counter >= self._timer_update_counter):
-                        self._onTimerUpdate()
-                        self._timer_update_counter = 0
+                    self._onTimerUpdate()
             except:
                 pass                
 
 #########################           TIMER           #########################
     def _setTimerUpdateInterval(self,value):
-        self._timer_update_inverval=value
+        """
+        Sets the shortest polling period, in periods of 100 ms
+        """
+        self._update_interval_min = value * 0.1
+        self._update_interval_max = max(self._update_interval_min,
+                                        self._update_interval_max)
+        self._resetUpdateInterval()
+
+    def _resetUpdateInterval(self):
+        """
+        Polls at the shortest period, starting now
+        """
+        if self._update_interval != self._update_interval_min:
+            self._update_interval = self._update_interval_min
+            self._update_interval_reset.set()
+
+    def _adaptUpdateInterval(self, changed):
+        """
+        Polling is fast while something changes or a task is running,
+        and slows down while the sample changer is idle
+        """
+        if changed or self.isExecutingTask() or not self.isTaskFinished():
+            self._resetUpdateInterval()
+        else:
+            self._update_interval = min(self._update_interval * 2,
+                                        self._update_interval_max)
     
     def _onTimerUpdate(self):        
         #if not self.isExecutingTask():
@@ -317,12 +379,18 @@ class SampleChanger(Container,Equipment):
         return  self.state==SampleChangerState.Ready or self.state==SampleChangerState.Loaded or self.state==SampleChangerState.Charging or self.state==SampleChangerState.StandBy
     
     def waitReady(self,timeout=-1):
-        start=time.clock()
-        while not self.isReady():
-            if timeout>0:
-                if (time.clock() - start) > timeout:
-                    raise Exception("Timeout waiting ready")
-            gevent.sleep(0.01)
+        self._waitStateCondition(self.isReady, timeout, "Timeout waiting ready")
+
+    def _waitStateCondition(self, condition, timeout, timeout_message):
+        """
+        Waits until condition() is True, evaluated when the state changes
+        (and at least once per second)
+        """
+        if timeout is not None and timeout <= 0:
+            timeout = None
+        with gevent.Timeout(timeout, Exception(timeout_message)):
+            while not condition():
+                self._state_changed_event.wait(1.0)
         
 
     def isNormalState(self):
@@ -365,12 +433,7 @@ class SampleChanger(Container,Equipment):
         return self.task!=None
 
     def waitTaskFinished(self,timeout=-1):
-        start=time.clock()
-        while not self.isTaskFinished():
-            if timeout>0:
-                if (time.clock() - start) > timeout:
-                    raise Exception("Timeout waiting end of task")
-            gevent.sleep(0.01)
+        self._waitStateCondition(self.isTaskFinished, timeout, "Timeout waiting end of task")
         
     def getLoadedSample(self):
         """
@@ -414,17 +477,71 @@ class SampleChanger(Container,Equipment):
     def updateInfo(self):
         """
         """
+        self._runUpdate(self._doUpdateInfo)
+
+    def _runUpdate(self, *update_methods):
+        former_state = self.state
         former_loaded = self.getLoadedSample()
-        self._doUpdateInfo()        
+        for update_method in update_methods:
+            update_method()
+        changed = self._isDirty() or self.state != former_state
         if self._isDirty():
             self._triggerInfoChangedEvent()
         
         loaded=self.getLoadedSample()
         if loaded != former_loaded:
+            changed = True
             if (loaded is None) or (former_loaded is None) or (loaded.getAddress()!=former_loaded.getAddress()):
                 self._triggerLoadedSampleChangedEvent(loaded)
                 
         self._resetDirty()                    
+        self._adaptUpdateInterval(changed)
+
+    def _connectUpdateChannel(self, channel, update_method=None):
+        """
+        Runs update_method (default: _doUpdateInfo) when the value of
+        channel changes
+        """
+        if channel is None:
+            return
+        request = _UpdateRequest(self, update_method or self._doUpdateInfo)
+        # channels keep weak references to their callbacks
+        self._update_requests.append(request)
+        channel.connectSignal("update", request)
+
+    def _requestUpdate(self, update_method=None):
+        """
+        Schedules update_method (default: _doUpdateInfo). Requests
+        received before the update starts are run together, once each
+        """
+        if update_method is None:
+            update_method = self._doUpdateInfo
+        if update_method not in self._pending_updates:
+            self._pending_updates.append(update_method)
+        if self._update_greenlet is None:
+            self._update_greenlet = gevent.spawn(self._runPendingUpdates)
+
+    def _runPendingUpdates(self):
+        try:
+            while self._pending_updates:
+                update_methods = self._pending_updates
+                self._pending_updates = []
+                try:
+                    self._runUpdate(*update_methods)
+                except:
+                    logging.getLogger("HWR").exception("SampleChanger: error while updating")
+        finally:
+            self._update_greenlet = None
+
+    def _runPendingUpdatesNow(self):
+        """
+        Runs the requested updates without waiting for the update
+        greenlet: the tasks check the state and the loaded sample
+        """
+        if self._pending_updates:
+            update_methods = self._pending_updates
+            self._pending_updates = []
+            self._runUpdate(*update_methods)
     
     def isTransient(self):
         return self._transient      
@@ -492,6 +609,7 @@ class SampleChanger(Container,Equipment):
         Load a sample. 
         """    
         sample = self._resolveComponent(sample)
+        self._runPendingUpdatesNow()
         self.assertNotCharging()
         #Do a chained load in this case
         if self.hasLoadedSample():    
@@ -508,6 +626,7 @@ class SampleChanger(Container,Equipment):
         If sample_slot=None, unloads to the same slot the sample was loaded from.        
         """
         sample_slot = self._resolveComponent(sample_slot)
+        self._runPendingUpdatesNow()
         self.assertNotCharging()
         #In case we have manually mounted we can command an unmount
         if not self.hasLoadedSample():
@@ -575,6 +694,7 @@ class SampleChanger(Container,Equipment):
     #########################           PROTECTED           #########################    
 
     def _executeTask(self,task,wait,method,*args):        
+        self._runPendingUpdatesNow()
         self.assertCanExecuteTask()
         logging.debug("Start "+ SampleChangerState.tostring(task))
         self.task=task
@@ -634,6 +754,11 @@ class SampleChanger(Container,Equipment):
             self.state=state
             if status is None:
                 status=SampleChangerState.tostring(state)
+            self._resetUpdateInterval()
+            # wake up the greenlets waiting for a state change
+            state_changed_event = self._state_changed_event
+            self._state_changed_event = gevent.event.Event()
+            state_changed_event.set()
             self._triggerStateChangedEvent(former)
         
         if (status is not None) and (self.status!=status):
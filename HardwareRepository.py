@@ -11,12 +11,17 @@ __version__ = 1.3
 
 import logging
 import gevent
+import gevent.event
 import weakref
 import types
 import sys
 import os
 import stat
 import time
+import ImportProfiler
+if os.environ.get("HWR_PROFILE_IMPORTS"):
+    ImportProfiler.enable()
+
 import gevent.monkey
 gevent.monkey.patch_all(thread=False)
 
@@ -84,7 +89,11 @@ class __HardwareRepositoryClient:
         """
         self.serverAddress = serverAddress
         self.requiredHardwareObjects = {}
+        self.preloadedHardwareObjects = {}
         self.xml_source={}
+        self.loadingTimes = {}
+        self.__loading = {}
+        self.__waitingFor = {}
         self.__connected = False
         self.server = None
         
@@ -135,32 +144,38 @@ class __HardwareRepositoryClient:
 
 
     def require(self, mnemonicsList):
-        """Download a list of Hardware Objects in one go"""
+        """Download a list of Hardware Objects in one go, and load them
+        concurrently (see loadHardwareObjects)"""
         self.requiredHardwareObjects = {}
        
-        if not self.server:  
-            return 
- 
+        if self.server:  
+            try:
+                t0=time.time()
+                mnemonics = ",".join([repr(mne) for mne in mnemonicsList])
+                if len(mnemonics) > 0:
+                    self.requiredHardwareObjects = SpecWaitObject.waitReply(self.server, 'send_msg_cmd_with_return' , ('xml_getall(%s)' % mnemonics, ), timeout = 3)
+                    logging.getLogger("HWR").debug("Getting %s hardware objects took %s ms." % (len(self.requiredHardwareObjects), (time.time()-t0)*1000))
+            except SpecClientError.SpecClientTimeoutError:
+                logging.getLogger('HWR').error("Timeout loading Hardware Objects")
+            except:
+                logging.getLogger('HWR').exception("Could not execute 'require' on Hardware Repository server")
+
         try:
-            t0=time.time()
-            mnemonics = ",".join([repr(mne) for mne in mnemonicsList])
-            if len(mnemonics) > 0:
-                self.requiredHardwareObjects = SpecWaitObject.waitReply(self.server, 'send_msg_cmd_with_return' , ('xml_getall(%s)' % mnemonics, ), timeout = 3)
-                logging.getLogger("HWR").debug("Getting %s hardware objects took %s ms." % (len(self.requiredHardwareObjects), (time.time()-t0)*1000))
-        except SpecClientError.SpecClientTimeoutError:
-            logging.getLogger('HWR').error("Timeout loading Hardware Objects")
+            # hardwareObjects only keeps weak references: the preloaded
+            # objects are kept until the next require
+            self.preloadedHardwareObjects = self.loadHardwareObjects(mnemonicsList)
         except:
-            logging.getLogger('HWR').exception("Could not execute 'require' on Hardware Repository server")
+            logging.getLogger('HWR').exception("Could not load the required Hardware Objects")
 
                 
-    def loadHardwareObject(self, hoName):               
-        """Load a Hardware Object
-        
+    def readXML(self, hoName):
+        """Read the XML description of a Hardware Object
+
         Parameters :
-          hoName -- string name of the Hardware Object to load, for example '/motors/m0'
+          hoName -- string name of the Hardware Object, for example '/motors/m0'
 
         Return :
-          the loaded Hardware Object, or None if it fails
+          the XML string ('' if the file does not exist), or None if it fails
         """
         if self.server:
           if self.server.isSpecConnected():
@@ -180,25 +195,97 @@ class __HardwareRepositoryClient:
                 except KeyError:
                   logging.getLogger("HWR").error("Cannot load Hardware Object %s: file does not exist.", hoName)
                   return
+                else:
+                  return xmldata
           else:
             logging.getLogger('HWR').error('Cannot load Hardware Object "%s" : not connected to server.', hoName)
         else:
             xmldata = ""
-            for xml_files_path in self.serverAddress:
-               file_name = hoName[1:] if hoName.startswith(os.path.sep) else hoName
-               file_path = os.path.join(xml_files_path, file_name)+os.path.extsep+"xml"
-               if os.path.exists(file_path):
+            file_path = self.getXMLFilePath(hoName)
+            if file_path is not None:
                  try:
                    xmldata = open(file_path, "r").read()
                  except:
                    pass
-                 break 
+            return xmldata
+
+
+    def getXMLFilePath(self, hoName):
+        """Return the path of the XML file of a Hardware Object, None if
+        the file does not exist or if the server is in use"""
+        if self.server:
+            return None
+
+        for xml_files_path in self.serverAddress:
+           file_name = hoName[1:] if hoName.startswith(os.path.sep) else hoName
+           file_path = os.path.join(xml_files_path, file_name)+os.path.extsep+"xml"
+           if os.path.exists(file_path):
+             return file_path
+
+
+    def __isWaitingFor(self, greenlet, waiter):
+        """Return True if greenlet is (indirectly) waiting for waiter"""
+        visited = set()
+        while greenlet is not None and not greenlet in visited:
+            if greenlet is waiter:
+                return True
+            visited.add(greenlet)
+            name = self.__waitingFor.get(greenlet)
+            if name is None:
+                return False
+            greenlet = self.__loading.get(name, (None, None))[0]
+        return False
+
+
+    def loadHardwareObject(self, hoName):               
+        """Load a Hardware Object
+
+        If the object is already being loaded by another greenlet, wait
+        for it to be loaded instead of loading it twice.
+
+        Parameters :
+          hoName -- string name of the Hardware Object to load, for example '/motors/m0'
+
+        Return :
+          the loaded Hardware Object, or None if it fails
+        """
+        current = gevent.getcurrent()
+        loading = self.__loading.get(hoName)
+        if loading is not None and not self.__isWaitingFor(loading[0], current):
+            self.__waitingFor[current] = hoName
+            try:
+                return loading[1].get()
+            finally:
+                del self.__waitingFor[current]
+
+        result = gevent.event.AsyncResult()
+        self.__loading[hoName] = (current, result)
+        ho = None
+        try:
+            ho = self.__loadHardwareObject(hoName)
+        finally:
+            result.set(ho)
+            if loading is None:
+                del self.__loading[hoName]
+            else:
+                # recursive load of the same object
+                self.__loading[hoName] = loading
+        return ho
+
 
-        if True:
+    def __loadHardwareObject(self, hoName):
+        times = {}
+        t0 = time.time()
+        xmldata = self.readXML(hoName)
+        times["read"] = time.time() - t0
+
+        if xmldata is not None:
                 if len(xmldata) > 0:
                     try:
                         #t0 = time.time()
-                        ho = self.parseXML(xmldata, hoName)
+                        t0 = time.time()
+                        ho = self.parseXML(xmldata, hoName, self.getXMLFilePath(hoName))
+                        times["parse"] = time.time() - t0
                         if type(ho) == str:
                             return self.loadHardwareObject(ho)  
                     except:
@@ -212,8 +299,11 @@ class __HardwareRepositoryClient:
                                 logging.getLogger("HWR").debug("%s Hardware Object has been deleted from Hardware Repository", name)
                                 del self.hardwareObjects[name]
 
+                            t0 = time.time()
                             ho.resolveReferences()
+                            times["references"] = time.time() - t0
 
+                            t0 = time.time()
                             try:
                                 def addChannelsAndCommands(node):
                                   #import pdb; pdb.set_trace()
@@ -224,7 +314,9 @@ class __HardwareRepositoryClient:
                                 addChannelsAndCommands(ho) 
                             except:
                                 logging.getLogger('HWR').exception("Error while adding commands and/or channels to Hardware Object %s", hoName)
+                            times["channels"] = time.time() - t0
 
+                            t0 = time.time()
                             try:
                                 ho._init()
                                 ho.init()
@@ -239,6 +331,9 @@ class __HardwareRepositoryClient:
                                     self.invalidHardwareObjects.remove(ho.name())
 
                                 self.hardwareObjects[ho.name()] = ho
+                            finally:
+                                times["init"] = time.time() - t0
+                                self.loadingTimes[hoName] = times
 
                             return ho
                         else:
@@ -246,6 +341,119 @@ class __HardwareRepositoryClient:
                 else:
                     logging.getLogger('HWR').error('Cannot load Hardware Object "%s" : file not found.', hoName)   
 
+
+    def getHardwareObjectsNames(self):
+        """Return the names of all Hardware Objects in the XML files
+        directories (local files only)"""
+        names = []
+
+        if self.server:
+            logging.getLogger('HWR').error("Cannot list Hardware Objects - server is in use")
+            return names
+
+        for xml_files_path in self.serverAddress:
+            for dirpath, dirnames, filenames in os.walk(xml_files_path):
+                for filename in filenames:
+                    if filename.endswith(os.path.extsep+"xml"):
+                        name = os.path.join(dirpath, filename)[len(xml_files_path):-4]
+                        name = "/" + name.lstrip(os.path.sep).replace(os.path.sep, "/")
+                        if not name in names:
+                            names.append(name)
+        return names
+
+
+    def loadHardwareObjects(self, hoNames=None):
+        """Load several Hardware Objects concurrently
+
+        The references between Hardware Objects are read from the XML
+        files first. Each object is then loaded in its own greenlet,
+        after the objects it refers to (so getObjectByRole works in
+        init()) ; independent objects are initialized concurrently.
+
+        Parameters :
+          hoNames -- list of Hardware Objects names, all the Hardware
+                     Objects of the repository if None
+
+        Return :
+          a dictionary {name: Hardware Object or None}
+        """
+        if hoNames is None:
+            hoNames = self.getHardwareObjectsNames()
+        hoNames = [name.startswith("/") and name or "/"+name for name in hoNames]
+
+        t0 = time.time()
+        references = {}
+        to_read = list(hoNames)
+        while to_read:
+            name = to_read.pop()
+            if name in references:
+                continue
+            references[name] = []
+
+            xmldata = self.readXML(name)
+            if xmldata:
+                try:
+                    references[name] = HardwareObjectFileParser.getReferences(xmldata, name)
+                except:
+                    logging.getLogger("HWR").exception("Cannot parse XML file for Hardware Object %s", name)
+            to_read.extend(references[name])
+
+        # references going back to an object being visited would make a
+        # cycle: they are ignored for scheduling
+        dependencies = {}
+        def visit(name, visiting):
+            if name in dependencies:
+                return
+            visiting.add(name)
+            dependencies[name] = []
+            for reference in references.get(name, []):
+                if not reference in visiting:
+                    visit(reference, visiting)
+                    dependencies[name].append(reference)
+            visiting.remove(name)
+        for name in references:
+            visit(name, set())
+
+        tasks = {}
+        def load(name):
+            gevent.joinall([tasks[reference] for reference in dependencies[name]])
+            return self.getHardwareObject(name)
+
+        for name in references:
+            tasks[name] = gevent.spawn(load, name)
+        gevent.joinall(list(tasks.values()))
+
+        logging.getLogger("HWR").debug("Loading %d Hardware Objects took %s ms.", len(tasks), (time.time()-t0)*1000)
+        self.logLoadingReport()
+
+        return dict([(name, tasks[name].value) for name in hoNames])
+
+
+    def getLoadingReport(self):
+        """Return per Hardware Object loading times
+
+        Return :
+          a list of (name, times dictionary) tuples, sorted by decreasing
+          initialization time (adding channels and commands, and init()).
+          Times are in seconds ; 'references' includes the loading of
+          the referenced objects.
+        """
+        report = list(self.loadingTimes.items())
+        report.sort(key=lambda item: item[1].get("channels", 0) + item[1].get("init", 0), reverse=True)
+        return report
+
+
+    def logLoadingReport(self):
+        """Log the loading times of all Hardware Objects"""
+        log = logging.getLogger("HWR")
+        log.debug("%-40s %10s %10s %10s %10s %10s", "Hardware Object", "read (ms)", "parse", "references", "channels", "init")
+        for name, times in self.getLoadingReport():
+            log.debug("%-40s %10.1f %10.1f %10.1f %10.1f %10.1f", name,
+                      *[times.get(key, 0)*1000 for key in ("read", "parse", "references", "channels", "init")])
+        if ImportProfiler.is_enabled():
+            # modules are imported while parsing the XML files
+            ImportProfiler.log_report()
+
    
     def discardHardwareObject(self, hoName):
         """Remove a Hardware Object from the Hardware Repository
@@ -272,18 +480,19 @@ class __HardwareRepositoryClient:
         dispatcher.send('hardwareObjectDiscarded', hoName, self)
             
         
-    def parseXML(self, XMLString, hoName):
+    def parseXML(self, XMLString, hoName, filename=None):
         """Load a Hardware Object from its XML string representation
 
         Parameters :
           XMLString -- the XML string
           hoName -- the name of the Hardware Object to load (i.e. '/motors/m0')
+          filename -- the XML file, to use the parsed XML cache (optional)
 
         Return :
           the Hardware Object, or None if it fails
         """
         try:
-            ho = HardwareObjectFileParser.parseString(XMLString, hoName)
+            ho = HardwareObjectFileParser.parseString(XMLString, hoName, filename)
         except:
             logging.getLogger('HWR').exception('Cannot parse Hardware Repository file %s', hoName)
         else:
@@ -0,0 +1,122 @@
+"""Import time profiling
+
+While the profiler is enabled, the time spent importing each module is
+recorded : 'total' includes the modules imported by the module, 'self'
+does not. Imports of modules already loaded are not recorded.
+Times are wall-clock times (a greenlet switch during an import is
+counted in the importing module).
+
+The Hardware Repository enables the profiler if $HWR_PROFILE_IMPORTS is
+set, the report is logged with the Hardware Objects loading report.
+
+Command line usage :
+  python ImportProfiler.py [-p path] [-l limit] module [...]
+"""
+
+import os
+import sys
+import time
+import logging
+import optparse
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+_original_import = None
+_stack = []
+_times = {}
+
+
+def _profiled_import(name, *args, **kwargs):
+    if name in sys.modules:
+        return _original_import(name, *args, **kwargs)
+
+    modules_count = len(sys.modules)
+    # [time spent in nested imports]
+    _stack.append([0])
+    t0 = time.time()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        total = time.time() - t0
+        nested = _stack.pop()[0]
+        if len(sys.modules) > modules_count:
+            # a module was actually loaded
+            times = _times.setdefault(name, [0, 0])
+            times[0] += total - nested
+            times[1] += total
+            if _stack:
+                _stack[-1][0] += total
+
+
+def enable():
+    global _original_import
+    if _original_import is None:
+        _original_import = builtins.__import__
+        builtins.__import__ = _profiled_import
+
+
+def disable():
+    global _original_import
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+        _original_import = None
+
+
+def is_enabled():
+    return _original_import is not None
+
+
+def reset():
+    _times.clear()
+
+
+def get_report():
+    """Return a list of (module name, self time, total time) tuples,
+    sorted by decreasing self time, times in seconds"""
+    report = [(name, times[0], times[1]) for name, times in _times.items()]
+    report.sort(key=lambda item: item[1], reverse=True)
+    return report
+
+
+def format_report(limit=None):
+    lines = ["%-50s %10s %10s" % ("Module", "self (ms)", "total")]
+    for name, self_time, total_time in get_report()[:limit]:
+        lines.append("%-50s %10.1f %10.1f" % (name, self_time * 1000, total_time * 1000))
+    return lines
+
+
+def log_report(limit=30):
+    log = logging.getLogger("HWR")
+    for line in format_report(limit):
+        log.debug(line)
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser("usage: %prog [-p path] [-l limit] module [...]")
+    parser.add_option("-p", "--path", action="append", default=[],
+                      help="directory added to the modules path (default: HardwareObjects)")
+    parser.add_option("-l", "--limit", type="int", default=30,
+                      help="number of modules in the report (default: %default)")
+    options, args = parser.parse_args()
+
+    if not args:
+        parser.error("missing module name")
+
+    paths = options.path or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "HardwareObjects")]
+    sys.path[0:0] = paths
+
+    enable()
+    t0 = time.time()
+    for module_name in args:
+        try:
+            __import__(module_name)
+        except Exception, err:
+            print "Cannot import %s: %s" % (module_name, err)
+    elapsed = time.time() - t0
+    disable()
+
+    for line in format_report(options.limit):
+        print line
+    print "%d modules imported in %.1f ms" % (len(_times), elapsed * 1000)
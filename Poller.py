@@ -1,13 +1,19 @@
 import logging
 import saferef
-from gevent import _threading 
+from gevent import _threading
 import gevent
 import gevent.monkey
+import heapq
+import itertools
+import time
 import numpy
 import types
 
 POLLERS = {}
 
+# maximum number of OS threads executing (blocking) polled calls
+MAX_WORKERS = 8
+
 class _NotInitializedValue:
   pass
 
@@ -22,7 +28,12 @@ class PollingException:
 
 def get_poller(poller_id):
     return POLLERS.get(poller_id)
-       
+
+
+def get_statistics():
+    """Return a dictionary {poller_id: statistics} for all pollers"""
+    return dict([(poller_id, poller.get_statistics()) for poller_id, poller in POLLERS.items()])
+
 
 def poll(polled_call, polled_call_args=(), polling_period=1000, value_changed_callback=None, error_callback=None, compare=True, start_delay=0, start_value=NotInitializedValue):
      #logging.info(">>>> %s", POLLERS)
@@ -32,14 +43,160 @@ def poll(polled_call, polled_call_args=(), polling_period=1000, value_changed_ca
          if poller_polled_call == polled_call and poller.args == polled_call_args:
              poller.set_polling_period(min(polling_period, poller.get_polling_period()))
              return poller
-            
+
      #logging.info(">>>>> CREATING NEW POLLER for cmd %r, args=%s, polling time=%d", polled_call, polled_call_args, polling_period)
      poller = _Poller(polled_call, polled_call_args, polling_period, value_changed_callback, error_callback, compare)
      poller.old_res = start_value
      POLLERS[poller.get_id()] = poller
      poller.start_delayed(start_delay)
      return poller
-     
+
+
+class _PollingScheduler:
+    """Single timer thread driving all pollers
+
+    Pollers sharing the same polling period are grouped, and the group
+    is woken up by one entry in a heap of deadlines. Polled calls are
+    executed by a small bounded pool of worker threads, so a blocking
+    call only delays the pollers queued behind it in the pool.
+    """
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self._cond = _threading.Condition()
+        self._heap = []
+        self._groups = {}
+        self._seq = itertools.count()
+        self._thread_started = False
+        self._jobs = _threading.Queue()
+        self._workers = 0
+        self._idle_workers = 0
+
+
+    def _push(self, due, entry):
+        heapq.heappush(self._heap, (due, next(self._seq), entry))
+        self._cond.notify()
+
+
+    def add(self, poller, delay=0):
+        with self._cond:
+            self._start_thread()
+            if delay:
+                self._push(time.time() + delay / 1000.0, poller)
+            else:
+                self._join_group(poller)
+                self._submit(poller, time.time())
+
+
+    def remove(self, poller):
+        with self._cond:
+            self._leave_group(poller)
+
+
+    def reschedule(self, poller):
+        with self._cond:
+            if poller._group is not None:
+                self._leave_group(poller)
+                self._join_group(poller)
+
+
+    def _join_group(self, poller):
+        period = poller.get_polling_period()
+        group = self._groups.get(period)
+        if group is None:
+            group = self._groups[period] = set()
+            self._push(time.time() + period / 1000.0, group)
+        group.add(poller)
+        poller._group = group
+
+
+    def _leave_group(self, poller):
+        group = poller._group
+        poller._group = None
+        if group is not None:
+            group.discard(poller)
+            if not group:
+                # heap entry of an empty group is dropped on next wake up
+                for period, g in self._groups.items():
+                    if g is group:
+                        del self._groups[period]
+                        break
+        else:
+            # poller may still wait for its delayed start
+            self._heap = [item for item in self._heap if item[2] is not poller]
+            heapq.heapify(self._heap)
+
+
+    def _start_thread(self):
+        if not self._thread_started:
+            self._thread_started = True
+            _threading.start_new_thread(self._run, ())
+
+
+    def _submit(self, poller, scheduled_time):
+        if poller._pending:
+            # previous call still queued or running
+            poller._stats["overruns"] += 1
+            return
+        poller._pending = True
+        self._jobs.put((poller, scheduled_time))
+        if self._idle_workers == 0 and self._workers < self.max_workers:
+            self._workers += 1
+            _threading.start_new_thread(self._work, ())
+
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, entry = self._heap[0]
+                now = time.time()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+
+                if isinstance(entry, _Poller):
+                    # delayed start
+                    if not entry.is_stopped():
+                        self._join_group(entry)
+                        self._submit(entry, due)
+                    continue
+
+                period = None
+                for p, group in self._groups.items():
+                    if group is entry:
+                        period = p
+                        break
+                if period is None:
+                    # group does not exist anymore
+                    continue
+                next_due = due + period / 1000.0
+                if next_due <= now:
+                    # ticks were missed, do not try to catch up
+                    next_due = now + period / 1000.0
+                self._push(next_due, entry)
+                for poller in list(entry):
+                    self._submit(poller, due)
+
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle_workers += 1
+            poller, scheduled_time = self._jobs.get()
+            with self._cond:
+                self._idle_workers -= 1
+            try:
+                poller._poll_once(scheduled_time)
+            except:
+                logging.exception("Poller: unexpected error while polling")
+            finally:
+                poller._pending = False
+
+
+_scheduler = _PollingScheduler()
+
 
 class _Poller:
     def __init__(self, polled_call, polled_call_args=(), polling_period=1000, value_changed_callback=None, error_callback=None, compare=True):
@@ -54,22 +211,34 @@ class _Poller:
         self.delay = 0
         self.stop_event = _threading.Event()
         self.async_watcher = gevent.get_hub().loop.async()
+        self._group = None
+        self._pending = False
+        self._stats = { "calls": 0,
+                        "errors": 0,
+                        "overruns": 0,
+                        "last_latency": 0,
+                        "max_latency": 0,
+                        "total_latency": 0,
+                        "last_duration": 0,
+                        "max_duration": 0 }
 
 
     def start_delayed(self, delay):
         self.delay = delay
-        _threading.start_new_thread(self.run, ()) #self.start()
+        self.async_watcher.start(self.new_event)
+        _scheduler.add(self, delay)
 
 
     def stop(self):
         self.stop_event.set()
-        del POLLERS[self.get_id()]       
+        _scheduler.remove(self)
+        del POLLERS[self.get_id()]
 
 
     def is_stopped(self):
         return self.stop_event.is_set()
 
- 
+
     def get_id(self):
         return id(self)
 
@@ -80,7 +249,24 @@ class _Poller:
 
     def set_polling_period(self, polling_period):
         #logging.info(">>>>> CHANGIG POLLING PERIOD TO %d", polling_period)
-        self.polling_period = polling_period
+        if polling_period != self.polling_period:
+            self.polling_period = polling_period
+            _scheduler.reschedule(self)
+
+
+    def get_statistics(self):
+        """Return latency (delay between scheduled and actual call)
+           and duration of polled calls, in milliseconds, and the number
+           of ticks skipped because the previous call was not finished
+        """
+        stats = dict(self._stats)
+        if stats["calls"]:
+            stats["mean_latency"] = stats["total_latency"] / stats["calls"]
+        else:
+            stats["mean_latency"] = 0
+        del stats["total_latency"]
+        stats["polling_period"] = self.polling_period
+        return stats
 
 
     def restart(self, delay=0):
@@ -110,62 +296,62 @@ class _Poller:
                     gevent.spawn(cb, res)
 
 
-    def run(self):
-        sleep = gevent.monkey._get_original("time", ["sleep"])[0]
-
-        self.async_watcher.start(self.new_event)
-        err_callback_args = None 
-        error_cb = None
-        first_run = True
- 
-        while not self.stop_event.is_set():
-            if first_run and self.delay:
-                sleep(self.delay / 1000.0)
-            first_run = False            
-
-            if self.stop_event.is_set():
-                break
-                
-            polled_call = self.polled_call_ref()
-            if polled_call is None:
-                break
+    def _poll_once(self, scheduled_time):
+        """Execute polled call once, from a worker thread"""
+        if self.stop_event.is_set():
+            return
 
-            try:
-                res = polled_call(*self.args)
-            except Exception as e:
-                if self.stop_event.is_set():
-                  break
-                error_cb = self.error_callback_ref()
-                if error_cb is not None:
-                    self.queue.put(PollingException(e, self.get_id()))
-                break
-            
-            del polled_call
-           
+        polled_call = self.polled_call_ref()
+        if polled_call is None:
+            _scheduler.remove(self)
+            return
+
+        t0 = time.time()
+        latency = (t0 - scheduled_time) * 1000
+        self._stats["calls"] += 1
+        self._stats["last_latency"] = latency
+        self._stats["max_latency"] = max(latency, self._stats["max_latency"])
+        self._stats["total_latency"] += latency
+
+        try:
+            res = polled_call(*self.args)
+        except Exception as e:
+            self._stats["errors"] += 1
+            # polling stops on error, error callback decides to restart
+            _scheduler.remove(self)
             if self.stop_event.is_set():
-                break
- 
-            if self.compare and res == self.old_res:
-                # do nothing: previous value is the same as "new" value
-                pass
-            else:
-                new_value = True
-                if self.compare:
-                  if isinstance(res, numpy.ndarray):
-                      comparison = res == self.old_res
-                      if type(comparison) == bool:
-                          new_value = not comparison
-                      else:
-                          new_value = not all(comparison)
+                return
+            error_cb = self.error_callback_ref()
+            if error_cb is not None:
+                self.queue.put(PollingException(e, self.get_id()))
+                self.async_watcher.send()
+            return
+        finally:
+            duration = (time.time() - t0) * 1000
+            self._stats["last_duration"] = duration
+            self._stats["max_duration"] = max(duration, self._stats["max_duration"])
+
+        del polled_call
+
+        if self.stop_event.is_set():
+            return
+
+        if self.compare and res == self.old_res:
+            # do nothing: previous value is the same as "new" value
+            pass
+        else:
+            new_value = True
+            if self.compare:
+              if isinstance(res, numpy.ndarray):
+                  comparison = res == self.old_res
+                  if type(comparison) == bool:
+                      new_value = not comparison
                   else:
-                      new_value = res != self.old_res
-
-                if new_value:
-                  self.old_res = res
-                  self.queue.put(res)
-                  self.async_watcher.send()
-
-            sleep(self.polling_period / 1000.0)
-
-        if error_cb is not None:
-            self.async_watcher.send()
+                      new_value = not all(comparison)
+              else:
+                  new_value = res != self.old_res
+
+            if new_value:
+              self.old_res = res
+              self.queue.put(res)
+              self.async_watcher.send()
@@ -0,0 +1,244 @@
+"""Cache of parsed Hardware Objects XML files
+
+The SAX events of each XML file are stored (marshal format) in a cache
+directory, keyed by file path and validated with the file modification
+time and size. Loading a Hardware Object from an unchanged file replays
+the events instead of parsing the XML again.
+The XML structures of the classes templates (module docstrings) used
+for validation are cached the same way, keyed by module.
+
+The cache directory is $HWR_CACHE_DIR, or ~/.cache/mxcube_hwr
+
+Command line usage :
+  python XMLCache.py warm <xml files directory> [...]
+  python XMLCache.py info
+  python XMLCache.py clear
+"""
+
+import os
+import sys
+import marshal
+import hashlib
+import logging
+import optparse
+import xml.sax
+from xml.sax.handler import ContentHandler
+from xml.sax.xmlreader import AttributesImpl
+
+CACHE_VERSION = 2
+CACHE_DIR = os.environ.get("HWR_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "mxcube_hwr"))
+
+_memory_cache = {}
+
+
+class XMLEventsRecorder(ContentHandler):
+    def __init__(self):
+        ContentHandler.__init__(self)
+
+        self.events = []
+
+
+    def getEvents(self):
+        return self.events
+
+
+    def startElement(self, name, attrs):
+        self.events.append(("s", name, dict(attrs.items())))
+
+
+    def characters(self, content):
+        if self.events and self.events[-1][0] == "c":
+            self.events[-1] = ("c", self.events[-1][1] + content)
+        else:
+            self.events.append(("c", content))
+
+
+    def endElement(self, name):
+        self.events.append(("e", name))
+
+
+def replay(events, handler):
+    """Send recorded SAX events to a SAX content handler"""
+    for event in events:
+        if event[0] == "s":
+            handler.startElement(event[1], AttributesImpl(event[2]))
+        elif event[0] == "c":
+            handler.characters(event[1])
+        else:
+            handler.endElement(event[1])
+
+
+def parseEvents(XMLString):
+    recorder = XMLEventsRecorder()
+    xml.sax.parseString(str.encode(XMLString), recorder)
+    return recorder.getEvents()
+
+
+def _cache_filename(key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(repr(key)).hexdigest() + ".cache")
+
+
+def _stamp(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    # sub-second modification time: a file saved twice within the same
+    # second, keeping its size, is still detected
+    return (st.st_mtime, st.st_size)
+
+
+def _load(key, stamp):
+    entry = _memory_cache.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    try:
+        f = open(_cache_filename(key), "rb")
+        try:
+            version, cached_key, cached_stamp, data = marshal.load(f)
+        finally:
+            f.close()
+    except Exception:
+        return None
+
+    if version != CACHE_VERSION or cached_key != key or tuple(cached_stamp) != stamp:
+        return None
+
+    _memory_cache[key] = (stamp, data)
+    return data
+
+
+def _store(key, stamp, data):
+    _memory_cache[key] = (stamp, data)
+
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        filename = _cache_filename(key)
+        tmp_filename = "%s.%d" % (filename, os.getpid())
+        f = open(tmp_filename, "wb")
+        try:
+            marshal.dump((CACHE_VERSION, key, stamp, data), f)
+        finally:
+            f.close()
+        os.rename(tmp_filename, filename)
+    except Exception:
+        logging.getLogger("HWR").debug("XMLCache: could not write cache file for %s", key[1])
+
+
+def getEvents(XMLString, filename=None):
+    """Return the SAX events of the XML string, from the cache if
+    filename did not change since the events were recorded"""
+    if filename is None:
+        return parseEvents(XMLString)
+
+    key = ("xml", os.path.abspath(filename))
+    stamp = _stamp(filename)
+    events = None
+    if stamp is not None:
+        events = _load(key, stamp)
+    if events is None:
+        events = parseEvents(XMLString)
+        if stamp is not None:
+            _store(key, stamp, events)
+    return events
+
+
+def getTemplateStructure(module, XMLTemplate, retriever_class):
+    """Return the XML structure of a module template, from the cache if
+    the module file did not change"""
+    filename = getattr(module, "__file__", None)
+    stamp = None
+    if filename is not None:
+        if filename[-4:] in (".pyc", ".pyo"):
+            filename = filename[:-1]
+        stamp = _stamp(filename)
+    key = ("template", module.__name__)
+
+    data = None
+    if stamp is not None:
+        data = _load(key, stamp)
+
+    structure = retriever_class().getStructure()
+    if data is None:
+        retriever = retriever_class()
+        xml.sax.parseString(XMLTemplate, retriever)
+        structure = retriever.getStructure()
+        if stamp is not None:
+            _store(key, stamp, (sorted(structure.xmlpaths),
+                                dict([(path, sorted(attrs)) for path, attrs in structure.attributes.items()])))
+    else:
+        for path in data[0]:
+            structure.add(path, set(data[1].get(path, [])))
+    return structure
+
+
+def entries():
+    """Iterate over (kind, name, valid, size) for the cache files"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for filename in sorted(os.listdir(CACHE_DIR)):
+        if not filename.endswith(".cache"):
+            continue
+        try:
+            f = open(os.path.join(CACHE_DIR, filename), "rb")
+            try:
+                version, key, stamp, data = marshal.load(f)
+            finally:
+                f.close()
+        except Exception:
+            continue
+        valid = version == CACHE_VERSION
+        if valid and key[0] == "xml":
+            valid = _stamp(key[1]) == tuple(stamp)
+        yield key[0], key[1], valid, len(data)
+
+
+def warm(directories):
+    """Record events of all XML files in directories, return the number
+    of files"""
+    count = 0
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(os.path.extsep+"xml"):
+                    file_path = os.path.join(dirpath, filename)
+                    try:
+                        getEvents(open(file_path).read(), file_path)
+                    except Exception:
+                        logging.getLogger("HWR").exception("XMLCache: cannot parse %s", file_path)
+                    else:
+                        count += 1
+    return count
+
+
+def clear():
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for filename in os.listdir(CACHE_DIR):
+        if filename.endswith(".cache"):
+            os.unlink(os.path.join(CACHE_DIR, filename))
+    _memory_cache.clear()
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser("usage: %prog warm <xml files directory> [...] | info | clear")
+    options, args = parser.parse_args()
+
+    if not args:
+        parser.error("missing command")
+
+    if args[0] == "warm":
+        if len(args) < 2:
+            parser.error("missing XML files directory")
+        print "%d files cached in %s" % (warm(args[1:]), CACHE_DIR)
+    elif args[0] == "info":
+        print "Cache directory: %s" % CACHE_DIR
+        for kind, name, valid, size in entries():
+            print "%-8s %-6s %6d %s" % (kind, valid and "valid" or "stale", size, name)
+    elif args[0] == "clear":
+        clear()
+    else:
+        parser.error("unknown command %s" % args[0])
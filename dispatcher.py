@@ -8,6 +8,7 @@ except ImportError:
   from pydispatch import robustapply
   from pydispatch import saferef
   saferef.safe_ref = saferef.safeRef
+  dispatcher.get_all_receivers = dispatcher.getAllReceivers
   robustapply.robust_apply = robustapply.robustApply
   louie=0
 
@@ -0,0 +1,17 @@
+"""Imports the HardwareRepository package of this checkout, whatever the
+name of its directory"""
+
+import os
+import sys
+import imp
+
+HWR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_package():
+    package = sys.modules.get("HardwareRepository")
+    if package is None or getattr(package, "__path__", None) is None:
+        # not imported yet, or HardwareRepository.py imported as a module
+        package = imp.load_module("HardwareRepository", None, HWR_DIR,
+                                  ("", "", imp.PKG_DIRECTORY))
+    return package
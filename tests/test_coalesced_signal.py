@@ -0,0 +1,75 @@
+"""Rate limited signals of the Hardware Objects (CoalescedSignal)
+
+  python -m unittest discover -s tests
+"""
+
+import unittest
+import gevent
+
+import hwr_package
+hwr_package.import_package()
+
+from HardwareRepository.BaseHardwareObjects import HardwareObject
+
+
+class Receiver:
+    def __init__(self):
+        self.values = []
+
+    def value_changed(self, value):
+        self.values.append(value)
+
+
+class TestCoalescedSignal(unittest.TestCase):
+    def setUp(self):
+        self.hwobj = HardwareObject("/hwobj")
+        self.receiver = Receiver()
+        self.hwobj.connect(self.hwobj, "valueChanged", self.receiver.value_changed)
+
+    def tearDown(self):
+        self.hwobj.set_signal_max_rate("valueChanged", None)
+
+    def test_not_rate_limited(self):
+        for value in range(5):
+            self.hwobj.emit("valueChanged", value)
+        self.assertEqual(self.receiver.values, range(5))
+        self.assertEqual(self.hwobj.get_signal_statistics(), {})
+
+    def test_newest_value_delivered(self):
+        self.hwobj.set_signal_max_rate("valueChanged", 20)
+        for value in range(5):
+            self.hwobj.emit("valueChanged", value)
+        # the first value is sent at once, the newest one at the next tick
+        self.assertEqual(self.receiver.values, [0])
+        gevent.sleep(0.1)
+        self.assertEqual(self.receiver.values, [0, 4])
+        self.assertEqual(self.hwobj.get_signal_statistics(),
+                         {"valueChanged": {"emitted": 5, "delivered": 2, "coalesced": 3}})
+
+    def test_slow_emission_not_delayed(self):
+        self.hwobj.set_signal_max_rate("valueChanged", 100)
+        for value in range(3):
+            self.hwobj.emit("valueChanged", value)
+            self.assertEqual(self.receiver.values[-1], value)
+            gevent.sleep(0.02)
+
+    def test_other_signals_not_rate_limited(self):
+        self.hwobj.set_signal_max_rate("otherSignal", 1)
+        for value in range(3):
+            self.hwobj.emit("valueChanged", value)
+        self.assertEqual(self.receiver.values, [0, 1, 2])
+
+    def test_rate_limit_removed(self):
+        self.hwobj.set_signal_max_rate("valueChanged", 1)
+        self.hwobj.emit("valueChanged", 0)
+        self.hwobj.emit("valueChanged", 1)
+        # the pending value is dropped
+        self.hwobj.set_signal_max_rate("valueChanged", None)
+        self.hwobj.emit("valueChanged", 2)
+        gevent.sleep(0.05)
+        self.assertEqual(self.receiver.values, [0, 2])
+        self.assertEqual(self.hwobj.get_signal_statistics(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""GenericVideoDevice snapshots and subscribers tests, with fake cameras
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+import hwr_package
+hwr_package.import_package()
+
+sys.path.insert(0, os.path.join(hwr_package.HWR_DIR, "HardwareObjects"))
+
+import GenericVideoDevice as generic_video_device
+from GenericVideoDevice import GenericVideoDevice
+from HardwareRepository.HardwareRepository import dispatcher
+
+WIDTH, HEIGHT = 3, 2
+
+# RGB frame, pixel (x, y) is (x, y, 10)
+RGB_FRAME = np.array([[(x, y, 10) for x in range(WIDTH)] for y in range(HEIGHT)],
+                     dtype=np.uint8)
+
+
+class Receiver:
+    def __init__(self):
+        self.frames = []
+
+    def frame_received(self, frame, width, height):
+        self.frames.append((frame.copy(), width, height))
+
+
+class FrameCamera(GenericVideoDevice):
+    """Camera returning raw RGB frames (get_image)"""
+    def __init__(self, name):
+        GenericVideoDevice.__init__(self, name)
+        self.cam_type = "prosilica"
+        self.cam_mirror = [False, False]
+
+    def get_image(self):
+        return RGB_FRAME.tostring(), WIDTH, HEIGHT
+
+
+class FakeQImage:
+    """What get_snapshot uses of a QImage, with the BGRA data of
+    QImage.Format_RGB32"""
+    def __init__(self):
+        self.data = np.empty((HEIGHT, WIDTH, 4), dtype=np.uint8)
+        self.data[..., :3] = RGB_FRAME[..., ::-1]
+        self.data[..., 3] = 255
+        self.format = None
+
+    def convertToFormat(self, image_format):
+        self.format = image_format
+        return self
+
+    def bits(self):
+        return FakeBits(self.data.tostring())
+
+    def byteCount(self):
+        return self.data.size
+
+    def width(self):
+        return WIDTH
+
+    def height(self):
+        return HEIGHT
+
+
+class FakeBits(bytearray):
+    def setsize(self, size):
+        pass
+
+
+class QImageCamera(GenericVideoDevice):
+    """Camera only providing QImages (like Qt4_VimbaVideo or Qt4_RedisCamera)"""
+    def __init__(self, name):
+        GenericVideoDevice.__init__(self, name)
+        self.qimage = FakeQImage()
+
+    def get_new_image(self):
+        return self.qimage
+
+
+class TestGetSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.useqt = generic_video_device.USEQT
+
+    def tearDown(self):
+        generic_video_device.USEQT = self.useqt
+
+    def expected_array(self):
+        return FakeQImage().data
+
+    def test_frame_snapshot(self):
+        camera = FrameCamera("/camera")
+        self.assertTrue(camera.has_frame_source())
+        image_array = camera.get_snapshot()
+        self.assertEqual(image_array.tolist(), self.expected_array().tolist())
+
+    def test_frame_snapshot_mirrored(self):
+        camera = FrameCamera("/camera")
+        camera.cam_mirror = [True, True]
+        image_array = camera.get_snapshot()
+        self.assertEqual(image_array.tolist(),
+                         self.expected_array()[::-1, ::-1].tolist())
+
+    def test_frame_snapshot_bw(self):
+        camera = FrameCamera("/camera")
+        image_array = camera.get_snapshot(bw=True)
+        self.assertEqual(image_array.shape, (HEIGHT, WIDTH))
+        # weights applied to the B, G, R array, as with QImages
+        self.assertAlmostEqual(image_array[1, 2], 10 * 0.299 + 1 * 0.587 + 2 * 0.144)
+
+    def test_frame_snapshot_emits_frame(self):
+        camera = FrameCamera("/camera")
+        receiver = Receiver()
+        camera.connect(camera, "frameReceived", receiver.frame_received)
+        camera.get_snapshot()
+        self.assertEqual(len(receiver.frames), 1)
+        frame, width, height = receiver.frames[0]
+        self.assertEqual((width, height), (WIDTH, HEIGHT))
+        self.assertEqual(frame.tolist(), RGB_FRAME.tolist())
+
+    def test_qimage_snapshot(self):
+        generic_video_device.USEQT = True
+        camera = QImageCamera("/camera")
+        self.assertFalse(camera.has_frame_source())
+        image_array = camera.get_snapshot()
+        self.assertEqual(camera.qimage.format, 4)
+        self.assertEqual(image_array.tolist(), self.expected_array().tolist())
+        image_array = camera.get_snapshot(bw=True)
+        self.assertEqual(image_array.shape, (HEIGHT, WIDTH))
+
+    def test_qimage_snapshot_without_qt(self):
+        generic_video_device.USEQT = False
+        camera = QImageCamera("/camera")
+        sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+        try:
+            self.assertTrue(camera.get_snapshot() is None)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+
+class TestHasSubscribers(unittest.TestCase):
+    def test_connected_receivers(self):
+        camera = FrameCamera("/camera")
+        receiver = Receiver()
+        self.assertFalse(camera.has_subscribers("frameReceived"))
+        # connected twice, disconnected once
+        camera.connect(camera, "frameReceived", receiver.frame_received)
+        camera.connect(camera, "frameReceived", receiver.frame_received)
+        self.assertTrue(camera.has_subscribers("frameReceived"))
+        self.assertFalse(camera.has_subscribers("imageReceived"))
+        camera.disconnect(camera, "frameReceived", receiver.frame_received)
+        self.assertFalse(camera.has_subscribers("frameReceived"))
+
+    def test_dispatcher_receivers(self):
+        camera = FrameCamera("/camera")
+        receiver = Receiver()
+        dispatcher.connect(receiver.frame_received, "frameReceived", camera)
+        self.assertTrue(camera.has_subscribers("frameReceived"))
+        # dead receivers do not count
+        del receiver
+        self.assertFalse(camera.has_subscribers("frameReceived"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,268 @@
+"""InstanceServer tests : client outbound queue, and synchronization of
+the brick and tab events (snapshot, then the events missed since the
+last one received), without GUI.
+
+  python -m unittest discover -s tests
+"""
+
+import sys
+import types
+import socket
+import logging
+import unittest
+
+import hwr_package
+hwr_package.import_package()
+
+import gevent
+
+try:
+    import BlissFramework
+except ImportError:
+    # only its logging name is used, by initializeInstance
+    BlissFramework = types.ModuleType("BlissFramework")
+    BlissFramework.loggingName = "tests"
+    sys.modules["BlissFramework"] = BlissFramework
+
+import InstanceServer as instance_server
+
+
+class TestClientConnection(unittest.TestCase):
+    def setUp(self):
+        self.server_socket, self.client_socket = socket.socketpair()
+
+    def tearDown(self):
+        self.server_socket.close()
+        self.client_socket.close()
+
+    def received(self, count):
+        frames = []
+        with gevent.Timeout(2):
+            for frame in instance_server.read_frames(self.client_socket):
+                frames.append(frame)
+                if len(frames) == count:
+                    break
+        return frames
+
+    def test_messages_in_order(self):
+        connection = instance_server.ClientConnection(self.server_socket, "client")
+        for data in ("a", "b", "c"):
+            connection.send(instance_server.encode_frame(data))
+        self.assertEqual(self.received(3), ["a", "b", "c"])
+        connection.close()
+
+    def test_superseded_message_not_written(self):
+        connection = instance_server.ClientConnection(self.server_socket, "client")
+        encode = instance_server.encode_frame
+        connection.send(encode("a"))
+        connection.send(encode("k1"), key="k")
+        connection.send(encode("b"))
+        connection.send(encode("k2"), key="k")
+        self.assertEqual(connection.pending(), 3)
+        self.assertEqual(connection.coalesced, 1)
+        # the newest message of a key comes after the messages sent before it
+        self.assertEqual(self.received(3), ["a", "b", "k2"])
+        connection.close()
+
+    def test_coalesced_queue_stays_short(self):
+        connection = instance_server.ClientConnection(self.server_socket, "client",
+                                                      max_queued=10)
+        for i in range(1000):
+            connection.send(instance_server.encode_frame("k%d" % i), key="k")
+            connection.send(instance_server.encode_frame("l%d" % i), key="l")
+        self.assertEqual(connection.pending(), 2)
+        self.assertTrue(len(connection._queue) <= 8)
+        self.assertEqual(connection.coalesced, 1998)
+        self.assertEqual(self.received(2), ["k999", "l999"])
+        connection.close()
+
+    def test_slow_client_disconnected(self):
+        connection = instance_server.ClientConnection(self.server_socket, "client",
+                                                      max_queued=5)
+        logging.disable(logging.CRITICAL)
+        try:
+            for i in range(6):
+                connection.send(instance_server.encode_frame(str(i)))
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertTrue(connection._closed)
+        # nothing is dropped silently: the client sees the end of the stream
+        with gevent.Timeout(2):
+            self.assertEqual(list(instance_server.read_frames(self.client_socket)), [])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.frames = []
+
+    def send(self, frame, key=None):
+        self.frames.append(frame[instance_server.FRAME_HEADER.size:])
+
+
+class FakeBrick:
+    def setValue(self, value):
+        pass
+
+
+class FakeItem(dict):
+    def __init__(self):
+        dict.__init__(self, brick=FakeBrick())
+        self.widget = self
+
+    def setCurrentPage(self, index):
+        pass
+
+
+class FakeConfiguration:
+    def findItem(self, name):
+        return FakeItem()
+
+
+class TestEventsSynchronization(unittest.TestCase):
+    CLIENT_ADDR = ("clienthost", 1234)
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.send_data_to_server = instance_server.send_data_to_server
+        self.instance_client = instance_server.InstanceClient
+        instance_server.send_data_to_server = self.client_sends
+        instance_server.InstanceClient = self.connect
+
+        self.server = self.instance("server")
+        self.server.asyncServer = object()
+        self.server.serverId2 = ["serverhost", None]
+        self.server.controlId2 = list(self.server.serverId2)
+        self.server.eventsEpoch = 1000.0
+
+        self.client = self.instance("client")
+        self.client.guiConfiguration = FakeConfiguration()
+        self.widget_updates = []
+        self.client.emit = self.client_emits
+
+        self.connection = FakeConnection()
+
+    def tearDown(self):
+        instance_server.SERVER_CLIENTS.clear()
+        instance_server.send_data_to_server = self.send_data_to_server
+        instance_server.InstanceClient = self.instance_client
+        logging.disable(logging.NOTSET)
+
+    def instance(self, name):
+        instance = instance_server.InstanceServer(name)
+        instance.init()
+        instance.emit = lambda *args: None
+        return instance
+
+    def connect(self, host, port):
+        instance_server.SERVER_CLIENTS[self.CLIENT_ADDR] = self.connection
+        return "server"
+
+    def disconnect(self):
+        del instance_server.SERVER_CLIENTS[self.CLIENT_ADDR]
+        self.deliver()
+
+    def client_sends(self, socket_name, data):
+        self.server.serverMessageReceived(self.CLIENT_ADDR, data)
+
+    def client_emits(self, signal, args=()):
+        if signal == "widgetUpdate":
+            self.widget_updates.append(args[2])
+
+    def deliver(self):
+        """Client receives the messages sent by the server"""
+        frames, self.connection.frames = self.connection.frames, []
+        for data in frames:
+            self.client.clientMessageReceived(data)
+
+    def brick_update(self, value):
+        self.server.sendBrickUpdateMessage("brick", "", "setValue", (value,), True)
+
+    def tab_update(self, index):
+        self.server.sendTabUpdateMessage("tab", index)
+
+    def test_first_connection_gets_latest_events(self):
+        self.brick_update(1)
+        self.tab_update(2)
+        self.brick_update(3)
+
+        self.client.reconnect()
+        self.deliver()
+        self.assertEqual(self.widget_updates, [(2,), (3,)])
+        self.assertEqual(self.client.eventsEpoch, 1000.0)
+        self.assertEqual(self.client.eventsVersion, 3)
+
+    def test_reconnection_gets_missed_events(self):
+        self.brick_update(1)
+        self.tab_update(2)
+        self.client.reconnect()
+        self.deliver()
+
+        self.disconnect()
+        # missed by the disconnected client
+        self.tab_update(4)
+        self.brick_update(5)
+
+        self.widget_updates = []
+        self.client.reconnect()
+        self.deliver()
+        self.assertEqual(self.widget_updates, [(4,), (5,)])
+        self.assertEqual(self.client.eventsVersion, 4)
+
+    def test_reconnection_without_missed_events(self):
+        self.brick_update(1)
+        self.client.reconnect()
+        self.deliver()
+        self.brick_update(2)
+        self.deliver()
+        self.assertEqual(self.widget_updates, [(1,), (2,)])
+        self.disconnect()
+
+        self.widget_updates = []
+        self.client.reconnect()
+        self.deliver()
+        self.assertEqual(self.widget_updates, [])
+        self.assertEqual(self.client.eventsVersion, 2)
+
+    def test_server_restart_sends_all_events(self):
+        self.brick_update(1)
+        self.client.reconnect()
+        self.deliver()
+        self.disconnect()
+
+        # new server run, its versions start again
+        self.server.bricksEventCache = {}
+        self.server.eventsEpoch = 2000.0
+        self.server.eventsVersion = 0
+        self.tab_update(7)
+
+        self.widget_updates = []
+        self.client.reconnect()
+        self.deliver()
+        self.assertEqual(self.widget_updates, [(7,)])
+        self.assertEqual(self.client.eventsEpoch, 2000.0)
+        self.assertEqual(self.client.eventsVersion, 1)
+
+    def test_events_out_of_order_sends_all_events(self):
+        self.brick_update(1)
+        self.tab_update(2)
+        self.client.reconnect()
+        self.deliver()
+
+        # the brick event (version 3) arrives after the tab one (version 4)
+        self.brick_update(3)
+        self.tab_update(4)
+        self.connection.frames.reverse()
+        self.deliver()
+        self.assertFalse(self.client.eventsInOrder)
+        self.disconnect()
+
+        self.widget_updates = []
+        self.client.reconnect()
+        self.deliver()
+        self.assertEqual(self.widget_updates, [(3,), (4,)])
+        self.assertTrue(self.client.eventsInOrder)
+        self.assertEqual(self.client.eventsVersion, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
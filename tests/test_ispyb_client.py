@@ -0,0 +1,106 @@
+"""ISPyBClient2 tests: sample references index and samples cache, with
+a fake web service
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+import hwr_package
+hwr_package.import_package()
+
+sys.path.insert(0, os.path.join(hwr_package.HWR_DIR, "HardwareObjects"))
+
+import ISPyBClient2 as ispyb_client
+from ISPyBClient2 import SampleReference, _SampleReferenceIndex
+
+
+class FakeService:
+    def __init__(self):
+        self.calls = []
+
+    def findSampleInfoLightForProposal(self, proposal_id, beamline_name):
+        self.calls.append(proposal_id)
+        return ["sample %d.%d" % (proposal_id, i) for i in range(2)]
+
+
+class FakeToolsWebService:
+    def __init__(self):
+        self.service = FakeService()
+
+
+class TestSampleReferenceIndex(unittest.TestCase):
+    def setUp(self):
+        self.references = [SampleReference("A1", 1, 1, "P1"),
+                           SampleReference("A2", 1, 2, "P1"),
+                           SampleReference("", 2, 1, "P2"),
+                           SampleReference("A2", 2, 2, "P2")]
+        self.index = _SampleReferenceIndex(self.references)
+
+    def test_find_by_location(self):
+        self.assertEqual(self.index.find(location=(2, 1)), self.references[2])
+        self.assertEqual(self.index.find(location=[1, 2]), self.references[1])
+        self.assertTrue(self.index.find(location=(3, 1)) is None)
+
+    def test_find_by_code(self):
+        # first one with the code
+        self.assertEqual(self.index.find(code="A2"), self.references[1])
+        self.assertTrue(self.index.find(code="B1") is None)
+        self.assertTrue(self.index.find() is None)
+
+    def test_find_by_code_and_location(self):
+        self.assertEqual(self.index.find(code="A2", location=(2, 2)), self.references[3])
+        self.assertTrue(self.index.find(code="A1", location=(2, 2)) is None)
+
+    def test_remove(self):
+        self.index.remove(self.references[1])
+        self.assertEqual(self.index.find(code="A2"), self.references[3])
+        self.assertTrue(self.index.find(location=(1, 2)) is None)
+        self.assertEqual(self.index.remaining(),
+                         [self.references[0], self.references[2], self.references[3]])
+        self.assertRaises(ValueError, self.index.remove, self.references[1])
+        self.assertRaises(ValueError, self.index.remove, None)
+
+
+class TestSamplesCache(unittest.TestCase):
+    def setUp(self):
+        self.lims = ispyb_client.ISPyBClient2("/lims")
+        self.lims._tools_ws = FakeToolsWebService()
+        self.calls = self.lims._tools_ws.service.calls
+
+    def test_cached_per_proposal(self):
+        samples = self.lims._find_sample_info_light(10)
+        self.assertTrue(self.lims._find_sample_info_light(10) is samples)
+        self.lims._find_sample_info_light(20)
+        self.assertEqual(self.calls, [10, 20])
+
+    def test_invalidate(self):
+        self.lims._find_sample_info_light(10)
+        self.lims._find_sample_info_light(20)
+        self.lims.invalidate_samples_cache(10)
+        self.lims._find_sample_info_light(10)
+        self.lims._find_sample_info_light(20)
+        self.assertEqual(self.calls, [10, 20, 10])
+        self.lims.invalidate_samples_cache()
+        self.lims._find_sample_info_light(20)
+        self.assertEqual(self.calls, [10, 20, 10, 20])
+
+    def test_get_samples_reads_again(self):
+        self.lims._find_sample_info_light(10)
+        samples = self.lims.get_samples(10, 1)
+        self.assertEqual(samples, ["sample 10.0", "sample 10.1"])
+        self.assertEqual(self.calls, [10, 10])
+        # the new response is cached for the session samples
+        self.lims._find_sample_info_light(10)
+        self.assertEqual(self.calls, [10, 10])
+
+    def test_get_samples_returns_a_copy(self):
+        samples = self.lims.get_samples(10, 1)
+        del samples[:]
+        self.assertEqual(len(self.lims._find_sample_info_light(10)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+"""LimsWriteQueue tests, with a fake LIMS client
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import socket
+import logging
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "HardwareObjects"))
+
+import LimsWriteQueue as lims_write_queue
+from LimsWriteQueue import LimsWriteQueue
+
+
+class FakeLims:
+    """Record by record client (like ISPyBClient), failing_writes
+    connection errors first, and a ValueError for the "bad" images"""
+    def __init__(self, failing_writes=0):
+        self.failing_writes = failing_writes
+        self.images = []
+        self.collections = []
+
+    def _connect(self):
+        if self.failing_writes:
+            self.failing_writes -= 1
+            raise socket.error("connection refused")
+
+    def store_image(self, image_dict):
+        self._connect()
+        if image_dict.get("bad"):
+            raise ValueError("invalid image record")
+        self.images.append(image_dict)
+
+    def update_data_collection(self, mx_collection, wait=False):
+        self._connect()
+        self.collections.append(mx_collection)
+
+
+class FakeBatchLims(FakeLims):
+    """Client with batch methods (like ISPyBClient2), written records
+    are removed from the list"""
+    def __init__(self, failing_writes=0):
+        FakeLims.__init__(self, failing_writes)
+        self.batches = []
+
+    def store_images(self, image_dicts):
+        self.batches.append(len(image_dicts))
+        while image_dicts:
+            self.store_image(image_dicts[0])
+            image_dicts.pop(0)
+
+    def update_data_collections(self, mx_collections):
+        self.batches.append(len(mx_collections))
+        while mx_collections:
+            self.update_data_collection(mx_collections[0])
+            mx_collections.pop(0)
+
+
+class TestLimsWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spill_filename = os.path.join(self.directory, "spill.pickle")
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.directory)
+
+    def queue(self, lims, **kwargs):
+        kwargs.setdefault("flush_interval", 0.01)
+        kwargs.setdefault("retry_delay", 0.01)
+        return LimsWriteQueue(lims, self.spill_filename, **kwargs)
+
+    def test_batches(self):
+        lims = FakeBatchLims()
+        queue = self.queue(lims, max_batch=4)
+        for i in range(10):
+            queue.store_image({"image_number": i})
+        self.assertTrue(queue.flush(2))
+        self.assertEqual([image["image_number"] for image in lims.images], range(10))
+        self.assertEqual(lims.batches, [4, 4, 2])
+        stats = queue.get_statistics()
+        self.assertEqual(stats["images"], 10)
+        self.assertEqual(stats["pending"], 0)
+
+    def test_record_by_record(self):
+        lims = FakeLims()
+        queue = self.queue(lims)
+        queue.store_image({"image_number": 1})
+        queue.update_data_collection({"collection_id": 7})
+        queue.store_image({"image_number": 2})
+        self.assertTrue(queue.flush(2))
+        self.assertEqual([image["image_number"] for image in lims.images], [1, 2])
+        self.assertEqual(lims.collections, [{"collection_id": 7}])
+
+    def test_updates_coalesced(self):
+        lims = FakeBatchLims()
+        queue = self.queue(lims)
+        queue.update_data_collection({"collection_id": 1, "status": "running"})
+        queue.update_data_collection({"collection_id": 2, "status": "running"})
+        queue.update_data_collection({"collection_id": 1, "status": "finished"})
+        self.assertTrue(queue.flush(2))
+        self.assertEqual(lims.collections, [{"collection_id": 1, "status": "finished"},
+                                            {"collection_id": 2, "status": "running"}])
+        self.assertEqual(queue.get_statistics()["coalesced_updates"], 1)
+
+    def test_queued_record_is_a_copy(self):
+        lims = FakeLims()
+        queue = self.queue(lims)
+        mx_collection = {"collection_id": 1, "status": "running"}
+        queue.update_data_collection(mx_collection)
+        mx_collection["status"] = "changed"
+        self.assertTrue(queue.flush(2))
+        self.assertEqual(lims.collections[0]["status"], "running")
+
+    def test_retry_on_connection_error(self):
+        lims = FakeBatchLims(failing_writes=2)
+        queue = self.queue(lims, spill_after=5)
+        for i in range(3):
+            queue.store_image({"image_number": i})
+        self.assertTrue(queue.flush(2))
+        self.assertEqual([image["image_number"] for image in lims.images], [0, 1, 2])
+        stats = queue.get_statistics()
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["spilled"], 0)
+        self.assertEqual(stats["dropped"], 0)
+
+    def test_failing_record_dropped(self):
+        for lims in (FakeLims(), FakeBatchLims()):
+            queue = self.queue(lims)
+            queue.store_image({"image_number": 1})
+            queue.store_image({"image_number": 2, "bad": True})
+            queue.store_image({"image_number": 3})
+            self.assertTrue(queue.flush(2))
+            self.assertEqual([image["image_number"] for image in lims.images], [1, 3])
+            stats = queue.get_statistics()
+            self.assertEqual(stats["dropped"], 1)
+            self.assertEqual(stats["retries"], 0)
+
+    def test_spill_and_reload(self):
+        lims = FakeBatchLims(failing_writes=1000)
+        queue = self.queue(lims, spill_after=2)
+        queue.store_image({"image_number": 1})
+        queue.update_data_collection({"collection_id": 1})
+        self.assertTrue(queue.flush(2))
+        self.assertEqual(lims.images, [])
+        stats = queue.get_statistics()
+        self.assertEqual(stats["spilled"], 2)
+        self.assertEqual(stats["pending"], 0)
+        self.assertTrue(stats["spill_file"])
+
+        # written by the next queue (next application start)
+        lims = FakeBatchLims()
+        queue = self.queue(lims)
+        self.assertTrue(queue.flush(2))
+        self.assertEqual(lims.images, [{"image_number": 1}])
+        self.assertEqual(lims.collections, [{"collection_id": 1}])
+        self.assertFalse(os.path.exists(self.spill_filename))
+
+    def test_spill_filename(self):
+        lims = FakeLims()
+        lims.name = lambda: "/dbconnection"
+        filename = lims_write_queue.get_spill_filename(lims)
+        self.assertEqual(os.path.dirname(filename), lims_write_queue.SPILL_DIRECTORY)
+        self.assertTrue(os.path.basename(filename).startswith("lims_write_queue_dbconnection_"))
+        self.assertEqual(lims_write_queue.get_spill_filename(lims), filename)
+        # other web services
+        lims.ws_root = "http://ispyb/"
+        self.assertNotEqual(lims_write_queue.get_spill_filename(lims), filename)
+        other_lims = FakeLims()
+        other_lims.name = lambda: "/other_dbconnection"
+        self.assertNotEqual(lims_write_queue.get_spill_filename(other_lims), filename)
+
+    def test_spilled_records_read_once(self):
+        lims = FakeBatchLims(failing_writes=1000)
+        queue = self.queue(lims, spill_after=1)
+        queue.store_image({"image_number": 1})
+        self.assertTrue(queue.flush(2))
+
+        # two processes sharing the spill file
+        lims1, lims2 = FakeBatchLims(), FakeBatchLims()
+        queue1, queue2 = self.queue(lims1), self.queue(lims2)
+        self.assertTrue(queue1.flush(2))
+        self.assertTrue(queue2.flush(2))
+        self.assertEqual(lims1.images + lims2.images, [{"image_number": 1}])
+
+    def test_flush_timeout(self):
+        lims = FakeBatchLims(failing_writes=1000)
+        queue = self.queue(lims, retry_delay=10, spill_after=100)
+        queue.store_image({"image_number": 1})
+        self.assertFalse(queue.flush(timeout=0.1))
+        self.assertEqual(queue.pending(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+"""MiniDiff grouped moves and positions tests, with fake motors (no control system needed)
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import logging
+import unittest
+import gevent
+
+import hwr_package
+hwr_package.import_package()
+
+sys.path.insert(0, os.path.join(hwr_package.HWR_DIR, "HardwareObjects"))
+
+logging.disable(logging.CRITICAL)
+try:
+    # warns when the autocentring library is not available
+    import MiniDiff
+finally:
+    logging.disable(logging.NOTSET)
+
+from HardwareRepository.HardwareRepository import dispatcher
+
+
+class FakeMotor:
+    READY, MOVING = "READY", "MOVING"
+
+    def __init__(self, position=0):
+        self.position = position
+        self.state = FakeMotor.READY
+        self.motor_resolution = 0.001
+
+    def getState(self):
+        return self.state
+
+    def getPosition(self):
+        return self.position
+
+    def set_state(self, state):
+        self.state = state
+        dispatcher.send("stateChanged", self, state)
+
+    def set_position(self, position):
+        self.position = position
+        dispatcher.send("positionChanged", self, position)
+
+    def move(self, position, duration, moving=True):
+        """Moves in background, the state is MOVING during the move
+        if moving"""
+        def run():
+            if moving:
+                self.set_state(FakeMotor.MOVING)
+            gevent.sleep(duration)
+            self.position = position
+            self.set_state(FakeMotor.READY)
+        return gevent.spawn(run)
+
+
+class TestGroupedMove(unittest.TestCase):
+    def setUp(self):
+        self.polling_period = MiniDiff.GroupedMove.POLLING_PERIOD
+        self.move_start_delay = MiniDiff.GroupedMove.MOVE_START_DELAY
+        # no polling : completion is notified by the state changes
+        MiniDiff.GroupedMove.POLLING_PERIOD = 10
+
+    def tearDown(self):
+        MiniDiff.GroupedMove.POLLING_PERIOD = self.polling_period
+        MiniDiff.GroupedMove.MOVE_START_DELAY = self.move_start_delay
+
+    def grouped_move(self, motors, motors_positions):
+        grouped_move = MiniDiff.GroupedMove(motors, motors_positions)
+        self.addCleanup(grouped_move.close)
+        return grouped_move
+
+    def test_motors_moved(self):
+        phiy, phiz = FakeMotor(), FakeMotor()
+        grouped_move = self.grouped_move({"phiy": phiy, "phiz": phiz, "kappa": None},
+                                         {"phiy": 1, "phiz": 2})
+        phiy.move(1, 0.05)
+        phiz.move(2, 0.2)
+        with gevent.Timeout(1):
+            settle_times = grouped_move.wait()
+        self.assertEqual(sorted(settle_times), ["phiy", "phiz"])
+        self.assertTrue(0.04 <= settle_times["phiy"] < 0.15)
+        self.assertTrue(0.19 <= settle_times["phiz"] < 0.3)
+
+    def test_motor_at_position(self):
+        phiy = FakeMotor(position=1.0001)
+        grouped_move = self.grouped_move({"phiy": phiy}, {"phiy": 1})
+        with gevent.Timeout(0.1):
+            self.assertEqual(list(grouped_move.wait()), ["phiy"])
+
+    def test_motor_not_seen_moving(self):
+        MiniDiff.GroupedMove.MOVE_START_DELAY = 0.2
+        MiniDiff.GroupedMove.POLLING_PERIOD = 0.05
+        phiy = FakeMotor()
+        grouped_move = self.grouped_move({"phiy": phiy}, {"phiy": 1})
+        # ready again, but not at the position, after the start delay
+        phiy.move(1.5, 0.01, moving=False)
+        with gevent.Timeout(1):
+            settle_times = grouped_move.wait()
+        self.assertTrue(settle_times["phiy"] >= 0.2)
+
+    def test_other_motors_ready(self):
+        phiy, zoom = FakeMotor(), FakeMotor()
+        zoom.state = FakeMotor.MOVING
+        grouped_move = self.grouped_move({"phiy": phiy, "zoom": zoom}, {"phiy": 0})
+        gevent.spawn_later(0.05, zoom.set_state, FakeMotor.READY)
+        with gevent.Timeout(1):
+            settle_times = grouped_move.wait()
+        # only the moved motors have a settle time
+        self.assertEqual(list(settle_times), ["phiy"])
+        self.assertTrue(zoom.getState() == FakeMotor.READY)
+
+    def test_timeout(self):
+        phiy = FakeMotor()
+        phiy.state = FakeMotor.MOVING
+        grouped_move = self.grouped_move({"phiy": phiy}, {"phiy": 1})
+        self.assertRaises(RuntimeError, grouped_move.wait, 0.05)
+
+    def test_close(self):
+        phiy = FakeMotor()
+        grouped_move = MiniDiff.GroupedMove({"phiy": phiy}, {"phiy": 1})
+        grouped_move.close()
+        state_changed = grouped_move.state_changed
+        phiy.set_state(FakeMotor.MOVING)
+        self.assertTrue(grouped_move.state_changed is state_changed)
+        self.assertFalse(state_changed.is_set())
+
+
+class TestPositionsSnapshot(unittest.TestCase):
+    def test_read_only_mapping(self):
+        positions = {"phi": 10.0, "zoom": None}
+        snapshot = MiniDiff.PositionsSnapshot(positions, 1000.0)
+        positions["phi"] = 20.0
+        self.assertEqual(dict(snapshot), {"phi": 10.0, "zoom": None})
+        self.assertEqual(snapshot["phi"], 10.0)
+        self.assertEqual(len(snapshot), 2)
+        self.assertTrue("zoom" in snapshot)
+        self.assertEqual(snapshot.timestamp, 1000.0)
+        def set_phi():
+            snapshot["phi"] = 0
+        self.assertRaises(TypeError, set_phi)
+
+    def test_age(self):
+        snapshot = MiniDiff.PositionsSnapshot({"phi": 10.0})
+        self.assertTrue(0 <= snapshot.age() < 1)
+        snapshot = MiniDiff.PositionsSnapshot({"phi": 10.0}, snapshot.timestamp - 5)
+        self.assertTrue(5 <= snapshot.age() < 6)
+
+    def test_updated(self):
+        snapshot = MiniDiff.PositionsSnapshot({"phi": 10.0, "phiy": 1.0}, 1000.0)
+        updated = snapshot.updated("phi", 20.0)
+        self.assertEqual(dict(updated), {"phi": 20.0, "phiy": 1.0})
+        # same read time, the snapshot itself is not modified
+        self.assertEqual(updated.timestamp, 1000.0)
+        self.assertEqual(snapshot["phi"], 10.0)
+
+
+class TestPositions(unittest.TestCase):
+    ROLES = {"phi": "phiMotor", "focus": "focusMotor", "phiy": "phiyMotor",
+             "phiz": "phizMotor", "sampx": "sampleXMotor", "sampy": "sampleYMotor",
+             "kappa": "kappaMotor", "kappa_phi": "kappaPhiMotor", "zoom": "zoomMotor"}
+
+    def setUp(self):
+        self.diffractometer = MiniDiff.MiniDiff("/minidiff")
+        self.motors = {}
+        for role, attribute in self.ROLES.items():
+            motor = FakeMotor(position=1) if role != "kappa" else None
+            setattr(self.diffractometer, attribute, motor)
+            self.motors[role] = motor
+        self.diffractometer._connectPositionListeners()
+
+    def test_positions(self):
+        positions = self.diffractometer.getPositions()
+        self.assertEqual(positions["phi"], 1.0)
+        self.assertTrue(positions["kappa"] is None)
+        self.assertEqual(len(positions), len(self.ROLES))
+
+    def test_max_age(self):
+        snapshot = self.diffractometer.getPositionsSnapshot()
+        self.motors["phi"].position = 2
+        # not notified, the snapshot is reused
+        self.assertTrue(self.diffractometer.getPositionsSnapshot(max_age=10) is snapshot)
+        self.assertEqual(self.diffractometer.getPositions(max_age=10)["phi"], 1.0)
+        # read again
+        self.assertEqual(self.diffractometer.getPositions()["phi"], 2.0)
+
+        snapshot = self.diffractometer.getPositionsSnapshot()
+        self.diffractometer._positions_snapshot = \
+             MiniDiff.PositionsSnapshot(snapshot, snapshot.timestamp - 1)
+        self.motors["phi"].position = 3
+        self.assertEqual(self.diffractometer.getPositions(max_age=0.5)["phi"], 3.0)
+
+    def test_notified_positions(self):
+        self.diffractometer.getPositionsSnapshot()
+        self.motors["phiy"].set_position(5)
+        self.assertEqual(self.diffractometer.getPositions(max_age=10)["phiy"], 5.0)
+        # position which cannot be trusted
+        self.motors["phiy"].set_position("unknown")
+        self.assertTrue(self.diffractometer._positions_snapshot is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Poller scheduler tests (no control system needed)
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import time
+import unittest
+import gevent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Poller
+
+
+class Counter:
+    def __init__(self, duration=0):
+        self.duration = duration
+        self.calls = 0
+
+    def read(self):
+        self.calls += 1
+        if self.duration:
+            time.sleep(self.duration)
+        return self.calls
+
+    def fail(self):
+        self.calls += 1
+        raise RuntimeError("cannot read")
+
+
+class Receiver:
+    def __init__(self):
+        self.values = []
+        self.errors = []
+
+    def value_changed(self, value):
+        self.values.append(value)
+
+    def error(self, exception, poller_id):
+        self.errors.append((exception, poller_id))
+
+
+def wait_until(condition, timeout=2):
+    with gevent.Timeout(timeout, False):
+        while not condition():
+            gevent.sleep(0.01)
+    return condition()
+
+
+class TestPoller(unittest.TestCase):
+    def setUp(self):
+        self.pollers = []
+
+    def tearDown(self):
+        for poller in self.pollers:
+            if not poller.is_stopped():
+                poller.stop()
+
+    def poll(self, polled_call, receiver, polling_period, **kwargs):
+        poller = Poller.poll(polled_call, polling_period=polling_period,
+                             value_changed_callback=receiver.value_changed,
+                             error_callback=receiver.error, **kwargs)
+        self.pollers.append(poller)
+        return poller
+
+    def test_value_changed(self):
+        counter, receiver = Counter(), Receiver()
+        self.poll(counter.read, receiver, 20)
+        self.assertTrue(wait_until(lambda: len(receiver.values) >= 3))
+        self.assertEqual(receiver.values[:3], [1, 2, 3])
+
+    def test_same_value_not_sent_again(self):
+        receiver = Receiver()
+        constant = lambda: 42
+        self.poll(constant, receiver, 10)
+        self.assertTrue(wait_until(lambda: receiver.values))
+        gevent.sleep(0.1)
+        self.assertEqual(receiver.values, [42])
+
+    def test_same_call_shares_poller(self):
+        counter, receiver = Counter(), Receiver()
+        poller = self.poll(counter.read, receiver, 100)
+        self.assertTrue(self.poll(counter.read, receiver, 50) is poller)
+        self.assertEqual(poller.get_polling_period(), 50)
+
+    def test_same_period_grouped(self):
+        receiver = Receiver()
+        counter1, counter2 = Counter(), Counter()
+        poller1 = self.poll(counter1.read, receiver, 70)
+        poller2 = self.poll(counter2.read, receiver, 70)
+        self.assertTrue(poller1._group is poller2._group)
+        self.assertTrue(Poller._scheduler._groups[70] is poller1._group)
+
+        poller2.set_polling_period(80)
+        self.assertFalse(poller1._group is poller2._group)
+        self.assertEqual(Poller._scheduler._groups[70], set([poller1]))
+
+    def test_stop(self):
+        counter, receiver = Counter(), Receiver()
+        poller = self.poll(counter.read, receiver, 10)
+        self.assertTrue(wait_until(lambda: receiver.values))
+        poller.stop()
+        self.assertTrue(Poller.get_poller(poller.get_id()) is None)
+        gevent.sleep(0.05)
+        calls = counter.calls
+        gevent.sleep(0.1)
+        self.assertEqual(counter.calls, calls)
+
+    def test_error_stops_polling(self):
+        counter, receiver = Counter(), Receiver()
+        poller = self.poll(counter.fail, receiver, 10)
+        self.assertTrue(wait_until(lambda: receiver.errors))
+        exception, poller_id = receiver.errors[0]
+        self.assertTrue(isinstance(exception, RuntimeError))
+        self.assertEqual(poller_id, poller.get_id())
+        gevent.sleep(0.1)
+        self.assertEqual(counter.calls, 1)
+        self.assertEqual(poller.get_statistics()["errors"], 1)
+
+    def test_delayed_start(self):
+        counter, receiver = Counter(), Receiver()
+        self.poll(counter.read, receiver, 10, start_delay=200)
+        gevent.sleep(0.1)
+        self.assertEqual(counter.calls, 0)
+        self.assertTrue(wait_until(lambda: receiver.values))
+
+    def test_overrun(self):
+        # calls last longer than the polling period: ticks are skipped
+        counter, receiver = Counter(duration=0.1), Receiver()
+        poller = self.poll(counter.read, receiver, 20)
+        self.assertTrue(wait_until(lambda: counter.calls >= 3))
+        stats = poller.get_statistics()
+        self.assertTrue(stats["overruns"] > 0)
+        self.assertTrue(stats["max_duration"] >= 90)
+
+    def test_blocking_call_does_not_delay_others(self):
+        receiver = Receiver()
+        slow, fast = Counter(duration=0.5), Counter()
+        self.poll(slow.read, receiver, 20)
+        self.poll(fast.read, receiver, 20)
+        gevent.sleep(0.3)
+        self.assertEqual(slow.calls, 1)
+        self.assertTrue(fast.calls >= 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
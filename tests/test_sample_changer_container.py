@@ -0,0 +1,93 @@
+"""Sample changer Container trees: address and ID indexes, cached sample
+lists
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "HardwareObjects", "sample_changer"))
+
+from Container import Container, Basket
+
+
+class TestContainer(unittest.TestCase):
+    def setUp(self):
+        self.sample_changer = Container("SC", None, None, False)
+        self.baskets = []
+        for number in (1, 2):
+            basket = Basket(self.sample_changer, number, samples_num=3)
+            self.sample_changer._addComponent(basket)
+            self.baskets.append(basket)
+
+    def test_address_index(self):
+        sample = self.sample_changer.getComponentByAddress("2:3")
+        self.assertTrue(sample is self.baskets[1].getComponents()[2])
+        self.assertTrue(self.sample_changer.getComponentByAddress("1") is self.baskets[0])
+        self.assertTrue(self.baskets[0].getComponentByAddress("1:2") is not None)
+        # not in the tree of the basket
+        self.assertTrue(self.baskets[0].getComponentByAddress("2:1") is None)
+        self.assertTrue(self.sample_changer.getComponentByAddress("3:1") is None)
+        self.assertTrue(self.sample_changer.getComponentByAddress(["1:1"]) is None)
+
+    def test_id_index(self):
+        sample = self.sample_changer.getComponentByAddress("1:2")
+        sample._setInfo(True, "BARCODE1", True)
+        self.assertTrue(self.sample_changer.getComponentById("BARCODE1") is sample)
+        self.assertTrue(self.baskets[0].getComponentById("BARCODE1") is sample)
+        self.assertTrue(self.baskets[1].getComponentById("BARCODE1") is None)
+
+        # scanned again
+        sample._setInfo(True, "BARCODE2", True)
+        self.assertTrue(self.sample_changer.getComponentById("BARCODE1") is None)
+        self.assertTrue(self.sample_changer.getComponentById("BARCODE2") is sample)
+        sample.clearInfo()
+        self.assertTrue(self.sample_changer.getComponentById("BARCODE2") is None)
+
+    def test_removed_component(self):
+        basket = self.baskets[1]
+        basket.getComponentByAddress("2:1")._setInfo(True, "BARCODE", True)
+        self.sample_changer._removeComponent(basket)
+        self.assertTrue(self.sample_changer.getComponentByAddress("2") is None)
+        self.assertTrue(self.sample_changer.getComponentByAddress("2:1") is None)
+        self.assertTrue(self.sample_changer.getComponentById("BARCODE") is None)
+        self.assertEqual(len(self.sample_changer.getSampleList()), 3)
+
+        self.sample_changer._addComponent(basket)
+        self.assertTrue(self.sample_changer.getComponentById("BARCODE") is not None)
+        self.sample_changer._clearComponents()
+        self.assertEqual(self.sample_changer.getSampleList(), [])
+        self.assertTrue(self.sample_changer.getComponentByAddress("1:1") is None)
+
+    def test_sample_lists(self):
+        samples = self.sample_changer.getSampleList()
+        self.assertEqual([sample.getAddress() for sample in samples],
+                         ["1:1", "1:2", "1:3", "2:1", "2:2", "2:3"])
+        # copies of the cached list
+        del samples[:]
+        self.assertEqual(len(self.sample_changer.getSampleList()), 6)
+
+        self.assertEqual(self.sample_changer.getPresentSamples(), [])
+        self.assertTrue(self.sample_changer.isEmpty())
+        sample = self.sample_changer.getComponentByAddress("2:2")
+        sample._setInfo(True, None, False)
+        self.assertEqual(self.sample_changer.getPresentSamples(), [sample])
+        self.assertFalse(self.sample_changer.isEmpty())
+        self.assertTrue(self.baskets[0].isEmpty())
+
+    def test_samples_by_basket(self):
+        sample = self.sample_changer.getComponentByAddress("1:3")
+        sample._setInfo(True, None, False)
+        samples_by_basket = self.sample_changer.getSamplesByBasket(present_only=True)
+        self.assertEqual(samples_by_basket, {"1": [sample], "2": []})
+        samples_by_basket["1"].append(None)
+        self.assertEqual(self.sample_changer.getSamplesByBasket(present_only=True)["1"],
+                         [sample])
+        self.assertEqual(len(self.sample_changer.getSamplesByBasket()["2"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
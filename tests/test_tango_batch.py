@@ -0,0 +1,71 @@
+"""Batched reading of polled Tango attributes: dispatch of the values
+read, without device
+
+  python -m unittest discover -s tests
+"""
+
+import logging
+import unittest
+
+import hwr_package
+hwr_package.import_package()
+
+logging.disable(logging.CRITICAL)
+try:
+    # warns when PyTango is not available
+    from HardwareRepository.Command import Tango
+finally:
+    logging.disable(logging.NOTSET)
+
+
+class FakeChannel(Tango.TangoChannel):
+    def __init__(self, attribute_name):
+        Tango.ChannelObject.__init__(self, attribute_name)
+        self.attributeName = attribute_name
+        self.value = None
+        self.updates = []
+
+    def emit(self, signal, *args):
+        if signal == "update":
+            self.updates.append(args[0])
+
+
+class TestTangoAttributesBatch(unittest.TestCase):
+    def setUp(self):
+        self.batch = Tango._TangoAttributesBatch(("device", 100), None)
+        self.position = FakeChannel("Position")
+        self.state = FakeChannel("State")
+
+    def test_changed_values_dispatched(self):
+        self.batch.update([(self.position, 1.5), (self.state, "ON")])
+        self.batch.update([(self.position, 1.5), (self.state, "MOVING")])
+        self.assertEqual(self.position.updates, [1.5])
+        self.assertEqual(self.state.updates, ["ON", "MOVING"])
+        self.assertEqual(self.state.value, "MOVING")
+
+    def test_same_tuple_not_dispatched_again(self):
+        self.batch.update([(self.position, (1, 2, 3))])
+        self.assertEqual(self.position.value, [1, 2, 3])
+        self.batch.update([(self.position, (1, 2, 3))])
+        self.assertEqual(self.position.updates, [[1, 2, 3]])
+        self.batch.update([(self.position, (1, 2, 4))])
+        self.assertEqual(self.position.updates, [[1, 2, 3], [1, 2, 4]])
+
+    def test_same_array_not_dispatched_again(self):
+        numpy = Tango.numpy
+        self.batch.update([(self.position, numpy.array([1, 2]))])
+        self.batch.update([(self.position, numpy.array([1, 2]))])
+        self.assertEqual(len(self.position.updates), 1)
+        self.batch.update([(self.position, numpy.array([1, 2, 3]))])
+        self.assertEqual(len(self.position.updates), 2)
+
+    def test_failed_read(self):
+        self.batch.update([(self.position, 1.5)])
+        self.batch.update([(self.position, None)])
+        self.batch.update([(self.position, None)])
+        self.assertEqual(self.position.updates, [1.5, None])
+        self.assertTrue(self.position.value is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""XMLCache tests : recorded SAX events of the Hardware Objects XML files,
+in a temporary cache directory
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import time
+import types
+import shutil
+import tempfile
+import unittest
+import xml.sax
+
+import hwr_package
+hwr_package.import_package()
+
+from HardwareRepository import XMLCache
+from HardwareRepository import HardwareObjectFileParser
+
+XML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xml")
+
+HO_XML = """<object class="Motor">
+  <username>Phi &amp; co</username>
+  <motor_name>phi</motor_name>
+  <channel type="tango" name="position" polling="events">Position</channel>
+  <object role="controller" href="/controller"/>
+</object>
+"""
+
+TEMPLATE = """<object class="Motor">
+  <username>name</username>
+  <channel type="tango" name="position"/>
+</object>
+"""
+
+
+class TestXMLCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = XMLCache.CACHE_DIR
+        XMLCache.CACHE_DIR = os.path.join(self.directory, "cache")
+        XMLCache._memory_cache.clear()
+        self.filename = self.write_file("phi.xml", HO_XML)
+
+        self.parse_events = XMLCache.parseEvents
+        self.parsed = []
+        def parse_events(XMLString):
+            self.parsed.append(XMLString)
+            return self.parse_events(XMLString)
+        XMLCache.parseEvents = parse_events
+
+    def tearDown(self):
+        XMLCache.parseEvents = self.parse_events
+        XMLCache.CACHE_DIR = self.cache_dir
+        XMLCache._memory_cache.clear()
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, data, mtime=None):
+        filename = os.path.join(self.directory, name)
+        f = open(filename, "w")
+        f.write(data)
+        f.close()
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+        return filename
+
+    def test_replay(self):
+        recorder = XMLCache.XMLEventsRecorder()
+        xml.sax.parseString(HO_XML, recorder)
+        replayed = XMLCache.XMLEventsRecorder()
+        XMLCache.replay(XMLCache.getEvents(HO_XML, self.filename), replayed)
+        self.assertEqual(replayed.getEvents(), recorder.getEvents())
+        self.assertTrue(("c", "Phi & co") in replayed.getEvents())
+
+    def test_cached_events(self):
+        events = XMLCache.getEvents(HO_XML, self.filename)
+        self.assertEqual(XMLCache.getEvents(HO_XML, self.filename), events)
+        self.assertEqual(len(self.parsed), 1)
+        # no file name, no cache
+        XMLCache.getEvents(HO_XML)
+        self.assertEqual(len(self.parsed), 2)
+
+    def test_cache_file(self):
+        events = XMLCache.getEvents(HO_XML, self.filename)
+        # next application start
+        XMLCache._memory_cache.clear()
+        self.assertEqual(XMLCache.getEvents(HO_XML, self.filename), events)
+        self.assertEqual(len(self.parsed), 1)
+        self.assertEqual([entry[:3] for entry in XMLCache.entries()],
+                         [("xml", os.path.abspath(self.filename), True)])
+
+    def test_changed_file(self):
+        mtime = int(time.time()) - 10
+        self.write_file("phi.xml", HO_XML, mtime)
+        XMLCache.getEvents(HO_XML, self.filename)
+        # same size, saved again within the same second
+        new_xml = HO_XML.replace(">phi<", ">chi<")
+        self.write_file("phi.xml", new_xml, mtime + 0.5)
+        events = XMLCache.getEvents(new_xml, self.filename)
+        self.assertTrue(("c", "chi") in events)
+        self.assertEqual(len(self.parsed), 2)
+        XMLCache._memory_cache.clear()
+        self.assertEqual(XMLCache.getEvents(new_xml, self.filename), events)
+        self.assertEqual(len(self.parsed), 2)
+
+    def test_cache_version(self):
+        XMLCache.getEvents(HO_XML, self.filename)
+        XMLCache._memory_cache.clear()
+        cache_version = XMLCache.CACHE_VERSION
+        XMLCache.CACHE_VERSION = cache_version + 1
+        try:
+            XMLCache.getEvents(HO_XML, self.filename)
+        finally:
+            XMLCache.CACHE_VERSION = cache_version
+        self.assertEqual(len(self.parsed), 2)
+
+    def test_template_structure(self):
+        module = types.ModuleType("Motor")
+        module.__file__ = self.write_file("Motor.pyc", "")
+        self.write_file("Motor.py", "")
+        retriever_class = HardwareObjectFileParser.XMLStructureRetriever
+        retriever = retriever_class()
+        xml.sax.parseString(TEMPLATE, retriever)
+        expected = retriever.getStructure()
+
+        self.assertTrue(XMLCache.getTemplateStructure(module, TEMPLATE, retriever_class) == expected)
+        XMLCache._memory_cache.clear()
+        # from the cache file, the template is not parsed
+        self.assertTrue(XMLCache.getTemplateStructure(module, "", retriever_class) == expected)
+
+    def test_warm_and_clear(self):
+        self.assertEqual(XMLCache.warm([XML_DIR]),
+                         len([name for name in os.listdir(XML_DIR) if name.endswith(".xml")]))
+        self.assertTrue(all([valid for kind, name, valid, size in XMLCache.entries()]))
+        XMLCache.clear()
+        self.assertEqual(list(XMLCache.entries()), [])
+
+    def test_hardware_object(self):
+        # no class, no channel nor reference: nothing else is loaded
+        ho_xml = HO_XML.split("\n")
+        ho_xml = "\n".join(["<object>"] + ho_xml[1:3] + ho_xml[5:])
+        self.write_file("phi.xml", ho_xml)
+        cached = HardwareObjectFileParser.parseString(ho_xml, "/phi", self.filename)
+        cached = HardwareObjectFileParser.parseString(ho_xml, "/phi", self.filename)
+        parsed = HardwareObjectFileParser.parseString(ho_xml, "/phi")
+        # without file name, parsed by xml.sax directly
+        self.assertEqual(len(self.parsed), 1)
+        for hwobj in (cached, parsed):
+            self.assertEqual(hwobj.getProperty("username"), "Phi & co")
+            self.assertEqual(hwobj.getProperty("motor_name"), "phi")
+
+
+if __name__ == "__main__":
+    unittest.main()
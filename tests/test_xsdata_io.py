@@ -0,0 +1,86 @@
+"""XSDataIO tests : the results are the ones of the methods of the
+generated XSData classes
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "HardwareObjects"))
+
+import XSDataIO
+import edna_test_data
+
+XML_DATA = {"test data": edna_test_data.EDNA_TEST_DATA,
+            "default input": edna_test_data.EDNA_DEFAULT_INPUT,
+            "result data": edna_test_data.EDNA_RESULT_DATA}
+
+
+class TestXSDataIO(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        XML_DATA["Dozor result"] = XSDataIO._dozor_result(100)
+        # results of the generated methods, before install()
+        cls.expected = {}
+        for name, xml_string in XML_DATA.items():
+            xsdata_class = XSDataIO._find_class(xml_string)
+            obj = xsdata_class.parseString(xml_string)
+            cls.expected[name] = (xsdata_class, obj.marshal(), obj.copy().marshal())
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_and_marshal(self):
+        for name, xml_string in XML_DATA.items():
+            xsdata_class, expected_xml, expected_copy = self.expected[name]
+            obj = XSDataIO.parse_string(xsdata_class, xml_string)
+            self.assertEqual(XSDataIO.marshal(obj), expected_xml, name)
+
+    def test_round_trip(self):
+        for name, xml_string in XML_DATA.items():
+            xsdata_class, expected_xml, expected_copy = self.expected[name]
+            obj = XSDataIO.parse_string(xsdata_class, expected_xml)
+            self.assertEqual(XSDataIO.marshal(obj), expected_xml, name)
+
+    def test_files(self):
+        for name, xml_string in XML_DATA.items():
+            xsdata_class, expected_xml, expected_copy = self.expected[name]
+            filename = os.path.join(self.directory, "data.xml")
+            XSDataIO.export_to_file(XSDataIO.parse_string(xsdata_class, xml_string), filename)
+            obj = XSDataIO.parse_file(xsdata_class, filename)
+            self.assertEqual(XSDataIO.marshal(obj), expected_xml, name)
+
+    def test_copy(self):
+        for name, xml_string in XML_DATA.items():
+            xsdata_class, expected_xml, expected_copy = self.expected[name]
+            obj = XSDataIO.parse_string(xsdata_class, xml_string)
+            obj_copy = XSDataIO.copy(obj)
+            self.assertEqual(XSDataIO.marshal(obj_copy), expected_copy, name)
+
+    def test_copy_is_deep(self):
+        xsdata_class, expected_xml, expected_copy = self.expected["Dozor result"]
+        obj = XSDataIO.parse_string(xsdata_class, expected_xml)
+        obj_copy = XSDataIO.copy(obj)
+        obj_copy.imageDozor[0].number.value = -1
+        del obj_copy.imageDozor[1:]
+        self.assertEqual(XSDataIO.marshal(obj), expected_xml)
+
+    def test_install(self):
+        XSDataIO.install()
+        for name, xml_string in XML_DATA.items():
+            xsdata_class, expected_xml, expected_copy = self.expected[name]
+            obj = xsdata_class.parseString(xml_string)
+            self.assertEqual(obj.marshal(), expected_xml, name)
+            self.assertEqual(obj.copy().marshal(), expected_copy, name)
+
+
+if __name__ == "__main__":
+    unittest.main()